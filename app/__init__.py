@@ -1,18 +1,36 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from config import Config
+from config import get_config
+from app.services.replica import RoutingSession
 
-# Inicializa o banco de dados
-db = SQLAlchemy()
+# Inicializa o banco de dados (sessão que manda as leituras das telas @read_only à réplica)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-def create_app():
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    # Sem classe explícita: perfil da variável ERP_PROFILE (development, production, local)
+    app.config.from_object(config_class or get_config())
+    if not app.config.get('SECRET_KEY'):
+        raise RuntimeError("Defina SECRET_KEY no ambiente.")
 
+    # Pool de conexões, réplica de leitura e pool medido (antes de criar os engines)
+    from app.services import replica, metrics
+    replica.configure(app)
+    metrics.configure(app)
     db.init_app(app)
 
     # Importa os Models para o SQLAlchemy "enxergar" as tabelas
     from app.models.user import User, Employee
+    from app.models.inventory import Product, StockIn
+    from app.models.sales import Sale, SaleItem
+    from app.models.counter import Counter
+    from app.models.job import Job
+
+    # Carimbo de versão do catálogo nas escritas de produtos (eventos da sessão)
+    from app.services import catalog
+
+    # Trilha de auditoria das alterações (eventos da sessão, gravação em segundo plano)
+    from app.services import audit
 
     # 1. Importa os Blueprints (Módulos do Sistema)
     from app.routes.auth import auth_bp
@@ -20,6 +38,8 @@ def create_app():
     from app.routes.inventory import inventory_bp
     from app.routes.client import client_bp
     from app.routes.sales import sales_bp # <--- NOVO MÓDULO DE VENDAS
+    from app.routes.jobs import jobs_bp
+    from app.routes.export import export_bp
 
     # 2. Registra os Blueprints no App
     app.register_blueprint(auth_bp, url_prefix='/') 
@@ -27,5 +47,22 @@ def create_app():
     app.register_blueprint(inventory_bp)
     app.register_blueprint(client_bp)
     app.register_blueprint(sales_bp)      # <--- REGISTRO DAS VENDAS
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(export_bp)
+
+    # 3. Comandos de manutenção (flask inventory ...)
+    from app.commands import register_commands
+    register_commands(app)
+
+    # 4. Métricas por requisição em /metrics (só se METRICS_ENABLED)
+    metrics.init_app(app)
+
+    # 5. Compressão gzip/brotli das respostas grandes
+    from app.services import http_cache
+    http_cache.init_app(app)
+
+    # 6. Workers das tarefas em segundo plano (sobem na primeira requisição)
+    from app.services import jobs
+    jobs.init_app(app)
 
     return app
\ No newline at end of file
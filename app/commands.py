@@ -0,0 +1,228 @@
+import time
+
+import click
+from flask.cli import AppGroup
+
+# Comandos de manutenção (flask <grupo> <comando>)
+
+inventory_cli = AppGroup('inventory', help='Rotinas do estoque.')
+
+
+@inventory_cli.command('rebuild-valuation')
+def rebuild_valuation():
+    """Recalcula o valor do estoque a partir da tabela products."""
+    from app.services import valuation
+    totals = valuation.rebuild()
+    click.echo(f"Custo: R$ {totals['total_cost']:.2f} | Venda: R$ {totals['total_sale']:.2f} | "
+               f"Estoque baixo: {totals['low_stock']} | Produtos: {totals['products']}")
+
+
+@inventory_cli.command('snapshot-stock')
+def snapshot_stock():
+    """Grava a foto do estoque atual (agende diariamente, ex.: cron)."""
+    from app.services import stock_ledger
+    count = stock_ledger.take_snapshot()
+    click.echo(f"Foto do estoque gravada para {count} produtos.")
+
+
+@inventory_cli.command('purge-tombstones')
+@click.option('--days', default=90, show_default=True, help='Mantém as exclusões mais recentes que isso.')
+def purge_tombstones(days):
+    """Apaga registros antigos de produtos excluídos (sincronização do PDV)."""
+    from datetime import datetime, timedelta
+    from app.services import catalog
+    count = catalog.purge_tombstones(datetime.now() - timedelta(days=days))
+    click.echo(f"{count} exclusões antigas removidas.")
+
+
+@inventory_cli.command('refresh-reorder')
+@click.option('--full', is_flag=True, help='Recalcula todos os produtos, não só os alterados.')
+def refresh_reorder(full):
+    """Atualiza a sugestão de compras pelo giro de vendas."""
+    from app.services import reorder
+    result = reorder.refresh(full=full)
+    click.echo(f"{'Cálculo completo' if result['full'] else 'Cálculo incremental'}: "
+               f"{result['rows']} produtos atualizados.")
+
+
+sales_cli = AppGroup('sales', help='Rotinas de vendas.')
+
+
+@sales_cli.command('rebuild-rollups')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Recalcula só a partir desta data.')
+@click.option('--batch-size', default=1000, show_default=True)
+def rebuild_rollups(since, batch_size):
+    """Recalcula os totais por hora/dia a partir do histórico de vendas."""
+    from app.services import sales_rollups
+    done = sales_rollups.rebuild(
+        since=since, batch_size=batch_size,
+        progress=lambda n, total: click.echo(f"{n}/{total} vendas processadas")
+    )
+    click.echo(f"Totais recalculados a partir de {done} vendas.")
+
+
+@sales_cli.command('emit-nfce')
+@click.option('--date', 'ref', type=click.DateTime(formats=['%Y-%m-%d']), help='Só as vendas deste dia.')
+@click.option('--sale', 'sale_ids', type=int, multiple=True, help='Venda específica (pode repetir).')
+def emit_nfce(ref, sale_ids):
+    """Gera a NFC-e (XML) das vendas ainda sem nota."""
+    from datetime import timedelta
+    from app.services import nfce
+    start = ref
+    end = ref + timedelta(days=1) if ref else None
+    summary = nfce.emit(sale_ids=sale_ids or None, start=start, end=end,
+                        progress=lambda pct, message: click.echo(message))
+    click.echo(f"{summary['emitted']} NFC-e geradas em {summary['elapsed']:.2f}s "
+               f"({summary['invalid']} vendas com dados inválidos).")
+    for reason, count in summary['reasons']:
+        click.echo(f"  {reason}: {count}")
+    click.echo(f"Arquivos em {nfce.output_dir()}")
+
+
+@sales_cli.command('sweep-holds')
+def sweep_holds():
+    """Apaga as reservas de carrinho vencidas."""
+    from app.services import holds
+    count = holds.sweep()
+    click.echo(f"{count} reservas vencidas removidas.")
+
+
+clients_cli = AppGroup('clients', help='Rotinas de clientes.')
+
+
+@clients_cli.command('normalize')
+@click.option('--batch-size', default=1000, show_default=True)
+def normalize_clients(batch_size):
+    """Preenche CPF/CNPJ só com dígitos e o nome de busca dos clientes antigos."""
+    from sqlalchemy import bindparam, update
+    from app import db
+    from app.models.client import Client
+    from app.services.search_index import normalize
+
+    t = Client.__table__
+    # Documentos já normalizados (cadastros novos) continuam com o dono atual
+    owner = dict(db.session.query(Client.document_digits, Client.id).filter(Client.document_digits.isnot(None)))
+    duplicates, done, last_id = [], 0, 0
+    while True:
+        rows = db.session.query(Client.id, Client.name, Client.document).filter(
+            Client.id > last_id).order_by(Client.id).limit(batch_size).all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            digits = Client.digits_of(row.document)
+            if digits and owner.setdefault(digits, row.id) != row.id:
+                duplicates.append(row)
+                digits = None  # fica sem a chave até alguém corrigir o cadastro
+            params.append({'cid': row.id, 'digits': digits, 'sname': normalize(row.name)})
+        db.session.execute(
+            update(t).where(t.c.id == bindparam('cid'))
+            .values(document_digits=bindparam('digits'), search_name=bindparam('sname')),
+            params
+        )
+        db.session.commit()
+        done += len(rows)
+        last_id = rows[-1].id
+
+    for row in duplicates:
+        click.echo(f"CPF/CNPJ repetido: cliente {row.id} ({row.name}) - {row.document}")
+    click.echo(f"{done} clientes normalizados, {len(duplicates)} documentos repetidos.")
+
+
+hr_cli = AppGroup('hr', help='Rotinas do RH.')
+
+
+@hr_cli.command('payroll')
+@click.option('--period', help='Competência AAAA-MM (padrão: mês atual).')
+def run_payroll(period):
+    """Calcula (ou recalcula) a folha de pagamento da competência."""
+    from datetime import datetime
+    from app.services import payroll
+    summary = payroll.run(period or datetime.now())
+    totals = summary['totals']
+    click.echo(f"Folha {summary['period']}: {summary['employees']} colaboradores em {summary['elapsed']:.2f}s")
+    click.echo(f"Bruto R$ {totals['gross']:.2f} | INSS R$ {totals['inss']:.2f} | IRRF R$ {totals['irrf']:.2f} | "
+               f"Líquido R$ {totals['net']:.2f} | FGTS R$ {totals['fgts']:.2f}")
+    if summary['skipped']:
+        click.echo(f"{summary['skipped']} colaboradores sem salário ou data de admissão ficaram de fora.")
+
+
+jobs_cli = AppGroup('jobs', help='Tarefas em segundo plano.')
+
+
+@jobs_cli.command('worker')
+@click.option('--workers', type=int, help='Nº de threads (padrão: JOBS_WORKERS).')
+def jobs_worker(workers):
+    """Processa a fila de tarefas neste processo (Ctrl+C para parar)."""
+    from flask import current_app
+    from app.services.jobs import runner
+    count = workers or current_app.config.get('JOBS_WORKERS', 2)
+    runner.start(current_app._get_current_object(), count)
+    click.echo(f"{count} workers aguardando tarefas...")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        click.echo("Finalizando tarefas em andamento...")
+        runner.stop()
+
+
+@jobs_cli.command('purge')
+@click.option('--days', default=30, show_default=True)
+def jobs_purge(days):
+    """Apaga tarefas concluídas/falhas antigas (e uploads que sobraram no spool)."""
+    import json
+    import os
+    from datetime import datetime, timedelta
+    from app import db
+    from app.models.job import Job
+    query = Job.query.filter(
+        Job.status.in_(['done', 'failed']),
+        Job.finished_at < datetime.now() - timedelta(days=days)
+    )
+    for (payload,) in query.with_entities(Job.payload).filter(Job.kind.in_(['nfe_import', 'csv_import'])):
+        path = json.loads(payload or '{}').get('path')
+        if path and os.path.exists(path):
+            os.remove(path)
+    count = query.delete(synchronize_session=False)
+    db.session.commit()
+    click.echo(f"{count} tarefas antigas removidas.")
+
+
+# --- BANCO DE DADOS ---
+@click.command('init-db')
+def init_db():
+    """Cria as tabelas que faltam no banco principal, o usuário admin inicial e o valor do estoque."""
+    from app import db
+    from app.models.user import User
+    from app.services import valuation
+    db.create_all(bind_key=None)
+    if not User.query.filter_by(username='admin').first():
+        db.session.add(User(username='admin', password='123456789', role='admin'))
+        db.session.commit()
+        click.echo(">>> Usuário Admin Mestre criado com sucesso!")
+    if valuation.seed():
+        click.echo("Valor do estoque calculado a partir dos produtos.")
+    click.echo("Esquema do banco conferido.")
+
+
+@click.command('sync-replica')
+def sync_replica():
+    """Copia o SQLite principal para a réplica (teste local do roteamento de leituras)."""
+    from flask import current_app
+    from app.services import replica
+    try:
+        replica.sync_sqlite_replica(current_app)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo("Réplica atualizada.")
+
+
+def register_commands(app):
+    app.cli.add_command(inventory_cli)
+    app.cli.add_command(sales_cli)
+    app.cli.add_command(clients_cli)
+    app.cli.add_command(hr_cli)
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(init_db)
+    app.cli.add_command(sync_replica)
@@ -0,0 +1,20 @@
+from app import db
+from datetime import datetime
+
+# Trilha de auditoria: quem alterou o quê (antes/depois) e quando.
+# Gravada em lote por um escritor em segundo plano (app/services/audit.py).
+class AuditEntry(db.Model):
+    __tablename__ = 'audit_log'
+    __table_args__ = (
+        db.Index('ix_audit_entity_time', 'entity', 'created_at'),
+        db.Index('ix_audit_entity_id_time', 'entity', 'entity_id', 'created_at'),
+        db.Index('ix_audit_user_time', 'user_id', 'created_at'),
+    )
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+    user_id = db.Column(db.Integer)
+    entity = db.Column(db.String(30), nullable=False)  # Tabela: products, users, clients...
+    entity_id = db.Column(db.String(40))               # Vazio em alterações em lote
+    action = db.Column(db.String(12), nullable=False)  # insert, update, delete, bulk_insert, bulk_update, bulk_delete
+    changes = db.Column(db.Text)                       # JSON: {campo: [antes, depois]} ou resumo do lote
+    source = db.Column(db.String(60))                  # Tela (endpoint) ou tarefa que fez a alteração
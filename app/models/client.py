@@ -1,5 +1,8 @@
+import re
+
 from app import db
 from datetime import datetime
+from sqlalchemy.orm import validates
 
 class Client(db.Model):
     __tablename__ = 'clients'
@@ -8,6 +11,10 @@ class Client(db.Model):
     document = db.Column(db.String(20), unique=True, nullable=False) # CPF ou CNPJ
     email = db.Column(db.String(120))
     phone = db.Column(db.String(20))
+
+    # Chaves de busca normalizadas (preenchidas ao gravar name/document)
+    document_digits = db.Column(db.String(20), unique=True) # Só os dígitos do CPF/CNPJ (cabe em document)
+    search_name = db.Column(db.String(150), index=True)     # Nome em minúsculas e sem acento
     
     # Endereço
     cep = db.Column(db.String(10))
@@ -16,4 +23,19 @@ class Client(db.Model):
     city = db.Column(db.String(100))
     state = db.Column(db.String(2))
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def digits_of(document):
+        return re.sub(r'\D', '', document or '') or None
+
+    @validates('document')
+    def _set_document_digits(self, key, value):
+        self.document_digits = Client.digits_of(value)
+        return value
+
+    @validates('name')
+    def _set_search_name(self, key, value):
+        from app.services.search_index import normalize
+        self.search_name = normalize(value)
+        return value
@@ -0,0 +1,7 @@
+from app import db
+
+# Contadores (sequências) compartilhados entre processos: código de produto etc.
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False, default=1)
@@ -11,13 +11,16 @@ class Product(db.Model):
     cost_price = db.Column(db.Numeric(10, 2), default=0.00)
     price = db.Column(db.Numeric(10, 2), nullable=False, default=0.00)
     discount = db.Column(db.Float, default=0.0) 
-    stock = db.Column(db.Integer, default=0)
+    stock = db.Column(db.Integer, default=0, index=True)
     category = db.Column(db.String(50))
     unit = db.Column(db.String(10), default='UN')
     
     # CAMPOS FISCAIS
     ncm = db.Column(db.String(10), default='00000000')
     cfop = db.Column(db.String(4), default='5102')
+
+    # Versão do catálogo na última alteração (sincronização incremental do PDV)
+    version = db.Column(db.BigInteger, nullable=False, default=0, index=True)
     
     # O relacionamento precisa que a classe StockIn exista abaixo
     stock_history = db.relationship('StockIn', backref='product', lazy=True)
@@ -30,11 +33,9 @@ class Product(db.Model):
 
     @staticmethod
     def generate_next_code():
-        last_product = Product.query.order_by(Product.id.desc()).first()
-        if not last_product or not last_product.code or not last_product.code.isdigit():
-            return "001"
-        next_code = int(last_product.code) + 1
-        return f"{next_code:03d}"
+        # Sequência em tabela com blocos por processo (seguro entre terminais simultâneos)
+        from app.services.sequence import next_product_code
+        return next_product_code()
 
 # ESTA É A CLASSE QUE ESTAVA FALTANDO E CAUSANDO O ERRO:
 class StockIn(db.Model):
@@ -42,4 +43,100 @@ class StockIn(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    date = db.Column(db.DateTime, default=datetime.now)
\ No newline at end of file
+    date = db.Column(db.DateTime, default=datetime.now)
+
+# Notas fiscais já importadas (evita dar entrada duas vezes na mesma NF-e)
+class NFeImport(db.Model):
+    __tablename__ = 'nfe_imports'
+    id = db.Column(db.Integer, primary_key=True)
+    access_key = db.Column(db.String(44), unique=True, nullable=False) # chNFe
+    filename = db.Column(db.String(255))
+    items = db.Column(db.Integer, default=0)
+    created = db.Column(db.Integer, default=0)
+    updated = db.Column(db.Integer, default=0)
+    imported_at = db.Column(db.DateTime, default=datetime.now)
+
+
+# Valor patrimonial do estoque mantido por deltas (dashboard lê sem varrer products).
+# Dividido em algumas linhas ("slots") para vendas simultâneas não disputarem a mesma linha.
+class InventoryValuation(db.Model):
+    __tablename__ = 'inventory_valuation'
+    slot = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    total_cost = db.Column(db.Numeric(14, 2), default=0.00)
+    total_sale = db.Column(db.Numeric(14, 2), default=0.00)
+    low_stock = db.Column(db.Integer, default=0)
+    products = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+# Livro de movimentações de estoque (só inserção). Sem FK em product_id:
+# o histórico continua existindo mesmo se o produto for excluído.
+class StockMovement(db.Model):
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_product_date', 'product_id', 'created_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)   # in, out, adjust
+    quantity = db.Column(db.Integer, nullable=False)  # Com sinal: entrada +, saída -
+    source = db.Column(db.String(20), nullable=False) # sale, nfe, manual...
+    document = db.Column(db.String(60))               # Nº da venda, chave da NF-e...
+    user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+# Foto periódica do estoque de cada produto (ponto de partida para "estoque na data X")
+class StockSnapshot(db.Model):
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        db.Index('ix_stock_snapshots_product_date', 'product_id', 'taken_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    stock = db.Column(db.Integer, nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+
+# Produtos excluídos: o PDV recebe a exclusão no delta do catálogo (?since=N)
+class CatalogTombstone(db.Model):
+    __tablename__ = 'catalog_tombstones'
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    code = db.Column(db.String(20))
+    version = db.Column(db.BigInteger, nullable=False, index=True)
+    deleted_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+# Versões do catálogo já reservadas por transações ainda abertas: enquanto existir
+# uma aqui, a versão publicada para o PDV fica abaixo dela (ver services/catalog.py)
+class CatalogPendingVersion(db.Model):
+    __tablename__ = 'catalog_pending_versions'
+    version = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+# Sugestão de compra por produto, calculada em lote a partir do giro de vendas
+# (só produtos com venda na janela; recalculada de forma incremental)
+class ReorderSuggestion(db.Model):
+    __tablename__ = 'reorder_suggestions'
+    __table_args__ = (
+        db.Index('ix_reorder_needs_cover', 'needs_reorder', 'days_cover'),
+    )
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    units_sold = db.Column(db.Integer, nullable=False)     # Unidades vendidas na janela
+    avg_daily = db.Column(db.Float, nullable=False)        # Média de vendas por dia
+    stock = db.Column(db.Integer, nullable=False)
+    days_cover = db.Column(db.Float, nullable=False)       # Dias até zerar no ritmo atual
+    reorder_qty = db.Column(db.Integer, nullable=False)    # Quanto comprar para cobrir prazo + meta
+    needs_reorder = db.Column(db.Boolean, nullable=False)  # Cobertura menor que o prazo de entrega
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+# Reserva temporária de estoque do carrinho de um terminal (PDV); some em expires_at
+class StockHold(db.Model):
+    __tablename__ = 'stock_holds'
+    __table_args__ = (
+        db.UniqueConstraint('terminal', 'product_id', name='uq_stock_holds_terminal_product'),
+        db.Index('ix_stock_holds_product_expires', 'product_id', 'expires_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    terminal = db.Column(db.String(32), nullable=False)   # Identificador do PDV (sessão do navegador)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
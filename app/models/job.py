@@ -0,0 +1,32 @@
+from app import db
+from datetime import datetime
+
+# Fila de tarefas em segundo plano (importações, reajustes, recálculos).
+# Os workers disputam as tarefas com UPDATE condicional no status.
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)     # nfe_import, reprice, rebuild_rollups...
+    status = db.Column(db.String(10), nullable=False, default='queued') # queued, running, done, failed
+    payload = db.Column(db.Text)                        # Parâmetros em JSON
+    result = db.Column(db.Text)                         # Resultado em JSON
+    error = db.Column(db.Text)
+
+    progress = db.Column(db.Integer, default=0)         # 0 a 100
+    message = db.Column(db.String(200))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+
+    run_after = db.Column(db.DateTime, default=datetime.now, nullable=False) # Espera entre tentativas
+    locked_by = db.Column(db.String(60))
+    locked_at = db.Column(db.DateTime)
+
+    user_id = db.Column(db.Integer)
+    # Enquanto na fila/rodando, uma tarefa só por chave; limpa ao terminar ou falhar de vez
+    dedupe_key = db.Column(db.String(60), unique=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
@@ -0,0 +1,34 @@
+from app import db
+from datetime import datetime
+
+# Folha de pagamento: uma linha por colaborador por competência (mês).
+# Calculada em lote por app/services/payroll.py; recalcular a competência substitui as linhas.
+class PayrollEntry(db.Model):
+    __tablename__ = 'payroll'
+    __table_args__ = (
+        db.UniqueConstraint('period', 'employee_id', name='uq_payroll_period_employee'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, nullable=False)  # Primeiro dia do mês de competência
+    employee_id = db.Column(db.Integer, db.ForeignKey('employees.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # Cópia do cadastro no momento do cálculo
+    position = db.Column(db.String(100))
+    base_salary = db.Column(db.Numeric(10, 2), nullable=False)
+
+    worked_days = db.Column(db.Integer, nullable=False)          # Mês comercial: 30 dias
+    gross = db.Column(db.Numeric(10, 2), nullable=False)         # Salário proporcional aos dias
+    inss = db.Column(db.Numeric(10, 2), nullable=False)
+    irrf = db.Column(db.Numeric(10, 2), nullable=False)
+    net = db.Column(db.Numeric(10, 2), nullable=False)           # Líquido: bruto - INSS - IRRF
+    fgts = db.Column(db.Numeric(10, 2), nullable=False)          # Encargo da empresa (não desconta)
+
+    # Provisões acumuladas até a competência (avos de 12)
+    thirteenth_months = db.Column(db.Integer, nullable=False)    # No ano civil
+    thirteenth_accrued = db.Column(db.Numeric(10, 2), nullable=False)
+    vacation_months = db.Column(db.Integer, nullable=False)      # No período aquisitivo atual
+    vacation_accrued = db.Column(db.Numeric(10, 2), nullable=False)  # Com o 1/3 constitucional
+
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    employee = db.relationship('Employee', lazy='joined', innerjoin=True)
@@ -0,0 +1,70 @@
+from app import db
+from datetime import datetime
+
+class Sale(db.Model):
+    __tablename__ = 'sales'
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), index=True) # Opcional
+
+    # Pagamento: dinheiro, pix, debito, credito
+    payment_method = db.Column(db.String(20), nullable=False, default='dinheiro')
+    installments = db.Column(db.Integer, default=1)
+
+    items_count = db.Column(db.Integer, default=0)
+    subtotal = db.Column(db.Numeric(10, 2), default=0.00) # Soma dos itens (preço final)
+    total = db.Column(db.Numeric(10, 2), default=0.00)    # Com acréscimo do parcelamento
+
+    items = db.relationship('SaleItem', backref='sale', lazy=True)
+
+class SaleItem(db.Model):
+    __tablename__ = 'sale_items'
+    id = db.Column(db.Integer, primary_key=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='SET NULL'), index=True)
+
+    # Cópia dos dados do produto no momento da venda
+    code = db.Column(db.String(20), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Numeric(10, 2), nullable=False)
+    cost_price = db.Column(db.Numeric(10, 2), default=0.00)
+    total = db.Column(db.Numeric(10, 2), nullable=False)
+
+# Totais pré-agregados por hora ('H') e por dia ('D'), atualizados a cada venda.
+# dimension: 'all' (geral), 'payment' (forma de pagamento), 'category', 'product' (id do produto)
+class SalesRollup(db.Model):
+    __tablename__ = 'sales_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'dimension', 'bucket', 'dim_key', name='uq_sales_rollup'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(1), nullable=False)
+    dimension = db.Column(db.String(10), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False) # Início da hora/dia
+    dim_key = db.Column(db.String(50), nullable=False, default='')
+    label = db.Column(db.String(100)) # Nome exibido (ex.: nome do produto)
+
+    # 'all'/'payment': total da venda (com acréscimo); 'category'/'product': total dos itens
+    revenue = db.Column(db.Numeric(14, 2), default=0.00)
+    tickets = db.Column(db.Integer, default=0)
+    units = db.Column(db.Integer, default=0)
+
+# NFC-e (modelo 65) gerada para uma venda: XML em disco, numeração por série
+class FiscalDocument(db.Model):
+    __tablename__ = 'fiscal_documents'
+    __table_args__ = (
+        db.UniqueConstraint('model', 'series', 'number', name='uq_fiscal_documents_number'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False, unique=True)
+    model = db.Column(db.String(2), nullable=False, default='65')
+    series = db.Column(db.Integer, nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    access_key = db.Column(db.String(44), nullable=False, unique=True)
+    environment = db.Column(db.Integer, nullable=False)  # 1 produção, 2 homologação
+    total = db.Column(db.Numeric(10, 2), nullable=False)
+    path = db.Column(db.String(255), nullable=False)     # Relativo à pasta de saída
+    issued_at = db.Column(db.DateTime, nullable=False)   # Data da venda (dhEmi)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
@@ -1,7 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from sqlalchemy.orm import joinedload, load_only
+from app.models.payroll import PayrollEntry
 from app.models.user import User, Employee
+from app.services import audit, jobs, payroll
+from app.services.pagination import keyset_paginate, per_page_arg, stream_listing, wants_stream
+from app.services.replica import read_only
 from app import db
-from datetime import datetime
+from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -13,18 +18,36 @@ def check_permissions():
         flash("Acesso restrito. Retornando ao Dashboard.")
         return redirect(url_for('inventory.inventory_dashboard'))
 
+def _user_with_employee(user_id):
+    return User.query.options(joinedload(User.employee)).filter(User.id == user_id).first_or_404()
+
 # --- 1. MÓDULO RH (DASHBOARD) ---
 @admin_bp.route('/rh')
+@read_only
 def hr_dashboard():
-    employees = Employee.query.all()
-    return render_template('admin/hr_dashboard.html', employees=employees)
+    query = Employee.query.options(load_only(
+        Employee.id, Employee.name, Employee.position, Employee.cpf,
+        Employee.admission_date, Employee.user_id
+    ))
+    if wants_stream():
+        return stream_listing('admin/hr_dashboard.html', query, Employee.id, 'employees')
+    page = keyset_paginate(query, Employee.id)
+    return render_template('admin/hr_dashboard.html', employees=page.items, page=page)
 
 # --- 2. GERENCIAMENTO DE USUÁRIOS (LISTAGEM) ---
 @admin_bp.route('/users')
+@read_only
 def list_users():
-    users = User.query.all()
+    # Colaborador vem no mesmo SELECT (JOIN), só com as colunas exibidas: sem N+1
+    query = User.query.options(
+        load_only(User.id, User.username, User.role),
+        joinedload(User.employee).load_only(Employee.id, Employee.name, Employee.cpf)
+    )
     # Note: O template deve estar em templates/users/list.html
-    return render_template('users/list.html', users=users)
+    if wants_stream():
+        return stream_listing('users/list.html', query, User.id, 'users')
+    page = keyset_paginate(query, User.id)
+    return render_template('users/list.html', users=page.items, page=page)
 
 # --- 3. CRIAR USUÁRIO E COLABORADOR (UNIFICADO) ---
 @admin_bp.route('/users/create', methods=['GET', 'POST'])
@@ -72,7 +95,8 @@ def create_user():
 # --- 4. EDIÇÃO DE USUÁRIO E RH ---
 @admin_bp.route('/users/edit/<int:user_id>', methods=['GET', 'POST'])
 def edit_user(user_id):
-    user = User.query.get_or_404(user_id)
+    # Usuário e RH numa única consulta (GET e POST)
+    user = _user_with_employee(user_id)
     
     # Bloqueio: Gerente não edita Admin
     if session.get('user_role') == 'gerente' and user.role == 'admin':
@@ -112,7 +136,7 @@ def edit_user(user_id):
 # --- 5. EXCLUSÃO ---
 @admin_bp.route('/users/delete/<int:user_id>')
 def delete_user(user_id):
-    user = User.query.get_or_404(user_id)
+    user = _user_with_employee(user_id)
     
     # Proteção para não deletar o admin principal
     if user.username == 'admin':
@@ -129,4 +153,82 @@ def delete_user(user_id):
         db.session.rollback()
         flash(f"Erro ao remover: {str(e)}")
         
-    return redirect(url_for('admin.list_users'))
\ No newline at end of file
+    return redirect(url_for('admin.list_users'))
+
+# --- 6. AUDITORIA (quem alterou o quê e quando) ---
+def _audit_filters():
+    args = request.args
+    try:
+        start = datetime.strptime(args['start'], '%Y-%m-%d') if args.get('start') else None
+        end = datetime.strptime(args['end'], '%Y-%m-%d') + timedelta(days=1) if args.get('end') else None
+    except ValueError:
+        start = end = None
+    return {
+        'entity': args.get('entity') or None,
+        'entity_id': args.get('entity_id') or None,
+        'user_id': args.get('user_id', type=int),
+        'start': start,
+        'end': end,
+        'before': args.get('before') or None,
+    }
+
+@admin_bp.route('/auditoria')
+@read_only
+def audit_log():
+    if session.get('user_role') != 'admin':
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    per_page = per_page_arg()
+    rows = audit.entries(limit=per_page + 1, **_audit_filters())
+    next_cursor = audit.encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    entries = [audit.as_dict(e) for e in rows[:per_page]]
+    return render_template('admin/audit.html', entries=entries, entities=sorted(audit.AUDITED),
+                           next_cursor=next_cursor)
+
+@admin_bp.route('/auditoria/api')
+@read_only
+def audit_api():
+    if session.get('user_role') != 'admin':
+        return jsonify({'error': 'Acesso restrito'}), 403
+
+    per_page = per_page_arg()
+    rows = audit.entries(limit=per_page + 1, **_audit_filters())
+    return jsonify({
+        'entries': [audit.as_dict(e) for e in rows[:per_page]],
+        'next': audit.encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    })
+
+# --- 7. FOLHA DE PAGAMENTO ---
+def _payroll_period(value):
+    try:
+        return payroll.period_start(value) if value else None
+    except ValueError:
+        return None
+
+@admin_bp.route('/rh/folha')
+@read_only
+def payroll_sheet():
+    computed = payroll.periods()
+    start = _payroll_period(request.args.get('period')) or (computed[0] if computed else payroll.period_start(datetime.now()))
+    query = payroll.entries_query(start)
+    context = {'period': start, 'periods': computed, 'summary': payroll.summary(start)}
+    if wants_stream():
+        return stream_listing('admin/payroll.html', query, PayrollEntry.employee_id, 'entries', **context)
+    page = keyset_paginate(query, PayrollEntry.employee_id)
+    return render_template('admin/payroll.html', entries=page.items, page=page, **context)
+
+@admin_bp.route('/rh/folha/calcular', methods=['POST'])
+def run_payroll():
+    start = _payroll_period(request.form.get('period'))
+    if start is None:
+        flash("Competência inválida (use AAAA-MM).")
+        return redirect(url_for('admin.payroll_sheet'))
+    try:
+        payroll.tables_for(start)
+    except RuntimeError as e:
+        flash(str(e))
+        return redirect(url_for('admin.payroll_sheet'))
+    # Todos os colaboradores em segundo plano; recalcular a mesma competência substitui a anterior
+    job = jobs.submit('payroll_run', {'period': start.strftime('%Y-%m')})
+    return redirect(url_for('jobs.detail', job_id=job.id))
@@ -1,18 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from sqlalchemy.orm import load_only
 from app.models.client import Client
+from app.services import clients, csv_import
+from app.services.pagination import keyset_paginate, stream_listing, wants_stream
+from app.services.replica import read_only
 from app import db
 
 client_bp = Blueprint('client', __name__, url_prefix='/clients')
 
 @client_bp.route('/')
+@read_only
 def list_clients():
-    clients = Client.query.all()
-    return render_template('clients/list.html', clients=clients)
+    query = Client.query.options(load_only(
+        Client.id, Client.name, Client.document, Client.phone, Client.city, Client.state
+    ))
+    # Busca por CPF/CNPJ (com ou sem pontuação) ou pelo início do nome
+    search = (request.args.get('q') or '').strip()
+    if search:
+        query = clients.filtered(query, search)
+    if wants_stream():
+        return stream_listing('clients/list.html', query, Client.id, 'clients')
+    page = keyset_paginate(query, Client.id)
+    return render_template('clients/list.html', clients=page.items, page=page)
 
 @client_bp.route('/create', methods=['GET', 'POST'])
 def create_client():
     if request.method == 'POST':
         try:
+            digits = Client.digits_of(request.form.get('document'))
+            if digits and db.session.query(Client.id).filter_by(document_digits=digits).first():
+                flash("Já existe um cliente com este CPF/CNPJ.")
+                return render_template('clients/create.html')
+
             new_client = Client(
                 name=request.form.get('name'),
                 document=request.form.get('document'),
@@ -32,4 +51,41 @@ def create_client():
             db.session.rollback()
             flash(f"Erro ao cadastrar cliente: {str(e)}")
             
-    return render_template('clients/create.html')
\ No newline at end of file
+    return render_template('clients/create.html')
+
+# --- IMPORTAÇÃO DE PLANILHA (CSV) ---
+@client_bp.route('/import', methods=['GET', 'POST'])
+def import_clients():
+    if session.get('user_role') not in ['admin', 'gerente']:
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    if request.method == 'POST':
+        file = request.files.get('csv_file')
+        if not file:
+            flash("Selecione um arquivo CSV.")
+            return redirect(request.url)
+        try:
+            job = csv_import.submit(file, 'clients', request.form.get('mode', 'insert'))
+            return redirect(url_for('jobs.detail', job_id=job.id))
+        except ValueError as e:
+            flash(str(e))
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Erro ao enviar CSV: {str(e)}")
+
+    return render_template('clients/import.html', modes=csv_import.MODES)
+
+# --- BUSCA PARA O PDV ---
+@client_bp.route('/api/search')
+@read_only
+def api_search():
+    return jsonify(clients.search(request.args.get('q', '')))
+
+@client_bp.route('/api/document/<path:document>')
+@read_only
+def api_by_document(document):
+    client = clients.by_document(document)
+    if client:
+        return jsonify(client)
+    return jsonify({'error': 'Cliente não encontrado'}), 404
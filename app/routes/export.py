@@ -0,0 +1,45 @@
+from datetime import datetime
+from flask import Blueprint, Response, abort, flash, redirect, request, session, stream_with_context, url_for
+from app.services import export, sales_rollups
+from app.services.replica import read_only
+
+export_bp = Blueprint('export', __name__, url_prefix='/exportar')
+
+@export_bp.app_context_processor
+def export_formats():
+    # Formatos disponíveis nos botões de exportação (XLSX só com openpyxl instalado)
+    return {'export_formats': export.formats()}
+
+# --- 1. DOWNLOAD (CSV/XLSX em fluxo) ---
+@export_bp.route('/<name>.<fmt>')
+@read_only
+def download(name, fmt):
+    dataset = export.DATASETS.get(name)
+    if dataset is None or fmt not in export.FORMATS:
+        abort(404)
+    if 'user_id' not in session:
+        return redirect(url_for('auth.login'))
+    if not dataset.allowed(session.get('user_id'), session.get('user_role')):
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+    if fmt not in export.formats():
+        flash("Exportação XLSX indisponível no servidor (pacote openpyxl). Use CSV.")
+        return redirect(request.referrer or url_for('inventory.inventory_dashboard'))
+
+    # Vendas: mesmo filtro do relatório (?period=day|month|year&date=AAAA-MM-DD); sem period, tudo
+    start = end = None
+    suffix = datetime.now().strftime('%Y%m%d')
+    period = request.args.get('period')
+    if dataset.date_column is not None and period in ('day', 'month', 'year'):
+        try:
+            ref = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d')
+        except ValueError:
+            ref = datetime.now()
+        _, start, end = sales_rollups.period_range(period, ref)
+        suffix = start.strftime({'day': '%Y%m%d', 'month': '%Y%m', 'year': '%Y'}[period])
+
+    response = Response(stream_with_context(export.generate(dataset, fmt, start, end)),
+                        mimetype=export.FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={name}_{suffix}.{fmt}'
+    response.headers['X-Accel-Buffering'] = 'no'  # proxy (nginx) repassa cada pedaço sem segurar
+    return response
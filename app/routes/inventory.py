@@ -1,72 +1,81 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from sqlalchemy.orm import load_only
 from app.models.inventory import Product, StockIn
+from app.services.search_index import product_index
+from app.services import catalog, csv_import, holds, jobs, reorder, repricing, valuation, sales_rollups, stock_ledger
+from app.services.http_cache import cached
+from app.services.replica import read_only
+from app.services.pagination import keyset_paginate, per_page_arg, stream_listing, wants_stream
 from app import db
 
 inventory_bp = Blueprint('inventory', __name__, url_prefix='/inventory')
 
 # --- 1. DASHBOARD ESTRATÉGICO ---
 @inventory_bp.route('/dashboard')
+@read_only
+@cached(per_role=True, version=catalog.current_version)  # estoque e valor patrimonial mudam com as vendas
 def inventory_dashboard():
-    # Busca produtos reais do banco
-    products = Product.query.all()
-    
-    # Cálculos Patrimoniais Reais
-    total_cost = sum((p.stock or 0) * float(p.cost_price or 0) for p in products)
-    total_sale = sum((p.stock or 0) * float(p.price or 0) for p in products)
-    
-    # Filtra itens com estoque baixo (entre 1 e 5)
-    low_stock = [p for p in products if 0 < (p.stock or 0) <= 5]
+    # Valores patrimoniais vêm do snapshot mantido por deltas (não varre products)
+    totals = valuation.read()
+    total_cost = totals['total_cost']
+    total_sale = totals['total_sale']
     
+    # Itens com estoque baixo (entre 1 e 5)
+    low_stock_count = totals['low_stock']
+
+    # Sugestões de compra pré-calculadas (os workers recalculam quando há vendas novas)
+    reorder_count = reorder.needs_count()
+
     # Ranking de produtos (Top 5 por quantidade em estoque)
     top_products = Product.query.filter(Product.stock > 0).order_by(Product.stock.desc()).limit(5).all()
 
-    # Formas de Pagamento (Iniciam zeradas - serão alimentadas pelo módulo de vendas)
-    payment_stats = [
-        {'method': 'Pix', 'count': 0, 'color': '#00ff88'},
-        {'method': 'Dinheiro', 'count': 0, 'color': '#ffcc00'},
-        {'method': 'Cartão Crédito', 'count': 0, 'color': '#3498db'},
-        {'method': 'Cartão Débito', 'count': 0, 'color': '#9b59b6'}
-    ]
+    # Formas de Pagamento (% das vendas dos últimos 30 dias, dos totais pré-agregados)
+    payment_stats, sales_count = sales_rollups.payment_share(days=30)
 
     return render_template('inventory/dashboard.html', 
                            total_cost=total_cost, 
                            total_sale=total_sale, 
-                           low_stock=low_stock,
+                           low_stock_count=low_stock_count,
+                           reorder_count=reorder_count,
                            top_products=top_products,
                            payment_stats=payment_stats,
+                           sales_count=sales_count,
                            potential_profit=total_sale - total_cost)
 
 # --- 2. LISTAGEM PRINCIPAL ---
 @inventory_bp.route('/products')
+@read_only
+@cached(per_role=True, version=catalog.current_version)  # coluna de estoque muda com as vendas
 def list_products():
+    # Só as colunas exibidas na tabela
+    query = Product.query.options(load_only(
+        Product.id, Product.code, Product.name, Product.ncm, Product.cfop,
+        Product.cost_price, Product.price, Product.discount, Product.stock, Product.unit
+    ))
     search = request.args.get('search')
     if search:
-        products = Product.query.filter(
+        query = query.filter(
             (Product.name.ilike(f'%{search}%')) | (Product.code == search)
-        ).all()
-    else:
-        products = Product.query.all()
-    return render_template('inventory/list.html', products=products)
+        )
+
+    # ?all=1 envia a lista completa em fluxo; senão pagina por cursor (?after=id)
+    if wants_stream():
+        return stream_listing('inventory/list.html', query, Product.id, 'products')
+    page = keyset_paginate(query, Product.id)
+    return render_template('inventory/list.html', products=page.items, page=page)
 
 # --- 3. API PARA BUSCA DINÂMICA (Autocomplete) ---
 @inventory_bp.route('/api/search')
+@read_only
+@cached(fresh=holds.refresh)
 def api_search():
     query = request.args.get('q', '')
     if len(query) < 2: 
         return jsonify([])
     
-    products = Product.query.filter(
-        (Product.name.ilike(f'%{query}%')) | (Product.code.ilike(f'%{query}%'))
-    ).limit(10).all()
-    
-    return jsonify([{
-        'id': p.id, 
-        'code': p.code, 
-        'name': p.name, 
-        'price': float(p.final_price), 
-        'stock': p.stock
-    } for p in products])
+    # Responde do índice em memória (sem LIKE '%...%' no banco); disponível já desconta as reservas
+    return jsonify([holds.with_available(item) for item in product_index.search(query, limit=10)])
 
 # --- 4. CADASTRO MANUAL ---
 @inventory_bp.route('/add', methods=['GET', 'POST'])
@@ -89,7 +98,11 @@ def add_product():
                 cfop=request.form.get('cfop') or '5102'
             )
             db.session.add(new_prod)
+            db.session.flush()
+            valuation.apply(valuation.Delta().change(None, valuation.snapshot_of(new_prod)))
+            stock_ledger.record([stock_ledger.movement(new_prod.id, new_prod.stock, 'manual', 'cadastro')])
             db.session.commit()
+            product_index.upsert(new_prod)
             flash(f"Produto '{name}' cadastrado com sucesso!")
             return redirect(url_for('inventory.list_products'))
         except Exception as e:
@@ -107,58 +120,17 @@ def import_xml():
             flash("Selecione um arquivo XML.")
             return redirect(request.url)
         try:
-            tree = ET.parse(file)
-            root = tree.getroot()
-            ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-            items = root.findall('.//nfe:det', ns)
-            
-            with db.session.no_autoflush:
-                for item in items:
-                    prod_data = item.find('nfe:prod', ns)
-                    if prod_data is None: continue
-
-                    def get_text(node, tag):
-                        el = node.find(tag, ns)
-                        return el.text if el is not None else None
-
-                    ean = get_text(prod_data, 'nfe:cEAN') or "SEM_GTIN"
-                    product_name = get_text(prod_data, 'nfe:xProd')
-                    
-                    # Tenta encontrar o produto pelo EAN ou pelo Nome exato
-                    product = Product.query.filter(
-                        (Product.code == ean) | (Product.name == product_name)
-                    ).first()
-                    
-                    q_com = int(float(get_text(prod_data, 'nfe:qCom') or 0))
-                    v_un = float(get_text(prod_data, 'nfe:vUnCom') or 0)
-                    xml_ncm = get_text(prod_data, 'nfe:NCM') or '00000000'
-                    xml_cfop = get_text(prod_data, 'nfe:CFOP') or '5102'
-
-                    if product:
-                        # Se já existe, atualiza estoque e custo
-                        product.stock += q_com
-                        product.cost_price = v_un
-                        product.ncm = xml_ncm
-                    else:
-                        # Se não existe, cria novo
-                        new_p = Product(
-                            code=ean, 
-                            name=product_name,
-                            stock=q_com, 
-                            cost_price=v_un, 
-                            price=v_un * 1.5, # Margem padrão 50%
-                            unit=get_text(prod_data, 'nfe:uCom') or 'UN',
-                            ncm=xml_ncm, 
-                            cfop=xml_cfop
-                        )
-                        db.session.add(new_p)
-            
-            db.session.commit()
-            flash("Importação de XML concluída!")
-            return redirect(url_for('inventory.list_products'))
+            # Aceita um XML ou um .zip com várias notas. O arquivo fica guardado
+            # e a importação roda em segundo plano (a tela acompanha o progresso)
+            path = jobs.spool_path(file.filename)
+            file.save(path)
+            job = jobs.submit('nfe_import', {'path': path, 'filename': file.filename})
         except Exception as e:
             db.session.rollback()
-            flash(f"Erro ao processar XML: {str(e)}")
+            flash(f"Erro ao enviar XML: {str(e)}")
+            return render_template('inventory/import.html')
+
+        return redirect(url_for('jobs.detail', job_id=job.id))
             
     return render_template('inventory/import.html')
 
@@ -168,6 +140,7 @@ def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     if request.method == 'POST':
         try:
+            before = valuation.snapshot_of(product)
             product.name = request.form.get('name')
             product.code = request.form.get('code')
             product.cost_price = float(request.form.get('cost_price') or 0)
@@ -178,7 +151,12 @@ def edit_product(product_id):
             product.ncm = request.form.get('ncm')
             product.cfop = request.form.get('cfop')
             
+            valuation.apply(valuation.Delta().change(before, valuation.snapshot_of(product)))
+            stock_ledger.record([stock_ledger.movement(
+                product.id, product.stock - (before[0] or 0), 'manual', 'edição', kind=stock_ledger.ADJUST
+            )])
             db.session.commit()
+            product_index.upsert(product)
             flash("Produto atualizado com sucesso!")
             return redirect(url_for('inventory.list_products'))
         except Exception as e:
@@ -191,10 +169,111 @@ def edit_product(product_id):
 def delete_product(product_id):
     try:
         product = Product.query.get_or_404(product_id)
+        valuation.apply(valuation.Delta().change(valuation.snapshot_of(product), None))
+        stock_ledger.record([stock_ledger.movement(
+            product.id, -(product.stock or 0), 'manual', 'exclusão', kind=stock_ledger.ADJUST
+        )])
         db.session.delete(product)
         db.session.commit()
+        product_index.remove(product_id)
         flash("Produto removido do sistema.")
     except Exception as e:
         db.session.rollback()
         flash(f"Erro ao remover: {str(e)}")
-    return redirect(url_for('inventory.list_products'))
\ No newline at end of file
+    return redirect(url_for('inventory.list_products'))
+
+# --- 7. HISTÓRICO DE ESTOQUE (livro de movimentações) ---
+@inventory_bp.route('/api/stock/<int:product_id>')
+def api_stock_history(product_id):
+    # ?date=AAAA-MM-DD -> estoque no fim do dia; ?start=&end= -> movimentações do período
+    try:
+        if request.args.get('date'):
+            when = datetime.strptime(request.args['date'], '%Y-%m-%d') + timedelta(days=1)
+            return jsonify({'product_id': product_id, 'date': request.args['date'],
+                            'stock': stock_ledger.stock_at(product_id, when)})
+
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('end') else datetime.now()
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else end - timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': 'Data inválida (use AAAA-MM-DD)'}), 400
+
+    return jsonify({
+        'product_id': product_id,
+        'opening_stock': stock_ledger.stock_at(product_id, start),
+        'movements': stock_ledger.history(product_id, start, end)
+    })
+
+# --- 8. CATÁLOGO PARA O PDV (cópia local com sincronização incremental) ---
+@inventory_bp.route('/api/catalog')
+@read_only
+@cached(version=catalog.current_version)  # o PDV sincroniza o estoque por aqui: muda com as vendas
+def api_catalog():
+    # Sem ?since: catálogo inteiro. Com ?since=N: só o que mudou depois da versão N
+    since = request.args.get('since', type=int)
+    return jsonify(catalog.snapshot() if since is None else catalog.delta(since))
+
+# --- 9. REAJUSTE DE PREÇOS EM MASSA ---
+@inventory_bp.route('/reprice', methods=['GET', 'POST'])
+def reprice():
+    if session.get('user_role') not in ['admin', 'gerente']:
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    categories = [c for (c,) in db.session.query(Product.category).filter(
+        Product.category.isnot(None)).distinct().order_by(Product.category)]
+    spec, result = None, None
+    if request.method == 'POST':
+        try:
+            spec = repricing.parse_spec(request.form)
+            if request.form.get('action') == 'apply':
+                # Roda em segundo plano; a tela da tarefa mostra o resultado
+                job = jobs.submit('reprice', spec)
+                return redirect(url_for('jobs.detail', job_id=job.id))
+            # Prévia: nada é gravado
+            result = repricing.preview(spec)
+        except ValueError as e:
+            flash(str(e))
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Erro ao reajustar: {str(e)}")
+
+    return render_template('inventory/reprice.html', categories=categories, spec=spec, result=result,
+                           fields=repricing.FIELDS, modes=repricing.MODES)
+
+# --- 10. SUGESTÃO DE COMPRAS (giro de vendas) ---
+@inventory_bp.route('/reorder')
+@read_only
+def reorder_suggestions():
+    category = request.args.get('category') or None
+    only_needed = request.args.get('view') != 'all'
+    categories = [c for (c,) in db.session.query(Product.category).filter(
+        Product.category.isnot(None)).distinct().order_by(Product.category)]
+    rows = reorder.suggestions(category=category, only_needed=only_needed, limit=per_page_arg())
+    window, lead, cover = reorder.settings()
+    return render_template('inventory/reorder.html', rows=rows, categories=categories,
+                           category=category, only_needed=only_needed,
+                           window=window, lead=lead, cover=cover)
+
+# --- 11. IMPORTAÇÃO DE PLANILHA (CSV) ---
+@inventory_bp.route('/import-csv', methods=['GET', 'POST'])
+def import_csv():
+    if session.get('user_role') not in ['admin', 'gerente']:
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    if request.method == 'POST':
+        file = request.files.get('csv_file')
+        if not file:
+            flash("Selecione um arquivo CSV.")
+            return redirect(request.url)
+        try:
+            # Validação e gravação em lotes, em segundo plano (a tela mostra os erros por linha)
+            job = csv_import.submit(file, 'products', request.form.get('mode', 'insert'))
+            return redirect(url_for('jobs.detail', job_id=job.id))
+        except ValueError as e:
+            flash(str(e))
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Erro ao enviar CSV: {str(e)}")
+
+    return render_template('inventory/import_csv.html', modes=csv_import.MODES)
@@ -0,0 +1,64 @@
+import json
+from flask import Blueprint, render_template, jsonify, request, redirect, url_for, flash, session
+from app.models.job import Job
+from app import db
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/tarefas')
+
+LABELS = {
+    'nfe_import': 'Importação de NF-e',
+    'reprice': 'Reajuste de preços',
+    'rebuild_rollups': 'Recálculo dos relatórios',
+    'refresh_reorder': 'Sugestão de compras',
+    'csv_import': 'Importação de planilha (CSV)',
+    'nfce_emit': 'Emissão de NFC-e',
+    'payroll_run': 'Folha de pagamento'
+}
+
+
+def _as_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'label': LABELS.get(job.kind, job.kind),
+        'status': job.status,
+        'progress': job.progress or 0,
+        'message': job.message,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'error': job.error,
+        'result': json.loads(job.result) if job.result else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+# Proteção de Rota: Admin e Gerente veem todas as tarefas; os demais, só as que pediram
+@jobs_bp.before_request
+def check_permissions():
+    if session.get('user_role') in ['admin', 'gerente']:
+        return None
+    job_id = (request.view_args or {}).get('job_id')
+    if job_id is not None and session.get('user_id') is not None:
+        owner = db.session.query(Job.user_id).filter(Job.id == job_id).scalar()
+        if owner == session.get('user_id'):
+            return None
+    if request.endpoint == 'jobs.api_status':
+        return jsonify({'error': 'Acesso restrito'}), 403
+    flash("Acesso restrito. Retornando ao Dashboard.")
+    return redirect(url_for('inventory.inventory_dashboard'))
+
+# --- 1. TAREFAS RECENTES ---
+@jobs_bp.route('/')
+def list_jobs():
+    recent = Job.query.order_by(Job.id.desc()).limit(50).all()
+    return render_template('jobs/list.html', jobs=recent, labels=LABELS)
+
+# --- 2. ACOMPANHAMENTO (a página consulta a API até terminar) ---
+@jobs_bp.route('/<int:job_id>')
+def detail(job_id):
+    job = Job.query.get_or_404(job_id)
+    return render_template('jobs/detail.html', job=_as_dict(job))
+
+@jobs_bp.route('/api/<int:job_id>')
+def api_status(job_id):
+    return jsonify(_as_dict(Job.query.get_or_404(job_id)))
@@ -1,43 +1,330 @@
-from flask import Blueprint, render_template, request, jsonify
+import os
+from datetime import datetime
+from flask import Blueprint, abort, current_app, render_template, request, jsonify, send_file, session, flash, redirect, url_for
+from sqlalchemy import case, insert, update
 from app.models.inventory import Product
+from app.models.sales import FiscalDocument, Sale, SaleItem
+from app.services.search_index import product_index
+from app.services import catalog, clients, holds, jobs, nfce, valuation, sales_rollups, stock_ledger
+from app.services.http_cache import cached
+from app.services.replica import read_only
 from app import db
 
 sales_bp = Blueprint('sales', __name__, url_prefix='/vendas')
 
 @sales_bp.route('/')
 def pos():
-    return render_template('sales/pos.html')
+    holds.terminal_id()
+    return render_template('sales/pos.html', hold_ttl=current_app.config.get('HOLDS_TTL', holds.DEFAULT_TTL))
 
 @sales_bp.route('/buscar')
+@read_only
+@cached(fresh=holds.refresh)
 def search_product():
     query = request.args.get('q', '')
-    product = Product.query.filter((Product.code == query) | (Product.name.ilike(f'%{query}%'))).first()
+    # Leitura de código de barras cai direto no dicionário de códigos
+    product = product_index.lookup_code(query)
+    if not product:
+        results = product_index.search(query, limit=1)
+        product = results[0] if results else None
     if product:
         return jsonify({
-            'code': product.code,
-            'name': product.name,
-            'price': float(product.final_price),
-            'stock': product.stock
+            'code': product['code'],
+            'name': product['name'],
+            'price': product['price'],
+            'stock': product['stock'],
+            'available': holds.available(product['id'], product['stock'])
         })
     return jsonify({'error': 'Não encontrado'}), 404
 
+# Reservas do carrinho: o PDV chama ao incluir/alterar/remover item
+@sales_bp.route('/reservas', methods=['POST'])
+def reserve_item():
+    data = request.get_json() or {}
+    code = str(data.get('code') or '')
+    try:
+        qty = int(data.get('qty') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Quantidade inválida'}), 400
+    try:
+        result = holds.reserve(holds.terminal_id(), code, qty)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    if result is None:
+        return jsonify({'error': 'Produto não encontrado'}), 404
+    return jsonify(result)
+
+@sales_bp.route('/reservas/renovar', methods=['POST'])
+def renew_holds():
+    return jsonify({'renewed': holds.renew(holds.terminal_id())})
+
+@sales_bp.route('/reservas/liberar', methods=['POST'])
+def release_holds():
+    count = holds.release(holds.terminal_id())
+    db.session.commit()
+    return jsonify({'released': count})
+
 @sales_bp.route('/finalizar', methods=['POST'])
 def finalize_sale():
-    data = request.get_json()
-    cart = data.get('cart', [])
-    
-    try:
-        for item in cart:
-            p = Product.query.filter_by(code=item['code']).first()
-            if p:
-                if p.stock < item['qty']:
-                    return jsonify({'error': f'Estoque insuficiente para: {p.name}'}), 400
-                
-                # AQUI ACONTECE A BAIXA
-                p.stock -= int(item['qty'])
-        
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Dados da venda inválidos'}), 400
+    cart = data.get('cart') or []
+    payment_method = data.get('payment_method') or 'dinheiro'
+    client_id = data.get('client_id')
+    if payment_method not in sales_rollups.PAYMENT_LABELS:
+        return jsonify({'error': f"Forma de pagamento inválida: {payment_method}"}), 400
+    try:
+        installments = int(data.get('installments') or 1)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Número de parcelas inválido'}), 400
+    if installments < 1:
+        return jsonify({'error': 'Número de parcelas inválido'}), 400
+    if not isinstance(cart, list):
+        return jsonify({'error': 'Carrinho inválido'}), 400
+    if client_id is not None:
+        try:
+            client_id = int(client_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Cliente inválido'}), 400
+
+    # Agrupa linhas repetidas do carrinho por código
+    qty_by_code = {}
+    for item in cart:
+        if not isinstance(item, dict) or item.get('code') in (None, ''):
+            return jsonify({'error': 'Item do carrinho sem código'}), 400
+        try:
+            qty = int(item.get('qty') or 0)
+        except (TypeError, ValueError):
+            qty = 0
+        if qty <= 0:
+            return jsonify({'error': f"Quantidade inválida para: {item.get('code')}"}), 400
+        code = str(item['code'])
+        qty_by_code[code] = qty_by_code.get(code, 0) + qty
+
+    if not qty_by_code:
+        return jsonify({'error': 'Carrinho vazio'}), 400
+
+    try:
+        # Cliente escolhido no PDV já está no cache da busca (sem consulta extra)
+        if client_id is not None:
+            client = clients.get(client_id)
+            if not client:
+                return jsonify({'error': 'Cliente não encontrado'}), 400
+            client_id = client['id']
+
+        # 1. Uma única consulta para todos os produtos do carrinho
+        products = {p.code: p for p in Product.query.filter(Product.code.in_(list(qty_by_code))).all()}
+        missing = [code for code in qty_by_code if code not in products]
+        if missing:
+            return jsonify({'error': f"Produto não encontrado: {', '.join(missing)}"}), 400
+
+        qty_by_id = {products[code].id: qty for code, qty in qty_by_code.items()}
+
+        # 2. Baixa atômica e condicional em um único UPDATE:
+        #    stock = stock - q WHERE stock - (reservas de outros terminais) >= q.
+        #    Se alguma linha não for afetada, outro terminal vendeu ou reservou antes
+        #    e a venda inteira é desfeita.
+        terminal = holds.terminal_id()
+        qty_case = case(qty_by_id, value=Product.id)
+        result = db.session.execute(
+            update(Product)
+            .where(Product.id.in_(list(qty_by_id)), Product.stock - holds.others_held(terminal) >= qty_case)
+            .values(stock=Product.stock - qty_case, version=catalog.stamp(stock_only=True))
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != len(qty_by_id):
+            db.session.rollback()
+            current = dict(db.session.query(Product.id, Product.stock - holds.others_held(terminal))
+                           .filter(Product.id.in_(list(qty_by_id))).all())
+            short = [p.name for p in products.values() if (current.get(p.id) or 0) < qty_by_id[p.id]]
+            return jsonify({'error': f"Estoque insuficiente (ou reservado em outro caixa) para: "
+                                     f"{', '.join(short) or 'item do carrinho'}"}), 400
+
+        # Baixa o valor do estoque pelo delta dos itens vendidos. O estoque lido no passo 1
+        # pode ter mudado até o UPDATE: relê as linhas já baixadas (travadas por esta transação)
+        delta = valuation.Delta()
+        for pid, stock, cost, price in db.session.query(
+            Product.id, Product.stock, Product.cost_price, Product.price
+        ).filter(Product.id.in_(list(qty_by_id))).with_for_update():
+            delta.change((stock + qty_by_id[pid], cost, price), (stock, cost, price))
+        valuation.apply(delta)
+
+        # 3. Registro da venda (cabeçalho + itens em lote)
+        lines = []
+        subtotal = 0.0
+        for code, qty in qty_by_code.items():
+            p = products[code]
+            line_total = round(p.final_price * qty, 2)
+            subtotal += line_total
+            lines.append({
+                'product_id': p.id,
+                'code': p.code,
+                'name': p.name,
+                'quantity': qty,
+                'unit_price': round(p.final_price, 2),
+                'cost_price': float(p.cost_price or 0),
+                'total': line_total
+            })
+
+        # Mesma regra do PDV: +4% por parcela no crédito
+        total = subtotal
+        if payment_method == 'credito' and installments > 1:
+            total = subtotal * (1 + (0.04 * installments))
+
+        sale = Sale(
+            created_at=datetime.now(),
+            user_id=session.get('user_id'),
+            client_id=client_id,
+            payment_method=payment_method,
+            installments=installments,
+            items_count=sum(qty_by_code.values()),
+            subtotal=round(subtotal, 2),
+            total=round(total, 2)
+        )
+        db.session.add(sale)
+        db.session.flush()
+
+        for line in lines:
+            line['sale_id'] = sale.id
+        db.session.execute(insert(SaleItem), lines)
+        stock_ledger.record([
+            stock_ledger.movement(pid, -qty, 'sale', sale.id) for pid, qty in qty_by_id.items()
+        ])
+
+        # Totais por hora/dia (relatórios e dashboard)
+        sales_rollups.record_sale(sale.created_at, payment_method, sale.total, [
+            (line['product_id'], line['name'], products[line['code']].category, line['quantity'], line['total'])
+            for line in lines
+        ])
+
+        # O que foi vendido deixa de estar reservado para este terminal
+        holds.release(terminal, qty_by_id)
         db.session.commit()
-        return jsonify({'success': True})
+        product_index.adjust_stock({pid: -qty for pid, qty in qty_by_id.items()})
+        return jsonify({'success': True, 'sale_id': sale.id, 'total': round(total, 2)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@sales_bp.route('/relatorios')
+@read_only
+def reports():
+    if session.get('user_role') not in ['admin', 'gerente']:
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    period = request.args.get('period', 'day')
+    if period not in ('day', 'month', 'year'):
+        period = 'day'
+    try:
+        ref = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d')
+    except ValueError:
+        ref = datetime.now()
+
+    # Lê apenas os totais pré-agregados (sales_rollups)
+    data = sales_rollups.report(period, ref)
+    return render_template('sales/reports.html', report=data, period=period, ref=ref)
+
+
+@sales_bp.route('/relatorios/recalcular', methods=['POST'])
+def rebuild_reports():
+    if session.get('user_role') != 'admin':
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    # Recalcula os totais a partir das vendas em segundo plano
+    job = jobs.submit('rebuild_rollups')
+    return redirect(url_for('jobs.detail', job_id=job.id))
+
+
+# --- NFC-e: emissão em lote (tarefa), por venda e download do XML ---
+def _period_args(source):
+    period = source.get('period', 'day')
+    if period not in ('day', 'month', 'year'):
+        period = 'day'
+    try:
+        ref = datetime.strptime(source.get('date', ''), '%Y-%m-%d')
+    except ValueError:
+        ref = datetime.now()
+    return period, ref
+
+
+@sales_bp.route('/nfce')
+def fiscal_documents():
+    if session.get('user_role') not in ['admin', 'gerente']:
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    period, ref = _period_args(request.args)
+    _, start, end = sales_rollups.period_range(period, ref)
+    try:
+        nfce.emitter_settings()
+        config_error = None
+    except RuntimeError as e:
+        config_error = str(e)
+    return render_template('sales/nfce.html', documents=nfce.recent(), pending=nfce.pending_count(start, end),
+                           period=period, ref=ref, config_error=config_error)
+
+
+@sales_bp.route('/nfce/emitir', methods=['POST'])
+def emit_fiscal_documents():
+    if session.get('user_role') not in ['admin', 'gerente']:
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    period, ref = _period_args(request.form)
+    _, start, end = sales_rollups.period_range(period, ref)
+    try:
+        nfce.emitter_settings()
+    except RuntimeError as e:
+        flash(str(e))
+        return redirect(url_for('sales.fiscal_documents', period=period, date=ref.strftime('%Y-%m-%d')))
+    # Lote inteiro em segundo plano; a tela da tarefa mostra o resumo da validação
+    job = jobs.submit('nfce_emit', {'start': start.isoformat(), 'end': end.isoformat()})
+    return redirect(url_for('jobs.detail', job_id=job.id))
+
+
+@sales_bp.route('/<int:sale_id>/nfce', methods=['POST'])
+def emit_sale_document(sale_id):
+    if session.get('user_role') not in ['admin', 'gerente']:
+        return jsonify({'error': 'Acesso restrito'}), 403
+    try:
+        summary = nfce.emit(sale_ids=[sale_id])
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+    if summary['invalid']:
+        return jsonify({'error': 'Venda com dados fiscais inválidos', 'errors': summary['examples'][0]['errors']}), 400
+
+    document = FiscalDocument.query.filter_by(sale_id=sale_id).first()
+    if document is None:
+        return jsonify({'error': 'Venda não encontrada'}), 404
+    return jsonify({
+        'success': True,
+        'created': bool(summary['emitted']),
+        'number': document.number,
+        'series': document.series,
+        'access_key': document.access_key,
+        'url': url_for('sales.download_fiscal_document', document_id=document.id)
+    })
+
+
+@sales_bp.route('/nfce/<int:document_id>.xml')
+def download_fiscal_document(document_id):
+    if session.get('user_role') not in ['admin', 'gerente']:
+        flash("Acesso restrito. Retornando ao Dashboard.")
+        return redirect(url_for('inventory.inventory_dashboard'))
+
+    document = db.session.get(FiscalDocument, document_id)
+    if document is None:
+        abort(404)
+    path = nfce.file_path(document)
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype='application/xml', as_attachment=True,
+                     download_name=f'{document.access_key}-nfce.xml')
@@ -0,0 +1,352 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+
+from flask import current_app, has_app_context, has_request_context, request, session as flask_session
+from sqlalchemy import event, insert, inspect, select, tuple_
+
+from app import db
+from app.models.audit import AuditEntry
+
+# Trilha de auditoria sem custo de escrita na requisição:
+#   - after_flush captura antes/depois das linhas alteradas pelo ORM (cadastros, edições)
+#   - do_orm_execute captura INSERT/UPDATE/DELETE em lote (venda, importações, reajuste);
+#     UPDATE por conjunto (WHERE) lê as linhas antes e depois: um registro por linha
+#   - as alterações ficam na sessão até o commit (rollback descarta) e vão para
+#     uma fila em memória; um escritor em segundo plano grava em lote (executemany)
+#   - fila limitada: cheia, quem alterou grava na hora (nada se perde); na saída
+#     do processo o que restou na fila é gravado
+# Senhas e afins nunca vão para o log.
+
+AUDITED = {'products', 'users', 'employees', 'clients', 'sales'}
+IGNORED_FIELDS = {'version', 'search_name', 'document_digits'}  # controle interno, derivados
+MASKED_FIELDS = ('password', 'secret', 'token')
+MASK = '***'
+BULK_SAMPLE = 20     # linhas de parâmetros guardadas de um comando em lote
+SQL_MAX_LEN = 1000
+READ_CHUNK = 1000    # ids por SELECT na releitura de um UPDATE por conjunto
+PENDING = 'audit_pending'
+ACTOR = 'audit_actor'
+
+logger = logging.getLogger(__name__)
+
+
+def _enabled():
+    return has_app_context() and current_app.config.get('AUDIT_ENABLED', True)
+
+
+def _actor(session):
+    """(usuário, origem) da alteração: tarefa em segundo plano ou tela da requisição."""
+    actor = session.info.get(ACTOR)
+    if actor is not None:
+        return actor
+    if has_request_context():
+        return flask_session.get('user_id'), request.endpoint
+    return None, None
+
+
+def _mask(field, value):
+    if value is not None and any(m in field for m in MASKED_FIELDS):
+        return MASK
+    return value
+
+
+def _entry(session, entity, entity_id, action, changes):
+    user_id, source = _actor(session)
+    return {
+        'created_at': datetime.now(),
+        'user_id': user_id,
+        'entity': entity,
+        'entity_id': entity_id,
+        'action': action,
+        'changes': changes,  # vira JSON no escritor, fora da requisição
+        'source': (source or '')[:60] or None
+    }
+
+
+def _pending(session):
+    return session.info.setdefault(PENDING, [])
+
+
+# --- CAPTURA ---
+def _diff(state, action):
+    changes = {}
+    for attr in state.mapper.column_attrs:
+        key = attr.key
+        if key in IGNORED_FIELDS:
+            continue
+        if action == 'update':
+            history = state.attrs[key].history
+            if not history.has_changes():
+                continue
+            old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if old == new:
+                continue
+        elif action == 'insert':
+            old, new = None, state.dict.get(key)
+            if new is None:
+                continue
+        else:
+            old, new = state.dict.get(key), None
+            if old is None:
+                continue
+        changes[key] = [_mask(key, old), _mask(key, new)]
+    return changes
+
+
+@event.listens_for(db.session, 'after_flush')
+def _capture_flush(session, flush_context):
+    # Depois do flush: os novos já têm id e o histórico dos atributos ainda está lá
+    if not _enabled():
+        return
+    for action, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            state = inspect(obj)
+            entity = state.mapper.local_table.name
+            if entity not in AUDITED:
+                continue
+            changes = _diff(state, action)
+            if action == 'update' and not changes:
+                continue
+            identity = state.identity or state.mapper.primary_key_from_instance(obj)
+            entity_id = ','.join(str(v) for v in identity if v is not None) or None
+            _pending(session).append(_entry(session, entity, entity_id, action, changes))
+
+
+def _masked_sql(sql):
+    return any(m in sql.lower() for m in MASKED_FIELDS)
+
+
+def _row_values(table, row):
+    return {c.key: row[i] for i, c in enumerate(table.columns)}
+
+
+def _read_rows(session, table, key, ids):
+    values = {}
+    for i in range(0, len(ids), READ_CHUNK):
+        for row in session.execute(select(*table.columns).where(key.in_(ids[i:i + READ_CHUNK]))):
+            values[row._mapping[key]] = _row_values(table, row)
+    return values
+
+
+def _capture_set_update(orm_state, table):
+    """UPDATE ... WHERE: lê as linhas afetadas antes (travadas) e depois; um registro por linha.
+
+    Sem RETURNING no MySQL: o SELECT ... FOR UPDATE com o mesmo WHERE trava o conjunto,
+    então o UPDATE que vem em seguida atinge exatamente essas linhas."""
+    session = orm_state.session
+    key = table.primary_key.columns.values()[0]
+    before = {}
+    for row in session.execute(
+        select(*table.columns).where(orm_state.statement.whereclause).with_for_update(),
+        orm_state.parameters or None
+    ):
+        before[row._mapping[key]] = _row_values(table, row)
+    result = orm_state.invoke_statement()
+    after = _read_rows(session, table, key, list(before))
+    for entity_id, old in before.items():
+        new = after.get(entity_id)
+        if new is None:
+            continue
+        changes = {k: [_mask(k, old[k]), _mask(k, new[k])]
+                   for k in old if k not in IGNORED_FIELDS and old[k] != new[k]}
+        if changes:
+            _pending(session).append(_entry(session, table.name, str(entity_id), 'update', changes))
+    return result
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _capture_bulk(orm_state):
+    if orm_state.is_select or not _enabled():
+        return None
+    statement = orm_state.statement
+    table = getattr(statement, 'table', None)
+    entity = getattr(table, 'name', None)
+    if entity not in AUDITED:
+        return None
+
+    session = orm_state.session
+    params = orm_state.parameters
+    rows = list(params) if isinstance(params, (list, tuple)) else ([params] if params else [])
+    if (orm_state.is_update and len(rows) <= 1 and statement.whereclause is not None
+            and len(table.primary_key.columns) == 1):
+        return _capture_set_update(orm_state, table)
+    result = orm_state.invoke_statement()
+    action = 'bulk_insert' if orm_state.is_insert else 'bulk_update' if orm_state.is_update else 'bulk_delete'
+    # SQL e parâmetros já compilados pela execução (nada é recompilado aqui)
+    context = getattr(result, 'context', None)
+    sql = context.statement if context is not None else f'INSERT INTO {entity}'
+    if rows:
+        sample = [{k: _mask(k, v) for k, v in row.items()} for row in rows[:BULK_SAMPLE]]
+    elif context is not None and not _masked_sql(sql):
+        sample = [list(p) for p in context.parameters[:BULK_SAMPLE]]
+    else:
+        sample = []
+    _pending(session).append(_entry(session, entity, None, action, {
+        'rows': len(rows) if orm_state.is_insert and len(rows) > 1 else result.rowcount,
+        'sql': sql[:SQL_MAX_LEN],
+        'sample': sample
+    }))
+    return result
+
+
+@event.listens_for(db.session, 'after_commit')
+def _publish(session):
+    entries = session.info.pop(PENDING, None)
+    if entries:
+        writer.put(entries)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _discard(session, transaction):
+    # Transação desfeita: o que foi capturado nunca aconteceu
+    if transaction.parent is None:
+        session.info.pop(PENDING, None)
+
+
+def set_actor(user_id, source):
+    """Autor das próximas alterações fora de uma requisição (tarefas, comandos)."""
+    db.session.info[ACTOR] = (user_id, source)
+
+
+def clear_actor():
+    db.session.info.pop(ACTOR, None)
+
+
+# --- GRAVAÇÃO EM SEGUNDO PLANO ---
+class AuditWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._queue = None
+        self._thread = None
+        self._config = {}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            cfg = current_app.config
+            self._config = {
+                'batch_size': cfg.get('AUDIT_BATCH_SIZE', 500),
+                'interval': cfg.get('AUDIT_FLUSH_INTERVAL', 1),
+                'put_timeout': cfg.get('AUDIT_PUT_TIMEOUT', 0.05),
+            }
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=cfg.get('AUDIT_QUEUE_SIZE', 10000))
+                atexit.register(self.stop)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, entries):
+        # Cada registro leva o engine do app que o gerou (vários apps no mesmo processo: testes)
+        engine = db.engine
+        if current_app.config.get('AUDIT_INLINE'):
+            self._write([(engine, entry) for entry in entries])
+            return
+        self._start()
+        for i, entry in enumerate(entries):
+            try:
+                self._queue.put((engine, entry), timeout=self._config['put_timeout'])
+            except queue.Full:
+                # Escritor atrasado: grava o resto agora, nesta thread (pressão de volta, sem perda)
+                self._write([(engine, e) for e in entries[i:]])
+                return
+
+    def _drain(self, first=None):
+        items = [first] if first is not None else []
+        while len(items) < self._config['batch_size']:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        # Acorda a cada intervalo e grava o acumulado: poucos INSERTs grandes em vez de um por commit
+        while not self._stop.wait(self._config['interval']):
+            self.flush()
+
+    def _write(self, items):
+        by_engine = {}
+        for engine, entry in items:
+            row = dict(entry, changes=json.dumps(entry['changes'], default=str, ensure_ascii=False))
+            by_engine.setdefault(engine, []).append(row)
+        for engine, rows in by_engine.items():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(AuditEntry.__table__), rows)
+            except Exception:
+                logger.exception('Falha ao gravar %d registros de auditoria', len(rows))
+
+    def flush(self):
+        """Grava já tudo o que está na fila (testes, comandos, saída do processo)."""
+        if self._queue is None:
+            return
+        while True:
+            items = self._drain()
+            if not items:
+                return
+            self._write(items)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+
+writer = AuditWriter()
+
+
+# --- CONSULTA ---
+def encode_cursor(entry):
+    return f"{entry.created_at:%Y%m%d%H%M%S%f}-{entry.id}"
+
+
+def _decode_cursor(cursor):
+    try:
+        stamp, entry_id = cursor.split('-')
+        return datetime.strptime(stamp, '%Y%m%d%H%M%S%f'), int(entry_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def entries(entity=None, entity_id=None, user_id=None, start=None, end=None, before=None, limit=100):
+    """Registros mais recentes primeiro; `before` é o cursor da página anterior (encode_cursor).
+
+    Filtros por entidade (+ id) ou usuário usam os índices (entidade/usuário, data).
+    """
+    query = db.session.query(AuditEntry)
+    if entity:
+        query = query.filter(AuditEntry.entity == entity)
+        if entity_id:
+            query = query.filter(AuditEntry.entity_id == str(entity_id))
+    if user_id is not None:
+        query = query.filter(AuditEntry.user_id == user_id)
+    if start is not None:
+        query = query.filter(AuditEntry.created_at >= start)
+    if end is not None:
+        query = query.filter(AuditEntry.created_at < end)
+    cursor = _decode_cursor(before) if before else None
+    if cursor is not None:
+        query = query.filter(tuple_(AuditEntry.created_at, AuditEntry.id) < tuple_(*cursor))
+    return query.order_by(AuditEntry.created_at.desc(), AuditEntry.id.desc()).limit(limit).all()
+
+
+def as_dict(entry):
+    return {
+        'id': entry.id,
+        'created_at': entry.created_at.isoformat(),
+        'user_id': entry.user_id,
+        'entity': entry.entity,
+        'entity_id': entry.entity_id,
+        'action': entry.action,
+        'changes': json.loads(entry.changes) if entry.changes else None,
+        'source': entry.source
+    }
@@ -0,0 +1,37 @@
+from app import db
+
+# INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE (SQLite)
+# executado em lote (executemany) na sessão atual.
+
+
+def _dialect_insert():
+    name = db.session.get_bind().dialect.name
+    if name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+    elif name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return name, insert
+
+
+def _upsert(table, rows, keys, set_values):
+    if not rows:
+        return
+    name, insert = _dialect_insert()
+    stmt = insert(table)
+    if name == 'mysql':
+        stmt = stmt.on_duplicate_key_update(set_values(stmt.inserted))
+    else:
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_=set_values(stmt.excluded))
+    db.session.execute(stmt, rows)
+
+
+def upsert_add(table, rows, keys, columns):
+    """Insere as linhas ou soma `columns` nas já existentes (mesma chave)."""
+    _upsert(table, rows, keys, lambda new: {c: table.c[c] + new[c] for c in columns})
+
+
+def upsert_set(table, rows, keys, columns):
+    """Insere as linhas ou sobrescreve `columns` nas já existentes (mesma chave)."""
+    _upsert(table, rows, keys, lambda new: {c: new[c] for c in columns})
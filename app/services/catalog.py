@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, event, func, insert, select
+
+from app import db
+from app.models.counter import Counter
+from app.models.inventory import Product, CatalogPendingVersion, CatalogTombstone
+from app.services.bulk import upsert_set
+from app.services.pagination import keyset_batches
+from app.services.search_index import final_price
+from app.services.sequence import reserve
+
+# Versão do catálogo para o PDV manter uma cópia local dos produtos.
+# Cada transação que altera produtos recebe um número do contador 'catalog_version'
+# e grava esse número nas linhas que tocou (exclusões viram tombstones).
+# O número é reservado numa transação curta e separada (a venda não segura o
+# contador até o commit) e fica registrado em catalog_pending_versions; a própria
+# transação apaga o registro, então ele some junto com o commit. A versão publicada
+# é a anterior à menor reservada ainda aberta: quem já tem a versão N só precisa
+# das linhas com version > N, mesmo com transações terminando fora de ordem.
+# No SQLite (um escritor por vez) a reserva fica na própria transação.
+#
+# O contador 'catalog_content' muda só quando o cadastro muda (nome, preço, código,
+# inclusão, exclusão): é a versão do cache HTTP. A baixa de estoque da venda
+# (stamp(stock_only=True)) não mexe nele e não invalida as respostas em cache.
+
+VERSION_COUNTER = 'catalog_version'
+CONTENT_COUNTER = 'catalog_content'
+FLOOR_COUNTER = 'catalog_tombstone_floor'
+VERSION_KEY = 'catalog_version'
+PENDING_KEY = 'catalog_pending'
+CONTENT_KEY = 'catalog_content_changed'
+FIELDS = ['id', 'code', 'name', 'price', 'stock']
+DELTA_LIMIT = 5000  # acima disso sai mais barato mandar o catálogo inteiro
+DEFAULT_PENDING_TIMEOUT = 300
+
+
+def _reserve_in_transaction(connection):
+    # SQLite tem um escritor por vez: reservar em outra conexão esperaria a própria transação
+    return connection.dialect.name == 'sqlite'
+
+
+def _reserve_pending():
+    with db.engine.begin() as conn:
+        version = reserve(VERSION_COUNTER, connection=conn)
+        conn.execute(insert(CatalogPendingVersion.__table__).values(version=version, created_at=datetime.now()))
+    return version
+
+
+def stamp(session=None, stock_only=False):
+    """Versão da transação atual: reservada na primeira escrita e reaproveitada até o commit.
+
+    stock_only=True quando só o estoque muda (venda): o cache das leituras continua valendo.
+    """
+    session = session or db.session
+    if not stock_only:
+        session.info[CONTENT_KEY] = True
+    version = session.info.get(VERSION_KEY)
+    if version is None:
+        connection = session.connection()
+        if _reserve_in_transaction(connection):
+            version = reserve(VERSION_COUNTER, connection=connection)
+        else:
+            version = _reserve_pending()
+            session.info[PENDING_KEY] = version
+            # Sai da lista de pendentes no mesmo commit que publica as linhas
+            t = CatalogPendingVersion.__table__
+            connection.execute(delete(t).where(t.c.version == version))
+        session.info[VERSION_KEY] = version
+    return version
+
+
+@event.listens_for(db.session, 'after_commit')
+def _committed(session):
+    session.info.pop(PENDING_KEY, None)
+    if session.info.pop(CONTENT_KEY, None):
+        # Depois do commit e em transação própria: quem ler a versão nova já vê os dados novos
+        reserve(CONTENT_COUNTER)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _forget_version(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(VERSION_KEY, None)
+        session.info.pop(CONTENT_KEY, None)
+        pending = session.info.pop(PENDING_KEY, None)
+        if pending is not None:
+            # Transação desfeita: a reserva continuaria segurando a versão publicada
+            t = CatalogPendingVersion.__table__
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(delete(t).where(t.c.version == pending))
+            except Exception:
+                current_app.logger.exception('Reserva de versão %s não liberada (vence sozinha)', pending)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _stamp_products(session, flush_context, instances):
+    # Escritas pelo ORM (cadastro, edição, exclusão) são carimbadas aqui;
+    # UPDATE/INSERT em lote passam version=stamp() explicitamente
+    changed = [obj for obj in session.new if isinstance(obj, Product)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Product) and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Product)]
+    if not changed and not deleted:
+        return
+    version = stamp(session)
+    for obj in changed:
+        obj.version = version
+    for obj in deleted:
+        session.add(CatalogTombstone(product_id=obj.id, code=obj.code, version=version))
+
+
+def _counter(name):
+    return db.session.query(Counter.next_value).filter(Counter.name == name).scalar()
+
+
+def content_version():
+    """Muda a cada alteração de cadastro dos produtos (não com as vendas): chave do cache HTTP."""
+    return _counter(CONTENT_COUNTER) or 0
+
+
+def _pending_cutoff():
+    timeout = current_app.config.get('CATALOG_PENDING_TIMEOUT', DEFAULT_PENDING_TIMEOUT)
+    return datetime.now() - timedelta(seconds=timeout)
+
+
+def current_version():
+    """Última versão publicada: todas as linhas com version <= N já estão visíveis."""
+    p = CatalogPendingVersion.__table__
+    oldest_open = select(func.min(p.c.version)).where(p.c.created_at > _pending_cutoff()).scalar_subquery()
+    row = db.session.query(Counter.next_value, oldest_open).filter(Counter.name == VERSION_COUNTER).first()
+    if row is None:
+        return 0
+    next_value, oldest = row
+    return (oldest if oldest is not None else next_value) - 1
+
+
+def tombstone_floor():
+    return _counter(FLOOR_COUNTER) or 0
+
+
+def _projection():
+    return db.session.query(
+        Product.id, Product.code, Product.name,
+        Product.price, Product.discount, Product.stock
+    )
+
+
+def _rows(rows):
+    # Listas em vez de objetos: o JSON do catálogo inteiro fica bem menor
+    return [[r.id, r.code, r.name, round(final_price(r.price, r.discount), 2), r.stock or 0] for r in rows]
+
+
+def snapshot():
+    # A versão é lida antes das linhas: no pior caso o próximo delta repete algumas
+    version = current_version()
+    rows = keyset_batches(_projection(), Product.id, 2000)
+    return {'version': version, 'full': True, 'fields': FIELDS, 'items': _rows(rows), 'deleted': []}
+
+
+def delta(since):
+    """Linhas alteradas e ids excluídos depois da versão `since`."""
+    version = current_version()
+    if since < tombstone_floor() or since > version:
+        return snapshot()
+
+    rows = _projection().filter(Product.version > since).order_by(Product.version).limit(DELTA_LIMIT + 1).all()
+    if len(rows) > DELTA_LIMIT:
+        return snapshot()
+    deleted = [pid for (pid,) in db.session.query(CatalogTombstone.product_id).filter(
+        CatalogTombstone.version > since
+    )]
+    return {'version': version, 'full': False, 'fields': FIELDS, 'items': _rows(rows), 'deleted': deleted}
+
+
+def purge_tombstones(before):
+    """Apaga exclusões anteriores a `before`. Terminais mais atrasados recebem o snapshot."""
+    # Reservas de transações que nunca terminaram (processo morto) já não contam
+    p = CatalogPendingVersion.__table__
+    db.session.execute(delete(p).where(p.c.created_at <= _pending_cutoff()))
+
+    t = CatalogTombstone.__table__
+    floor = db.session.query(func.max(t.c.version)).filter(t.c.deleted_at < before).scalar()
+    if floor is None:
+        db.session.commit()
+        return 0
+    result = db.session.execute(delete(t).where(t.c.version <= floor))
+    upsert_set(Counter.__table__, [{'name': FLOOR_COUNTER, 'next_value': floor}], ['name'], ['next_value'])
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,102 @@
+import re
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy.orm import load_only
+
+from app import db
+from app.models.client import Client
+from app.services.search_index import normalize
+
+# Consulta de clientes pelo PDV e pela listagem:
+#   - CPF/CNPJ: igualdade em document_digits (índice único), com ou sem pontuação
+#   - nome: prefixo em search_name (índice), sem diferença de acento/maiúsculas
+# Os clientes consultados ficam num LRU pequeno: anexar o cliente à venda
+# logo depois de escolhê-lo não custa outra ida ao banco.
+
+DEFAULT_CACHE_SIZE = 512
+SEARCH_LIMIT = 10
+DOCUMENT_CHARS = re.compile(r'[\d.\-/ ]*\d[\d.\-/ ]*')
+_COLUMNS = (Client.id, Client.name, Client.document, Client.phone, Client.city, Client.state)
+
+
+def summary(client):
+    return {
+        'id': client.id,
+        'name': client.name,
+        'document': client.document,
+        'phone': client.phone,
+        'city': client.city
+    }
+
+
+class ClientCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, client_id):
+        with self._lock:
+            item = self._items.get(client_id)
+            if item is not None:
+                self._items.move_to_end(client_id)
+            return item
+
+    def put(self, item):
+        max_size = current_app.config.get('CLIENT_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+        with self._lock:
+            self._items[item['id']] = item
+            self._items.move_to_end(item['id'])
+            while len(self._items) > max_size:
+                self._items.popitem(last=False)
+        return item
+
+    def discard(self, client_id):
+        with self._lock:
+            self._items.pop(client_id, None)
+
+
+client_cache = ClientCache()
+
+
+def _prefix(column, text):
+    # LIKE 'abc%' com o padrão já montado: o banco usa o índice da coluna
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.like(escaped + '%', escape='\\')
+
+
+def filtered(query, text):
+    """Aplica a busca (documento ou início do nome) numa consulta de Client."""
+    if DOCUMENT_CHARS.fullmatch(text):
+        # Só números (com ou sem pontuação): CPF/CNPJ completo ou o começo dele
+        digits = Client.digits_of(text)
+        if len(digits) in (11, 14):
+            return query.filter(Client.document_digits == digits)
+        return query.filter(_prefix(Client.document_digits, digits))
+    return query.filter(_prefix(Client.search_name, normalize(text)))
+
+
+def search(text, limit=SEARCH_LIMIT):
+    text = (text or '').strip()
+    if len(text) < 2:
+        return []
+    query = filtered(Client.query.options(load_only(*_COLUMNS)), text)
+    return [client_cache.put(summary(c)) for c in query.order_by(Client.search_name).limit(limit)]
+
+
+def by_document(document):
+    digits = Client.digits_of(document)
+    if not digits:
+        return None
+    client = Client.query.options(load_only(*_COLUMNS)).filter_by(document_digits=digits).first()
+    return client_cache.put(summary(client)) if client else None
+
+
+def get(client_id):
+    """Cliente pelo id: do cache se foi consultado há pouco, senão uma consulta."""
+    item = client_cache.get(client_id)
+    if item is None:
+        client = db.session.get(Client, client_id, options=[load_only(*_COLUMNS)])
+        item = client_cache.put(summary(client)) if client else None
+    return item
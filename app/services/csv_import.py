@@ -0,0 +1,417 @@
+import csv
+import io
+import os
+import time
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.client import Client
+from app.models.inventory import Product
+from app.services import catalog, stock_ledger, valuation
+from app.services.search_index import normalize
+from app.services.sequence import reserve_product_codes
+
+# Cadastro em massa por planilha CSV (produtos ou clientes):
+#   - o arquivo é lido em fluxo e validado em lotes de BATCH_SIZE linhas
+#   - códigos/documentos já cadastrados vêm do banco com IN (...) em blocos,
+#     não uma consulta por linha
+#   - inserts e updates em lote (executemany), um commit por lote
+#   - linha com problema não entra e vai para o relatório (linha + motivo); lote que
+#     esbarra numa chave única mesmo assim é refeito linha a linha
+#   - cada commit leva junto a última linha gravada (checkpoint): a tarefa que cair
+#     no meio continua dali, sem gravar de novo o que já entrou
+# Aceita os mesmos cabeçalhos da exportação (/exportar), separador ; ou , e
+# arquivos em UTF-8 ou Windows-1252 (Excel).
+
+BATCH_SIZE = 1000
+IN_CHUNK = 500
+MAX_ERRORS = 1000
+MODES = {'insert': 'Apontar erro', 'update': 'Atualizar o cadastro'}
+
+
+class RowError(ValueError):
+    pass
+
+
+# --- LEITURA E CONVERSÃO DOS CAMPOS ---
+def _text(value, column, label):
+    value = (value or '').strip()
+    if not value:
+        return None
+    length = getattr(column.type, 'length', None)
+    if length and len(value) > length:
+        raise RowError(f"{label} excede {length} caracteres")
+    return value
+
+
+def _number(value, label):
+    value = (value or '').strip().replace('R$', '').replace(' ', '')
+    if not value:
+        return None
+    if ',' in value:
+        # Formato brasileiro: 1.234,56
+        value = value.replace('.', '').replace(',', '.')
+    try:
+        number = float(value)
+    except ValueError:
+        raise RowError(f"{label} inválido: '{value}'")
+    if number < 0:
+        raise RowError(f"{label} não pode ser negativo")
+    return number
+
+
+def _integer(value, label):
+    number = _number(value, label)
+    if number is not None and number != int(number):
+        raise RowError(f"{label} deve ser um número inteiro")
+    return None if number is None else int(number)
+
+
+class Spec:
+    """Campos aceitos, chave de duplicidade e regras de cada tipo de cadastro."""
+
+    def __init__(self, label, model, headers, key, required):
+        self.label = label
+        self.model = model
+        self.headers = headers      # cabeçalho normalizado -> campo
+        self.key = key              # campo que identifica o registro (código/documento)
+        self.required = required
+
+    def mapping(self, header):
+        """{índice da coluna: campo} e os cabeçalhos não reconhecidos."""
+        fields, ignored = {}, []
+        for i, name in enumerate(header):
+            field = self.headers.get(normalize(name))
+            if field and field not in fields.values():
+                fields[i] = field
+            elif name.strip():
+                ignored.append(name.strip())
+        return fields, ignored
+
+
+PRODUCT_SPEC = Spec('Produtos', Product, {
+    'codigo': 'code', 'cod': 'code', 'ean': 'code', 'cod / ean': 'code', 'code': 'code',
+    'descricao': 'name', 'nome': 'name', 'produto': 'name', 'name': 'name',
+    'categoria': 'category', 'category': 'category',
+    'unidade': 'unit', 'un': 'unit', 'unit': 'unit',
+    'ncm': 'ncm', 'cfop': 'cfop',
+    'custo': 'cost_price', 'preco de custo': 'cost_price', 'cost_price': 'cost_price',
+    'preco': 'price', 'preco de venda': 'price', 'price': 'price',
+    'desconto': 'discount', 'desconto %': 'discount', 'discount': 'discount',
+    'estoque': 'stock', 'quantidade': 'stock', 'stock': 'stock',
+}, key='code', required=('name',))
+
+CLIENT_SPEC = Spec('Clientes', Client, {
+    'nome': 'name', 'nome / razao social': 'name', 'razao social': 'name', 'name': 'name',
+    'cpf/cnpj': 'document', 'cpf / cnpj': 'document', 'cpf': 'document', 'cnpj': 'document',
+    'documento': 'document', 'document': 'document',
+    'e-mail': 'email', 'email': 'email',
+    'telefone': 'phone', 'celular': 'phone', 'phone': 'phone',
+    'cep': 'cep', 'endereco': 'address', 'address': 'address',
+    'numero': 'number', 'number': 'number',
+    'cidade': 'city', 'city': 'city',
+    'uf': 'state', 'estado': 'state', 'state': 'state',
+}, key='document_digits', required=('name', 'document'))
+
+SPECS = {'products': PRODUCT_SPEC, 'clients': CLIENT_SPEC}
+CLIENT_COLUMNS = sorted(set(CLIENT_SPEC.headers.values()) | {'document_digits', 'search_name'})
+LABELS = {'code': 'Código', 'name': 'Nome', 'category': 'Categoria', 'unit': 'Unidade', 'ncm': 'NCM',
+          'cfop': 'CFOP', 'cost_price': 'Custo', 'price': 'Preço', 'discount': 'Desconto', 'stock': 'Estoque',
+          'document': 'CPF/CNPJ', 'email': 'E-mail', 'phone': 'Telefone', 'cep': 'CEP', 'address': 'Endereço',
+          'number': 'Número', 'city': 'Cidade', 'state': 'UF'}
+NUMBERS = {'cost_price', 'price', 'discount'}
+INTEGERS = {'stock'}
+
+
+def _parse(spec, values):
+    """Converte a linha em {campo: valor}; levanta RowError com todos os problemas."""
+    row, problems = {}, []
+    table = spec.model.__table__
+    for field, raw in values.items():
+        try:
+            if field in NUMBERS:
+                row[field] = _number(raw, LABELS[field])
+            elif field in INTEGERS:
+                row[field] = _integer(raw, LABELS[field])
+            else:
+                row[field] = _text(raw, table.c[field], LABELS[field])
+        except RowError as e:
+            problems.append(str(e))
+
+    for field in spec.required:
+        if field in row and not row[field]:
+            problems.append(f"{LABELS[field]} é obrigatório")
+
+    if spec is CLIENT_SPEC and row.get('document'):
+        digits = Client.digits_of(row['document'])
+        if not digits or len(digits) not in (11, 14):
+            problems.append("CPF/CNPJ deve ter 11 ou 14 dígitos")
+        row['document_digits'] = digits
+        if row.get('state'):
+            row['state'] = row['state'].upper()
+        if row.get('email') and '@' not in row['email']:
+            problems.append("E-mail inválido")
+    if spec is PRODUCT_SPEC and row.get('discount') and row['discount'] > 100:
+        problems.append("Desconto acima de 100%")
+
+    if problems:
+        raise RowError('; '.join(problems))
+    return row
+
+
+def _open(fh):
+    """Texto do CSV em UTF-8 (com ou sem BOM) ou, se não for, Windows-1252."""
+    head = fh.read(64 * 1024)
+    fh.seek(0)
+    try:
+        head.decode('utf-8-sig')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # Corte no meio de um caractere no fim do bloco não conta
+        encoding = 'utf-8-sig' if e.start >= len(head) - 3 else 'cp1252'
+    text = io.TextIOWrapper(fh, encoding=encoding, newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    delimiter = ';' if sample.count(';') >= sample.count(',') else ','
+    return csv.reader(text, delimiter=delimiter)
+
+
+def _existing(column, keys, *columns):
+    """Registros já cadastrados com essas chaves, em blocos de IN (...)."""
+    found = {}
+    keys = list(keys)
+    for i in range(0, len(keys), IN_CHUNK):
+        for row in db.session.query(column, *columns).filter(column.in_(keys[i:i + IN_CHUNK])):
+            found[row[0]] = row
+    return found
+
+
+def _header(reader, spec):
+    header = next(reader, None)
+    if not header:
+        raise ValueError("Arquivo vazio.")
+    fields, ignored = spec.mapping(header)
+    missing = [LABELS[f] for f in spec.required if f not in fields.values()]
+    if missing:
+        raise ValueError(f"Coluna obrigatória ausente: {', '.join(missing)}")
+    return fields, ignored
+
+
+# --- GRAVAÇÃO EM LOTE ---
+PRODUCT_DEFAULTS = {'category': None, 'unit': 'UN', 'ncm': '00000000', 'cfop': '5102',
+                    'cost_price': 0.0, 'price': 0.0, 'discount': 0.0, 'stock': 0}
+
+
+def _write_products(rows, mode, stats, filename):
+    """rows: [(linha, campos)]. Retorna as linhas recusadas por já existirem."""
+    p = Product.__table__
+    current = _existing(p.c.code, [r['code'] for _, r in rows if r.get('code')],
+                        p.c.id, p.c.stock, p.c.cost_price, p.c.price)
+    inserts, updates, rejected = [], [], []
+    for line, row in rows:
+        found = current.get(row.get('code'))
+        if found is None:
+            inserts.append({**PRODUCT_DEFAULTS, **{k: v for k, v in row.items() if v is not None}, 'code': row.get('code')})
+        elif mode == 'update':
+            updates.append((found, row))
+        else:
+            rejected.append((line, f"Código {row['code']} já cadastrado"))
+
+    no_code = [row for row in inserts if not row['code']]
+    if no_code:
+        for row, code in zip(no_code, reserve_product_codes(len(no_code), connection=db.session.connection())):
+            row['code'] = code
+
+    version = catalog.stamp() if inserts or updates else None
+    delta, movements = valuation.Delta(), []
+    if inserts:
+        for row in inserts:
+            row['version'] = version
+            delta.change(None, (row['stock'], row['cost_price'], row['price']))
+        db.session.execute(insert(p), inserts)
+        stocked = [row for row in inserts if row['stock']]
+        if stocked:
+            ids = _existing(p.c.code, [row['code'] for row in stocked], p.c.id)
+            movements += [stock_ledger.movement(ids[row['code']].id, row['stock'], 'csv', filename) for row in stocked]
+
+    if updates:
+        # Célula vazia mantém o valor atual (COALESCE)
+        fields = sorted({f for _, row in updates for f in row if f != 'code'})
+        params = []
+        for found, row in updates:
+            params.append({'pid': found.id, **{f'new_{f}': row.get(f) for f in fields}})
+            new = tuple(found[i] if row.get(f) is None else row[f]
+                        for i, f in ((2, 'stock'), (3, 'cost_price'), (4, 'price')))
+            delta.change(tuple(found[2:5]), new)
+            movements.append(stock_ledger.movement(found.id, (new[0] or 0) - (found.stock or 0), 'csv', filename))
+        db.session.execute(
+            update(p).where(p.c.id == bindparam('pid')).values(
+                version=version, **{f: func.coalesce(bindparam(f'new_{f}'), p.c[f]) for f in fields}
+            ),
+            params
+        )
+
+    stock_ledger.record(movements)
+    valuation.apply(delta)
+    stats['created'] += len(inserts)
+    stats['updated'] += len(updates)
+    return rejected
+
+
+def _write_clients(rows, mode, stats, filename):
+    c = Client.__table__
+    current = _existing(c.c.document_digits, [r['document_digits'] for _, r in rows], c.c.id)
+    # Cadastros antigos ainda sem document_digits: o índice único é no documento como digitado
+    by_document = _existing(c.c.document, [r['document'] for _, r in rows], c.c.id)
+    inserts, updates, rejected = [], [], []
+    for line, row in rows:
+        # Core não passa pelos @validates do modelo: chaves de busca preenchidas aqui
+        row['search_name'] = normalize(row['name'])
+        found = current.get(row['document_digits']) or by_document.get(row['document'])
+        if found is None:
+            inserts.append({f: row.get(f) for f in CLIENT_COLUMNS})
+        elif mode == 'update':
+            updates.append((found, row))
+        else:
+            rejected.append((line, f"CPF/CNPJ {row['document']} já cadastrado"))
+
+    if inserts:
+        db.session.execute(insert(c), inserts)
+    if updates:
+        names = sorted({f for _, row in updates for f in row if f not in ('document', 'document_digits')})
+        db.session.execute(
+            update(c).where(c.c.id == bindparam('cid')).values(
+                **{f: func.coalesce(bindparam(f'new_{f}'), c.c[f]) for f in names}
+            ),
+            [{'cid': found.id, **{f'new_{f}': row.get(f) for f in names}} for found, row in updates]
+        )
+        stats['updated_ids'].extend(found.id for found, _ in updates)
+    stats['created'] += len(inserts)
+    stats['updated'] += len(updates)
+    return rejected
+
+
+WRITERS = {'products': _write_products, 'clients': _write_clients}
+
+
+def import_csv(fh, kind, mode='insert', filename=None, progress=None, resume=None, checkpoint=None):
+    """Importa o CSV (arquivo binário aberto). Retorna o resumo com os erros por linha.
+
+    progress(%, mensagem) é chamado após cada lote (fora de transação).
+    checkpoint(estado) é chamado na transação de cada lote, antes do commit; numa nova
+    tentativa, resume=estado retoma depois da última linha gravada.
+    """
+    spec, write = SPECS[kind], WRITERS[kind]
+    started = time.perf_counter()
+    stats = {'kind': kind, 'file': filename, 'rows': 0, 'created': 0, 'updated': 0,
+             'error_count': 0, 'errors': [], 'ignored_columns': [], 'updated_ids': []}
+    size = os.fstat(fh.fileno()).st_size if hasattr(fh, 'fileno') else None
+    done_line = 0
+    if resume:
+        stats.update(resume['stats'])
+        done_line = resume['line']
+
+    def reject(line, message):
+        stats['error_count'] += 1
+        if len(stats['errors']) < MAX_ERRORS:
+            stats['errors'].append({'line': line, 'message': message})
+
+    def save(line):
+        if checkpoint:
+            # updated_ids fica só na memória: serve ao cache do processo que terminar
+            checkpoint({'line': line, 'stats': {k: v for k, v in stats.items() if k != 'updated_ids'}})
+
+    reader = _open(fh)
+    fields, stats['ignored_columns'] = _header(reader, spec)
+
+    seen = {}  # chave -> linha em que apareceu primeiro
+    batch = []
+
+    def flush(line):
+        counts = (stats['created'], stats['updated'], len(stats['updated_ids']),
+                  stats['error_count'], len(stats['errors']))
+        try:
+            for rejected in write(batch, mode, stats, filename):
+                reject(*rejected)
+            save(line)
+            db.session.commit()
+        except IntegrityError:
+            # Chave que a conferência não viu (importação ao mesmo tempo, cadastro antigo):
+            # refaz o lote uma linha por transação, e só a linha em conflito vai para o relatório
+            db.session.rollback()
+            stats['created'], stats['updated'], stats['error_count'] = counts[0], counts[1], counts[3]
+            del stats['updated_ids'][counts[2]:]
+            del stats['errors'][counts[4]:]
+            for item in batch:
+                try:
+                    for rejected in write([item], mode, stats, filename):
+                        reject(*rejected)
+                    save(item[0])
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+                    reject(item[0], f"{LABELS.get(spec.key, 'CPF/CNPJ')} já cadastrado")
+            save(line)
+            db.session.commit()
+        batch.clear()
+        if progress and size:
+            progress(99 * fh.tell() / size, f"{stats['rows']} linhas lidas")
+
+    line = done_line
+    for line, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        if line <= done_line:
+            # Já gravada (ou recusada) numa tentativa anterior: só a chave, para os repetidos
+            try:
+                key = _parse(spec, {field: values[i] if i < len(values) else '' for i, field in fields.items()}).get(spec.key)
+            except RowError:
+                continue
+            if key:
+                seen.setdefault(key, line)
+            continue
+        stats['rows'] += 1
+        try:
+            row = _parse(spec, {field: values[i] if i < len(values) else '' for i, field in fields.items()})
+        except RowError as e:
+            reject(line, str(e))
+            continue
+
+        key = row.get(spec.key)
+        if key:
+            if key in seen:
+                reject(line, f"{LABELS.get(spec.key, 'CPF/CNPJ')} repetido no arquivo (linha {seen[key]})")
+                continue
+            seen[key] = line
+        batch.append((line, row))
+        if len(batch) >= BATCH_SIZE:
+            flush(line)
+    if batch:
+        flush(line)
+    elif line > done_line:
+        # Só recusas depois do último lote: entram no checkpoint para não contar de novo
+        save(line)
+        db.session.commit()
+
+    stats['errors'].sort(key=lambda e: e['line'])
+    stats['elapsed'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def submit(upload, kind, mode='insert'):
+    """Guarda o upload, confere o cabeçalho e agenda a importação. Retorna a tarefa."""
+    from app.services import jobs
+    if kind not in SPECS or mode not in MODES:
+        raise ValueError("Tipo de importação inválido.")
+    path = jobs.spool_path(upload.filename or 'upload.csv')
+    upload.save(path)
+    try:
+        # Cabeçalho errado é recusado na hora, sem esperar a tarefa
+        with open(path, 'rb') as fh:
+            _header(_open(fh), SPECS[kind])
+    except Exception:
+        os.remove(path)
+        raise
+    return jobs.submit('csv_import', {'path': path, 'filename': upload.filename, 'kind': kind, 'mode': mode})
@@ -0,0 +1,175 @@
+import csv
+import io
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from app import db
+from app.models.client import Client
+from app.models.inventory import Product
+from app.models.sales import Sale, SaleItem
+from app.models.user import Employee, User
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # opcional: sem o módulo, só CSV
+    Workbook = None
+
+# Exportação das tabelas para planilha (contador, conferência, BI):
+#   - as linhas vêm do banco em lotes por cursor (WHERE id > :último ORDER BY id LIMIT n),
+#     só as colunas exportadas, sem montar objetos do ORM
+#   - CSV: cada lote já sai na resposta; o download começa na hora
+#   - XLSX: openpyxl em modo write-only (linhas vão para disco, não para a memória);
+#     o arquivo é enviado em pedaços depois de fechado
+# A memória fica estável com qualquer quantidade de linhas.
+
+FETCH_SIZE = 1000
+CSV_FLUSH_ROWS = 500
+CHUNK_SIZE = 64 * 1024
+XLSX_MAX_ROWS = 1048575  # limite do Excel por aba (menos o cabeçalho); passa disso, abre outra aba
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+FORMATS = {'csv': 'text/csv', 'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+
+
+class Dataset:
+    def __init__(self, label, columns, order_by, joins=(), roles=None, date_column=None):
+        self.label = label
+        self.headers = [header for header, _ in columns]
+        self.columns = [column for _, column in columns]
+        self.order_by = order_by
+        self.joins = joins
+        self.roles = roles              # None: qualquer usuário logado
+        self.date_column = date_column  # permite filtrar por período
+
+    def allowed(self, user_id, role):
+        if user_id is None:
+            return False
+        return self.roles is None or role in self.roles
+
+    def statement(self, start=None, end=None):
+        stmt = select(*self.columns)
+        for target, onclause in self.joins:
+            stmt = stmt.outerjoin(target, onclause)
+        if self.date_column is not None and start is not None:
+            stmt = stmt.where(self.date_column >= start, self.date_column < end)
+        return stmt.order_by(self.order_by)
+
+
+DATASETS = {
+    'produtos': Dataset('Produtos', [
+        ('Código', Product.code), ('Descrição', Product.name), ('Categoria', Product.category),
+        ('Unidade', Product.unit), ('NCM', Product.ncm), ('CFOP', Product.cfop),
+        ('Custo', Product.cost_price), ('Preço', Product.price), ('Desconto %', Product.discount),
+        ('Estoque', Product.stock)
+    ], Product.id),
+    'clientes': Dataset('Clientes', [
+        ('Nome', Client.name), ('CPF/CNPJ', Client.document), ('E-mail', Client.email),
+        ('Telefone', Client.phone), ('CEP', Client.cep), ('Endereço', Client.address),
+        ('Número', Client.number), ('Cidade', Client.city), ('UF', Client.state),
+        ('Cadastro', Client.created_at)
+    ], Client.id),
+    'colaboradores': Dataset('Colaboradores', [
+        ('Nome', Employee.name), ('CPF', Employee.cpf), ('Nascimento', Employee.birth_date),
+        ('Cargo', Employee.position), ('Admissão', Employee.admission_date), ('Salário', Employee.salary),
+        ('Tipo Sanguíneo', Employee.blood_type), ('Contato de Emergência', Employee.emergency_contact),
+        ('CEP', Employee.cep), ('Endereço', Employee.address), ('Número', Employee.number),
+        ('Cidade', Employee.city), ('UF', Employee.state), ('Usuário', User.username), ('Perfil', User.role)
+    ], Employee.id, joins=[(User, User.id == Employee.user_id)], roles=('admin', 'gerente')),
+    'vendas': Dataset('Vendas', [
+        ('Venda', Sale.id), ('Data', Sale.created_at), ('Pagamento', Sale.payment_method),
+        ('Parcelas', Sale.installments), ('Itens', Sale.items_count), ('Subtotal', Sale.subtotal),
+        ('Total', Sale.total), ('Cliente', Client.name), ('CPF/CNPJ', Client.document), ('Operador', User.username)
+    ], Sale.id, joins=[(Client, Client.id == Sale.client_id), (User, User.id == Sale.user_id)],
+        roles=('admin', 'gerente'), date_column=Sale.created_at),
+    'itens-vendidos': Dataset('Itens vendidos', [
+        ('Venda', SaleItem.sale_id), ('Data', Sale.created_at), ('Código', SaleItem.code),
+        ('Descrição', SaleItem.name), ('Quantidade', SaleItem.quantity), ('Preço Unitário', SaleItem.unit_price),
+        ('Custo Unitário', SaleItem.cost_price), ('Total', SaleItem.total)
+    ], SaleItem.id, joins=[(Sale, Sale.id == SaleItem.sale_id)],
+        roles=('admin', 'gerente'), date_column=Sale.created_at),
+}
+
+
+def formats():
+    return ['csv', 'xlsx'] if Workbook is not None else ['csv']
+
+
+def rows(dataset, start=None, end=None):
+    """Tuplas em lotes de FETCH_SIZE pela coluna de ordenação (sem carregar tudo)."""
+    # A coluna de ordenação vai no fim de cada linha (cursor do próximo lote) e não é exportada
+    stmt = dataset.statement(start, end).add_columns(dataset.order_by).limit(FETCH_SIZE)
+    last = None
+    while True:
+        batch = db.session.execute(stmt if last is None else stmt.where(dataset.order_by > last)).all()
+        for row in batch:
+            yield row[:-1]
+        if len(batch) < FETCH_SIZE:
+            return
+        last = batch[-1][-1]
+
+
+def _safe_text(value):
+    # Texto que a planilha leria como fórmula (=, +, -, @, tab, CR) vai com ' na frente
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%d/%m/%Y %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    if isinstance(value, (Decimal, float)):
+        # Vírgula decimal: o Excel em português lê como número
+        return str(value).replace('.', ',')
+    return _safe_text(value)
+
+
+def iter_csv(dataset, data):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')  # BOM: o Excel abre com a acentuação correta
+    writer.writerow(dataset.headers)
+    for i, row in enumerate(data, 1):
+        writer.writerow([_csv_value(v) for v in row])
+        if i % CSV_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_xlsx(dataset, data):
+    if Workbook is None:
+        raise RuntimeError("Exportação XLSX indisponível: instale o pacote openpyxl.")
+    workbook = Workbook(write_only=True)
+    sheet, count, sheets = None, XLSX_MAX_ROWS, 0
+    for row in data:
+        if count == XLSX_MAX_ROWS:
+            sheets += 1
+            sheet = workbook.create_sheet(dataset.label if sheets == 1 else f'{dataset.label} ({sheets})')
+            sheet.append(dataset.headers)
+            count = 0
+        sheet.append([_safe_text(v) for v in row])
+        count += 1
+    if sheet is None:
+        workbook.create_sheet(dataset.label).append(dataset.headers)
+
+    with tempfile.TemporaryFile() as fh:
+        workbook.save(fh)
+        fh.seek(0)
+        while True:
+            chunk = fh.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def generate(dataset, fmt, start=None, end=None):
+    data = rows(dataset, start, end)
+    return iter_xlsx(dataset, data) if fmt == 'xlsx' else iter_csv(dataset, data)
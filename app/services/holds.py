@@ -0,0 +1,176 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, session
+from sqlalchemy import case, delete, func, select, update
+
+from app import db
+from app.models.inventory import Product, StockHold
+from app.services.bulk import upsert_set
+from app.services.search_index import product_index
+
+# Reservas de estoque dos carrinhos do PDV (vários terminais vendendo o mesmo item):
+#   - pôr no carrinho reserva a quantidade por HOLDS_TTL segundos (renovada enquanto
+#     o carrinho está aberto); disponível = estoque - reservas ativas dos outros terminais
+#   - a baixa da venda respeita as reservas alheias e apaga as do próprio terminal
+#   - reservas vencidas não contam mesmo antes de apagadas; a limpeza é um DELETE em lote
+#     rodado pelos workers de tarefas (HOLDS_SWEEP_INTERVAL) ou por flask sales sweep-holds
+# A busca lê o total reservado por produto de um dicionário em memória (um por processo),
+# recarregado com uma única consulta agregada a cada HOLDS_REFRESH segundos.
+
+DEFAULT_TTL = 300
+DEFAULT_REFRESH = 2
+
+
+def _ttl():
+    return timedelta(seconds=current_app.config.get('HOLDS_TTL', DEFAULT_TTL))
+
+
+def terminal_id():
+    """Identificador do PDV: um por sessão do navegador."""
+    return session.setdefault('terminal_id', uuid.uuid4().hex)
+
+
+def _active(now):
+    return StockHold.expires_at > now
+
+
+class HoldTotals:
+    """Total reservado por produto (todos os terminais), em memória."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._loaded_at = None
+
+    def _ensure_fresh(self):
+        refresh = current_app.config.get('HOLDS_REFRESH', DEFAULT_REFRESH)
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > refresh:
+            self.reload()
+
+    def reload(self):
+        now = datetime.now()
+        # Sempre no principal: reserva recém-feita em outro terminal precisa aparecer
+        with db.engine.connect() as conn:
+            totals = dict(conn.execute(
+                select(StockHold.product_id, func.sum(StockHold.quantity))
+                .where(_active(now)).group_by(StockHold.product_id)
+            ).all())
+        with self._lock:
+            self._totals = totals
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def adjust(self, product_id, delta):
+        """Aplica a reserva feita neste processo sem esperar a próxima recarga."""
+        if not delta:
+            return
+        with self._lock:
+            totals = dict(self._totals)
+            totals[product_id] = max(totals.get(product_id, 0) + delta, 0)
+            self._totals = totals
+
+    def held(self, product_id):
+        self._ensure_fresh()
+        return self._totals.get(product_id, 0)
+
+
+hold_totals = HoldTotals()
+
+
+def available(product_id, stock):
+    return max((stock or 0) - hold_totals.held(product_id), 0)
+
+
+def with_available(item):
+    """Dicionário do índice de busca + 'available' (estoque menos reservas)."""
+    return {**item, 'available': available(item['id'], item['stock'])}
+
+
+def refresh(payload):
+    """Resposta da busca vinda do cache (um item ou lista) com estoque e disponível atuais."""
+    if isinstance(payload, list):
+        return [refresh(item) for item in payload]
+    current = product_index.lookup_code(payload['code'])
+    if current is None:
+        return payload
+    return {**payload, 'stock': current['stock'], 'available': available(current['id'], current['stock'])}
+
+
+def others_held(terminal, now=None):
+    """Subconsulta correlacionada: reservas ativas de outros terminais para Product.id."""
+    now = now or datetime.now()
+    return select(func.coalesce(func.sum(StockHold.quantity), 0)).where(
+        StockHold.product_id == Product.id, StockHold.terminal != terminal, _active(now)
+    ).scalar_subquery()
+
+
+def reserve(terminal, code, quantity):
+    """Reserva `quantity` do produto para o terminal (0 libera). Concede no máximo o disponível."""
+    now = datetime.now()
+    # Trava a linha do produto: dois terminais não reservam a mesma última unidade
+    product = db.session.query(Product.id, Product.code, Product.stock).filter(
+        Product.code == code
+    ).with_for_update().first()
+    if product is None:
+        return None
+
+    mine, others = db.session.query(
+        func.coalesce(func.sum(case((StockHold.terminal == terminal, StockHold.quantity), else_=0)), 0),
+        func.coalesce(func.sum(case((StockHold.terminal == terminal, 0), else_=StockHold.quantity)), 0)
+    ).filter(StockHold.product_id == product.id, _active(now)).one()
+
+    free = max((product.stock or 0) - others, 0)
+    granted = min(max(quantity, 0), free)
+    if granted:
+        upsert_set(StockHold.__table__, [{
+            'terminal': terminal, 'product_id': product.id, 'quantity': granted,
+            'user_id': session.get('user_id'), 'expires_at': now + _ttl()
+        }], ['terminal', 'product_id'], ['quantity', 'user_id', 'expires_at'])
+    else:
+        db.session.execute(delete(StockHold).where(
+            StockHold.terminal == terminal, StockHold.product_id == product.id
+        ))
+    db.session.commit()
+    hold_totals.adjust(product.id, granted - mine)
+    return {
+        'code': product.code,
+        'requested': quantity,
+        'reserved': granted,
+        'available': free - granted,
+        'stock': product.stock or 0
+    }
+
+
+def renew(terminal):
+    """Estende as reservas ainda ativas do terminal. Vencidas não voltam (o item pode ter ido)."""
+    now = datetime.now()
+    result = db.session.execute(
+        update(StockHold)
+        .where(StockHold.terminal == terminal, _active(now))
+        .values(expires_at=now + _ttl())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def release(terminal, product_ids=None):
+    """Libera as reservas do terminal (todas ou só destes produtos). Não faz commit."""
+    stmt = delete(StockHold).where(StockHold.terminal == terminal)
+    if product_ids is not None:
+        stmt = stmt.where(StockHold.product_id.in_(list(product_ids)))
+    count = db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+    if count:
+        hold_totals.invalidate()
+    return count
+
+
+def sweep():
+    """Apaga as reservas vencidas em um único DELETE (conexão própria, no principal)."""
+    with db.engine.begin() as conn:
+        return conn.execute(delete(StockHold).where(StockHold.expires_at <= datetime.now())).rowcount
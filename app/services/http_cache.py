@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request, session
+
+from app.services import catalog
+
+try:
+    import brotli
+except ImportError:  # opcional: sem o módulo, só gzip
+    brotli = None
+
+# Cache HTTP das leituras mais frequentes (busca, listagem, dashboard):
+#   - cache em memória (TTL + LRU) das respostas já montadas e comprimidas
+#   - ETag = resumo do corpo: enquanto a resposta em cache vale, 304 sem consultar nada
+#     (e o mesmo dado gera a mesma ETag em qualquer processo)
+#   - compressão gzip/brotli das respostas grandes
+# Alteração de cadastro (nome, preço, código) muda a versão e invalida tudo de uma vez.
+# Vendas não: o estoque das telas em cache pode atrasar até HTTP_CACHE_TTL, e a busca
+# do PDV completa estoque/disponível na hora (fresh=...) sobre o que veio do cache.
+
+COMPRESSIBLE = ('text/html', 'application/json', 'text/csv', 'text/plain')
+
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=current_app.config.get('COMPRESS_BROTLI_QUALITY', 5))
+    return gzip.compress(body, compresslevel=current_app.config.get('COMPRESS_LEVEL', 6))
+
+
+def _compressible(response):
+    return (response.status_code == 200
+            and not response.is_streamed
+            and response.mimetype in COMPRESSIBLE
+            and 'Content-Encoding' not in response.headers
+            and response.content_length is not None
+            and response.content_length >= current_app.config.get('COMPRESS_MIN_SIZE', 1024))
+
+
+def compress_response(response):
+    """after_request: comprime respostas grandes (listagens em fluxo ficam de fora)."""
+    if not _compressible(response):
+        return response
+    encoding = _encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.set_data(_compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _etag(body):
+    return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+
+class _Cached:
+    __slots__ = ('version', 'expires', 'status', 'mimetype', 'bodies', 'etag', 'payload')
+
+    def __init__(self, version, expires, status, mimetype, body, payload=None):
+        self.version = version
+        self.expires = expires
+        self.status = status
+        self.mimetype = mimetype
+        self.bodies = {None: body}  # codificação -> corpo (comprimido sob demanda)
+        self.etag = _etag(body)
+        self.payload = payload      # JSON decodificado, para completar com dados atuais (fresh)
+
+    def body(self, encoding):
+        data = self.bodies.get(encoding)
+        if data is None:
+            data = self.bodies[encoding] = _compress(self.bodies[None], encoding)
+        return data
+
+
+class ResponseCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version or entry.expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        max_entries = current_app.config.get('HTTP_CACHE_MAX_ENTRIES', 256)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def _from_entry(entry):
+    encoding = _encoding() if len(entry.bodies[None]) >= current_app.config.get('COMPRESS_MIN_SIZE', 1024) else None
+    response = current_app.response_class(entry.body(encoding), status=entry.status, mimetype=entry.mimetype)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _finish(response, etag):
+    response.set_etag(etag, weak=True)
+    # private: depende do login; no-cache: o navegador sempre revalida pela ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def cached(ttl=None, per_role=False, fresh=None, version=None):
+    """Cache das respostas pela versão do cadastro de produtos.
+
+    per_role=True para páginas HTML (o menu muda conforme o perfil do usuário).
+    fresh: para JSON com campos que mudam a toda hora (estoque, disponível): recebe o
+    JSON guardado e devolve o que vai na resposta, a cada requisição.
+    version: outra versão para invalidar (padrão: catalog.content_version).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Mensagens flash pendentes são consumidas pela página: não pode vir do cache
+            if not current_app.config.get('HTTP_CACHE_ENABLED', True) or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            current = (version or catalog.content_version)()
+            key = (request.endpoint, request.full_path, session.get('user_role') if per_role else None)
+
+            entry = response_cache.get(key, current)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                entry = _Cached(current, time.monotonic() + (ttl or current_app.config.get('HTTP_CACHE_TTL', 30)),
+                                response.status_code, response.mimetype, response.get_data(),
+                                payload=response.get_json() if fresh else None)
+                response_cache.put(key, entry)
+
+            if fresh is not None:
+                response = jsonify(fresh(entry.payload))
+                etag = _etag(response.get_data())
+            else:
+                response, etag = None, entry.etag
+            if request.if_none_match.contains_weak(etag):
+                return _finish(current_app.response_class(status=304), etag)
+            return _finish(response or _from_entry(entry), etag)
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    app.after_request(compress_response)
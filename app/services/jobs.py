@@ -0,0 +1,401 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app, has_request_context, session
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.job import Job
+
+# Tarefas em segundo plano sem broker externo: a fila é a tabela jobs.
+#   - submit() grava a tarefa e acorda os workers (threads do próprio processo
+#     web ou um processo separado: flask jobs worker)
+#   - cada worker pega uma tarefa com UPDATE condicional (status = 'queued'),
+#     então dois workers nunca executam a mesma
+#   - falhou: volta para a fila com espera crescente até max_attempts
+#   - o resultado é gravado na mesma transação do trabalho do handler: tarefa
+#     que morreu no meio é refeita do zero, sem aplicar nada em dobro; handler que
+#     grava em vários commits guarda o ponto de retomada (ctx.checkpoint) em cada um
+#   - enquanto roda, uma thread renova locked_at a cada JOBS_HEARTBEAT segundos; só
+#     tarefa sem sinal de vida por JOBS_LEASE volta para a fila, e o worker que perdeu
+#     a posse desfaz o trabalho em vez de gravar o resultado
+#   - rotinas de manutenção (@periodic) rodam nos mesmos workers, a cada N segundos,
+#     fora das requisições
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+HANDLERS = {}
+PERIODIC = {}
+
+
+def handler(kind):
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def periodic(config_key, default):
+    """Rotina rodada pelos workers a cada `config_key` segundos (0 desliga), em cada processo."""
+    def decorator(fn):
+        PERIODIC[fn.__name__] = (fn, config_key, default)
+        return fn
+    return decorator
+
+
+class JobContext:
+    """Passado ao handler: parâmetros, progresso e ações pós-commit."""
+
+    def __init__(self, job_id, payload, worker_id=None, resume=None):
+        self.id = job_id
+        self.payload = payload
+        self.worker_id = worker_id
+        self.resume = resume  # último checkpoint da tentativa anterior (ou None)
+        self._after_commit = []
+        self._last = None
+
+    def progress(self, percent, message=None):
+        # Transação própria (a tela acompanha) e renova a posse da tarefa.
+        # Chame entre commits do handler: no SQLite a escrita espera a transação aberta.
+        state = (max(0, min(100, int(percent))), (message or '')[:200])
+        if state == self._last:
+            return
+        self._last = state
+        t = Job.__table__
+        with db.engine.begin() as conn:
+            conn.execute(update(t).where(_owned(t, self.id, self.worker_id)).values(
+                progress=state[0], message=state[1], locked_at=datetime.now()
+            ))
+
+    def checkpoint(self, state):
+        # Na transação do handler, antes do commit do lote: o lote e o ponto de retomada
+        # entram juntos. Sem a posse, o lote não pode ser gravado (outro worker refaz).
+        t = Job.__table__
+        saved = db.session.execute(update(t).where(_owned(t, self.id, self.worker_id)).values(
+            result=json.dumps(state, default=str)
+        ))
+        if not saved.rowcount:
+            raise LeaseLost(f"Tarefa {self.id} retomada por outro worker")
+
+    def after_commit(self, fn):
+        self._after_commit.append(fn)
+
+
+def spool_path(filename):
+    """Caminho para guardar um upload até o worker processar."""
+    folder = current_app.config.get('JOBS_SPOOL_DIR') or os.path.join(current_app.instance_path, 'spool')
+    os.makedirs(folder, exist_ok=True)
+    ext = os.path.splitext(filename or '')[1].lower()
+    return os.path.join(folder, f'{uuid.uuid4().hex}{ext}')
+
+
+def submit(kind, payload=None, max_attempts=None, dedupe_key=None):
+    """Enfileira a tarefa. Com dedupe_key, se já houver uma pendente com a chave, devolve ela."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {kind}")
+    job = Job(
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        user_id=session.get('user_id') if has_request_context() else None,
+        max_attempts=max_attempts or current_app.config.get('JOBS_MAX_ATTEMPTS', 3),
+        dedupe_key=dedupe_key
+    )
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Índice único na chave: dois pedidos ao mesmo tempo geram uma tarefa só
+        db.session.rollback()
+        if dedupe_key is None:
+            raise
+        return Job.query.filter_by(dedupe_key=dedupe_key).first()
+
+    if current_app.config.get('JOBS_INLINE'):
+        # Testes/benchmarks: executa já, na própria requisição
+        if claim('inline', job.id):
+            execute(job.id, 'inline')
+    else:
+        runner.wake()
+    return job
+
+
+def _claimable(t, now):
+    lease = timedelta(seconds=current_app.config.get('JOBS_LEASE', 600))
+    return or_(
+        and_(t.c.status == QUEUED, t.c.run_after <= now),
+        # Worker que sumiu (processo morto) sem terminar: tarefa volta a ser disputada
+        and_(t.c.status == RUNNING, t.c.locked_at < now - lease)
+    )
+
+
+def claim(worker_id, job_id=None):
+    """Pega a próxima tarefa disponível (ou a tarefa `job_id`). Retorna o id ou None."""
+    t = Job.__table__
+    now = datetime.now()
+    if job_id is not None:
+        candidates = [job_id]
+    else:
+        candidates = [i for (i,) in db.session.query(t.c.id).filter(_claimable(t, now)).order_by(t.c.id).limit(5)]
+
+    for candidate in candidates:
+        result = db.session.execute(
+            update(t).where(t.c.id == candidate, _claimable(t, now)).values(
+                status=RUNNING, locked_by=worker_id, locked_at=now,
+                started_at=now, attempts=t.c.attempts + 1
+            )
+        )
+        db.session.commit()
+        if result.rowcount:
+            return candidate
+    return None
+
+
+def _owned(t, job_id, worker_id):
+    return and_(t.c.id == job_id, t.c.status == RUNNING, t.c.locked_by == worker_id)
+
+
+def _heartbeat(app, job_id, worker_id, stop):
+    """Renova a posse da tarefa enquanto o handler roda (conexão própria)."""
+    interval = app.config.get('JOBS_HEARTBEAT', 30)
+    t = Job.__table__
+    while not stop.wait(interval):
+        try:
+            with app.app_context(), db.engine.begin() as conn:
+                conn.execute(update(t).where(_owned(t, job_id, worker_id)).values(locked_at=datetime.now()))
+        except Exception:
+            app.logger.warning('Tarefa %s: falha ao renovar a posse', job_id, exc_info=True)
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+def execute(job_id, worker_id):
+    from app.services import audit
+    t = Job.__table__
+    job = db.session.get(Job, job_id)
+    # Enquanto não termina, result guarda o checkpoint da tentativa anterior
+    ctx = JobContext(job.id, json.loads(job.payload or '{}'), worker_id,
+                     resume=json.loads(job.result) if job.result else None)
+    fn = HANDLERS.get(job.kind)
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(current_app._get_current_object(), job_id, worker_id, stop),
+                     name=f'job-heartbeat-{job_id}', daemon=True).start()
+    # Alterações feitas pela tarefa ficam no nome de quem a pediu
+    audit.set_actor(job.user_id, f'tarefa:{job.kind}')
+    try:
+        if fn is None:
+            raise RuntimeError(f"Tipo de tarefa desconhecido: {job.kind}")
+        result = fn(ctx)
+
+        # Só grava se a tarefa ainda é deste worker (mesma transação do trabalho do handler)
+        done = db.session.execute(update(t).where(_owned(t, job_id, worker_id)).values(
+            status=DONE, progress=100, error=None, dedupe_key=None,
+            result=json.dumps(result, default=str), finished_at=datetime.now()
+        ))
+        if not done.rowcount:
+            raise LeaseLost(f"Tarefa {job_id} retomada por outro worker")
+        db.session.commit()
+    except LeaseLost:
+        db.session.rollback()
+        current_app.logger.warning('Tarefa %s: posse perdida, trabalho desfeito', job_id)
+        return
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Tarefa %s (%s) falhou', job_id, fn.__name__ if fn else '?')
+        job = db.session.get(Job, job_id)
+        if job.status != RUNNING or job.locked_by != worker_id:
+            return  # Já é de outro worker: ele decide o destino da tarefa
+        job.error = str(getattr(e, 'orig', None) or e)[:2000]
+        if job.attempts >= job.max_attempts:
+            job.status, job.finished_at = FAILED, datetime.now()
+            job.dedupe_key = None
+        else:
+            delay = current_app.config.get('JOBS_RETRY_DELAY', 30) * 2 ** (job.attempts - 1)
+            job.status, job.run_after = QUEUED, datetime.now() + timedelta(seconds=delay)
+            job.message = f"Nova tentativa em {delay}s"
+        job.locked_by = None
+        db.session.commit()
+        return
+    finally:
+        stop.set()
+        audit.clear_actor()
+
+    for fn in ctx._after_commit:
+        fn()
+
+
+class JobRunner:
+    def __init__(self):
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._last_run = {}
+
+    def start(self, app, workers):
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        for i in range(workers):
+            thread = threading.Thread(target=self._loop, args=(app, f'{prefix}:{i}'),
+                                      name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def started(self):
+        return bool(self._threads)
+
+    def _loop(self, app, worker_id):
+        poll = app.config.get('JOBS_POLL_INTERVAL', 2)
+        while not self._stop.is_set():
+            with app.app_context():
+                self._run_periodic(app)
+                try:
+                    job_id = claim(worker_id)
+                    if job_id is not None:
+                        execute(job_id, worker_id)
+                        continue
+                except Exception:
+                    app.logger.exception('Erro no worker %s', worker_id)
+            self._wake.wait(poll)
+            self._wake.clear()
+
+    def _run_periodic(self, app):
+        for name, (fn, config_key, default) in PERIODIC.items():
+            interval = app.config.get(config_key, default)
+            with self._lock:
+                # Um worker só por vez roda cada rotina; os outros seguem pegando tarefas
+                if not interval or time.monotonic() - self._last_run.get(name, float('-inf')) < interval:
+                    continue
+                self._last_run[name] = time.monotonic()
+            try:
+                fn()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Rotina %s falhou', name)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+
+
+runner = JobRunner()
+
+
+def init_app(app):
+    if not app.config.get('JOBS_ENABLED') or app.config.get('JOBS_INLINE'):
+        return
+    lock = threading.Lock()
+
+    # Sobe os workers na primeira requisição: comandos "flask ..." e o processo
+    # vigia do reloader não atendem requisições e não devem pegar tarefas
+    def start_workers():
+        if not runner.started:
+            with lock:
+                if not runner.started:
+                    runner.start(app, app.config.get('JOBS_WORKERS', 2))
+    app.before_request(start_workers)
+
+
+# --- TAREFAS ---
+@handler('nfe_import')
+def _nfe_import(ctx):
+    from app.services.nfe_import import import_file
+    from app.services.search_index import product_index
+    path = ctx.payload['path']
+    # Cada nota é uma transação; numa nova tentativa as já importadas são puladas (chave de acesso)
+    results = import_file(path, ctx.payload.get('filename'), progress=ctx.progress)
+    ctx.after_commit(product_index.invalidate)
+    ctx.after_commit(lambda: os.path.exists(path) and os.remove(path))
+    return results
+
+
+@handler('reprice')
+def _reprice(ctx):
+    from app.services import repricing
+    from app.services.search_index import product_index
+    # Sem commit aqui: o UPDATE é confirmado junto com o status da tarefa
+    totals = repricing.apply(ctx.payload, commit=False)
+    ctx.after_commit(product_index.invalidate)
+    return totals
+
+
+@handler('rebuild_rollups')
+def _rebuild_rollups(ctx):
+    from app.services import sales_rollups
+    since = ctx.payload.get('since')
+    done = sales_rollups.rebuild(
+        since=datetime.strptime(since, '%Y-%m-%d') if since else None,
+        progress=lambda n, total: ctx.progress(100 * n / max(total, 1), f"{n}/{total} vendas")
+    )
+    return {'sales': done}
+
+
+@handler('refresh_reorder')
+def _refresh_reorder(ctx):
+    from app.services import reorder
+    return reorder.refresh(full=ctx.payload.get('full', False))
+
+
+@handler('csv_import')
+def _csv_import(ctx):
+    from app.services import csv_import
+    from app.services.clients import client_cache
+    from app.services.search_index import product_index
+    path = ctx.payload['path']
+    # Um commit por lote, com a última linha gravada: nova tentativa continua dali
+    # (sem reservar códigos de novo para produtos sem código)
+    with open(path, 'rb') as fh:
+        stats = csv_import.import_csv(fh, ctx.payload['kind'], ctx.payload.get('mode', 'insert'),
+                                      ctx.payload.get('filename'), progress=ctx.progress,
+                                      resume=ctx.resume, checkpoint=ctx.checkpoint)
+    updated_ids = stats.pop('updated_ids')
+    if ctx.payload['kind'] == 'products':
+        ctx.after_commit(product_index.invalidate)
+    else:
+        ctx.after_commit(lambda: [client_cache.discard(i) for i in updated_ids])
+    ctx.after_commit(lambda: os.path.exists(path) and os.remove(path))
+    return stats
+
+
+@handler('nfce_emit')
+def _nfce_emit(ctx):
+    from app.services import nfce
+    # Um commit por lote: numa nova tentativa as vendas já emitidas não estão mais pendentes
+    start, end = ctx.payload.get('start'), ctx.payload.get('end')
+    return nfce.emit(
+        sale_ids=ctx.payload.get('sale_ids'),
+        start=datetime.fromisoformat(start) if start else None,
+        end=datetime.fromisoformat(end) if end else None,
+        progress=ctx.progress
+    )
+
+
+@handler('payroll_run')
+def _payroll_run(ctx):
+    from app.services import payroll
+    # Apaga e regrava a competência numa transação só: nova tentativa não duplica
+    return payroll.run(ctx.payload['period'], progress=ctx.progress)
+
+
+# --- ROTINAS PERIÓDICAS ---
+@periodic('HOLDS_SWEEP_INTERVAL', 60)
+def _sweep_holds():
+    from app.services import holds
+    holds.sweep()
+
+
+@periodic('REORDER_REFRESH_INTERVAL', 60)
+def _refresh_reorder_if_stale():
+    from app.services import reorder
+    reorder.refresh_if_stale()
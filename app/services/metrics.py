@@ -0,0 +1,247 @@
+import threading
+import time
+
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+# Instrumentação por requisição: latência por endpoint, nº e tempo de SQL,
+# uso do pool, espera na retirada e abertura de conexões. Exposto em /metrics
+# (formato Prometheus). Eventos do SQLAlchemy e a classe do pool (poolclass nas
+# opções do engine): continua valendo depois de engine.dispose().
+# Desligado (METRICS_ENABLED = False) nada é registrado: custo zero.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+CONNECT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+POOL_WAIT_BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels=''):
+        sep = ',' if labels else ''
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}'
+        suffix = f'{{{labels}}}' if labels else ''
+        yield f'{name}_sum{suffix} {self.total:.6f}'
+        yield f'{name}_count{suffix} {self.count}'
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = {}
+        self.queries = {}
+        self.sql_time = {}
+        self.over_threshold = {}
+        self.connect_time = Histogram(CONNECT_BUCKETS)
+        self.pool_wait = Histogram(POOL_WAIT_BUCKETS)
+        self.checkouts = 0
+
+    def observe_request(self, endpoint, elapsed, query_count, sql_time, over_threshold):
+        with self.lock:
+            self.latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.queries.setdefault(endpoint, Histogram(QUERY_BUCKETS)).observe(query_count)
+            self.sql_time.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(sql_time)
+            if over_threshold:
+                self.over_threshold[endpoint] = self.over_threshold.get(endpoint, 0) + 1
+
+    def observe_connect(self, elapsed):
+        with self.lock:
+            self.connect_time.observe(elapsed)
+
+    def observe_pool_wait(self, elapsed):
+        with self.lock:
+            self.pool_wait.observe(elapsed)
+
+    def observe_checkout(self):
+        with self.lock:
+            self.checkouts += 1
+
+    def render(self):
+        out = []
+        with self.lock:
+            for name, help_text, series in (
+                ('erp_request_duration_seconds', 'Latência das requisições por endpoint.', self.latency),
+                ('erp_request_sql_queries', 'Comandos SQL por requisição.', self.queries),
+                ('erp_request_sql_seconds', 'Tempo gasto em SQL por requisição.', self.sql_time),
+            ):
+                out.append(f'# HELP {name} {help_text}')
+                out.append(f'# TYPE {name} histogram')
+                for endpoint, hist in sorted(series.items()):
+                    out.extend(hist.lines(name, f'endpoint="{endpoint}"'))
+
+            out.append('# HELP erp_db_connect_seconds Abertura de conexões novas com o banco.')
+            out.append('# TYPE erp_db_connect_seconds histogram')
+            out.extend(self.connect_time.lines('erp_db_connect_seconds'))
+
+            out.append('# HELP erp_db_pool_wait_seconds Espera para retirar uma conexão do pool.')
+            out.append('# TYPE erp_db_pool_wait_seconds histogram')
+            out.extend(self.pool_wait.lines('erp_db_pool_wait_seconds'))
+
+            out.append('# HELP erp_db_pool_checkouts_total Conexões retiradas do pool.')
+            out.append('# TYPE erp_db_pool_checkouts_total counter')
+            out.append(f'erp_db_pool_checkouts_total {self.checkouts}')
+
+            out.append('# HELP erp_request_query_threshold_exceeded_total Requisições acima do limite de SQL.')
+            out.append('# TYPE erp_request_query_threshold_exceeded_total counter')
+            for endpoint, n in sorted(self.over_threshold.items()):
+                out.append(f'erp_request_query_threshold_exceeded_total{{endpoint="{endpoint}"}} {n}')
+        out.extend(_pool_gauges())
+        return '\n'.join(out) + '\n'
+
+
+registry = Registry()
+
+
+# --- POOL COM TEMPO DE ESPERA ---
+class TimedQueuePool(QueuePool):
+    """QueuePool que mede a espera na retirada (fila cheia até pool_timeout)."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            registry.observe_pool_wait(time.perf_counter() - started)
+
+
+def _uses_queue_pool(uri):
+    # SQLite em memória usa pool próprio (uma conexão só): fica de fora
+    uri = str(uri)
+    return not (uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') == 'sqlite:'))
+
+
+def configure(app):
+    """Antes do db.init_app (depois do replica.configure): pool com medição de espera.
+
+    A classe vai nas opções do engine, então o pool recriado por dispose() também mede."""
+    config = app.config
+    if not config.get('METRICS_ENABLED'):
+        return
+    options = config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if _uses_queue_pool(config['SQLALCHEMY_DATABASE_URI']):
+        options.setdefault('poolclass', TimedQueuePool)
+    for bind in (config.get('SQLALCHEMY_BINDS') or {}).values():
+        if isinstance(bind, dict) and _uses_queue_pool(bind.get('url', '')):
+            bind.setdefault('poolclass', TimedQueuePool)
+
+
+# --- GANCHOS DO SQLALCHEMY ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_app_context():
+        current = g.get('_metrics')
+        if current is not None:
+            current['queries'] += 1
+            current['sql_time'] += elapsed
+
+
+def _handle_error(context):
+    # Comando com erro não chega ao after_cursor_execute: descarta o início pendente
+    started = context.connection.info.get('_metrics_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def _do_connect(dialect, connection_record, cargs, cparams):
+    connection_record.info['_metrics_connect'] = time.perf_counter()
+
+
+def _connected(dbapi_connection, connection_record):
+    started = connection_record.info.pop('_metrics_connect', None)
+    if started is not None:
+        registry.observe_connect(time.perf_counter() - started)
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    registry.observe_checkout()
+
+
+def _pool_gauges():
+    """Conexões em uso e além do tamanho do pool, lidas do pool atual de cada banco."""
+    if not has_app_context():
+        return []
+    out = ['# HELP erp_db_pool_in_use Conexões do pool em uso.', '# TYPE erp_db_pool_in_use gauge']
+    overflow = ['# HELP erp_db_pool_overflow Conexões abertas além do tamanho do pool.',
+                '# TYPE erp_db_pool_overflow gauge']
+    for key, engine in sorted(db.engines.items(), key=lambda item: str(item[0])):
+        label = f'bind="{key or "default"}"'
+        pool = engine.pool
+        if hasattr(pool, 'checkedout'):
+            out.append(f'erp_db_pool_in_use{{{label}}} {pool.checkedout()}')
+        if hasattr(pool, 'overflow'):
+            overflow.append(f'erp_db_pool_overflow{{{label}}} {max(pool.overflow(), 0)}')
+    return out + overflow
+
+
+def _instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+    # Eventos do pool registrados no engine passam para o pool novo criado por dispose()
+    event.listen(engine, 'do_connect', _do_connect)
+    event.listen(engine, 'connect', _connected)
+    event.listen(engine, 'checkout', _checkout)
+
+
+# --- GANCHOS DO FLASK ---
+def _start_request():
+    g._metrics = {'started': time.perf_counter(), 'queries': 0, 'sql_time': 0.0}
+
+
+def _finish_request(app):
+    def teardown(exc):
+        current = g.pop('_metrics', None)
+        if current is None or request.endpoint == 'metrics':
+            return
+        endpoint = request.endpoint or 'unknown'
+        elapsed = time.perf_counter() - current['started']
+        threshold = app.config.get('METRICS_QUERY_WARN_THRESHOLD', 50)
+        over = current['queries'] > threshold
+        if over:
+            app.logger.warning('%s executou %d comandos SQL (limite %d) em %.3fs: %s',
+                               endpoint, current['queries'], threshold, elapsed, request.full_path)
+        registry.observe_request(endpoint, elapsed, current['queries'], current['sql_time'], over)
+    return teardown
+
+
+def metrics_view():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_engine(engine)
+    app.before_request(_start_request)
+    app.teardown_request(_finish_request(app))
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
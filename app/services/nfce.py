@@ -0,0 +1,421 @@
+import os
+import secrets
+import time
+from collections import Counter as Tally
+from datetime import datetime
+from decimal import Decimal
+from itertools import cycle
+from xml.sax.saxutils import XMLGenerator
+
+from flask import current_app
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.models.client import Client
+from app.models.inventory import Product
+from app.models.sales import FiscalDocument, Sale, SaleItem
+from app.services.sequence import reserve
+
+# Geração de NFC-e (modelo 65) das vendas finalizadas, uma a uma ou em lote
+# (ex.: as vendas do dia em contingência):
+#   - vendas, itens e clientes lidos em lotes com IN (...); NCM/CFOP/unidade de
+#     cada produto lidos uma vez por execução
+#   - cada nota é escrita direto no arquivo com XMLGenerator (sem montar árvore)
+#   - numeração por série reservada no contador, na mesma transação dos registros
+#   - vendas com dado fiscal inválido ficam de fora (sem consumir número) e entram no resumo
+# Só o XML local: assinatura, QR Code e transmissão à SEFAZ ficam para o transmissor.
+
+NS = 'http://www.portalfiscal.inf.br/nfe'
+MODEL = '65'
+VERSION = '4.00'
+BATCH_SIZE = 500
+MAX_EXAMPLES = 100
+HOMOLOGATION_TEXT = 'NF-E EMITIDA EM AMBIENTE DE HOMOLOGACAO - SEM VALOR FISCAL'
+CENTS = Decimal('0.01')
+
+UF_CODES = {
+    'RO': '11', 'AC': '12', 'AM': '13', 'RR': '14', 'PA': '15', 'AP': '16', 'TO': '17',
+    'MA': '21', 'PI': '22', 'CE': '23', 'RN': '24', 'PB': '25', 'PE': '26', 'AL': '27', 'SE': '28', 'BA': '29',
+    'MG': '31', 'ES': '32', 'RJ': '33', 'SP': '35', 'PR': '41', 'SC': '42', 'RS': '43',
+    'MS': '50', 'MT': '51', 'GO': '52', 'DF': '53',
+}
+# Forma de pagamento do PDV -> tPag
+PAYMENT_CODES = {'dinheiro': '01', 'credito': '03', 'debito': '04', 'pix': '17'}
+CARD_PAYMENTS = {'03', '04'}
+
+
+def _digits(value):
+    return ''.join(c for c in str(value or '') if c.isdigit())
+
+
+def check_digit(key43):
+    """Dígito verificador da chave de acesso (módulo 11, pesos 2 a 9 da direita para a esquerda)."""
+    total = sum(int(d) * w for d, w in zip(reversed(key43), cycle(range(2, 10))))
+    rest = total % 11
+    return 0 if rest < 2 else 11 - rest
+
+
+def access_key(uf_code, issued_at, cnpj, series, number, emission_type, code):
+    key = (f"{uf_code}{issued_at:%y%m}{cnpj:0>14}{MODEL}{series:03d}{number:09d}"
+           f"{emission_type}{code:08d}")
+    return key + str(check_digit(key))
+
+
+def emitter_settings():
+    """Dados do emitente da configuração; erro claro se faltar algo obrigatório."""
+    cfg = current_app.config
+    emitter = {
+        'cnpj': _digits(cfg.get('EMITTER_CNPJ')),
+        'name': cfg.get('EMITTER_NAME') or '',
+        'ie': _digits(cfg.get('EMITTER_IE')) or 'ISENTO',
+        'crt': str(cfg.get('EMITTER_CRT', 1)),
+        'street': cfg.get('EMITTER_STREET') or '',
+        'number': cfg.get('EMITTER_NUMBER') or 'S/N',
+        'district': cfg.get('EMITTER_DISTRICT') or '',
+        'city': cfg.get('EMITTER_CITY') or '',
+        'city_code': _digits(cfg.get('EMITTER_CITY_CODE')),
+        'uf': (cfg.get('EMITTER_UF') or '').upper(),
+        'cep': _digits(cfg.get('EMITTER_CEP')),
+        'environment': int(cfg.get('NFCE_ENVIRONMENT', 2)),
+        'series': int(cfg.get('NFCE_SERIES', 1)),
+        'tz': cfg.get('NFCE_TZ_OFFSET', '-03:00'),
+    }
+    problems = []
+    if len(emitter['cnpj']) != 14:
+        problems.append('EMITTER_CNPJ (14 dígitos)')
+    if emitter['uf'] not in UF_CODES:
+        problems.append('EMITTER_UF')
+    if len(emitter['city_code']) != 7:
+        problems.append('EMITTER_CITY_CODE (código IBGE, 7 dígitos)')
+    if problems:
+        raise RuntimeError(f"Configure os dados do emitente: {', '.join(problems)}.")
+    emitter['uf_code'] = UF_CODES[emitter['uf']]
+    return emitter
+
+
+def output_dir():
+    return current_app.config.get('NFCE_OUTPUT_DIR') or os.path.join(current_app.instance_path, 'nfce')
+
+
+def _seed_number(series):
+    def seed(conn):
+        # Primeiro uso da série neste banco: continua da maior nota já gravada
+        t = FiscalDocument.__table__
+        last = conn.execute(select(func.max(t.c.number)).where(t.c.model == MODEL, t.c.series == series)).scalar()
+        return (last or 0) + 1
+    return seed
+
+
+def pending(sale_ids=None, start=None, end=None):
+    """Ids das vendas ainda sem NFC-e (todas ou só as da lista / do período)."""
+    query = db.session.query(Sale.id).outerjoin(FiscalDocument, FiscalDocument.sale_id == Sale.id).filter(
+        FiscalDocument.id.is_(None)
+    )
+    if sale_ids is not None:
+        query = query.filter(Sale.id.in_(list(sale_ids)))
+    if start is not None:
+        query = query.filter(Sale.created_at >= start, Sale.created_at < end)
+    return [sale_id for (sale_id,) in query.order_by(Sale.id)]
+
+
+# --- LEITURA EM LOTE ---
+def _load(ids, fiscal):
+    sales = db.session.query(
+        Sale.id, Sale.created_at, Sale.payment_method, Sale.subtotal, Sale.total, Client.name, Client.document
+    ).outerjoin(Client, Client.id == Sale.client_id).filter(Sale.id.in_(ids)).order_by(Sale.id).all()
+
+    items = {}
+    for row in db.session.query(
+        SaleItem.sale_id, SaleItem.product_id, SaleItem.code, SaleItem.name,
+        SaleItem.quantity, SaleItem.unit_price, SaleItem.total
+    ).filter(SaleItem.sale_id.in_(ids)).order_by(SaleItem.sale_id, SaleItem.id):
+        items.setdefault(row.sale_id, []).append(row)
+
+    # Dado fiscal só dos produtos ainda não vistos nesta execução
+    missing = {i.product_id for rows in items.values() for i in rows if i.product_id is not None} - fiscal.keys()
+    if missing:
+        for row in db.session.query(Product.id, Product.ncm, Product.cfop, Product.unit).filter(
+            Product.id.in_(list(missing))
+        ):
+            fiscal[row.id] = (_digits(row.ncm), _digits(row.cfop), (row.unit or 'UN').strip()[:6] or 'UN')
+        for product_id in missing - fiscal.keys():
+            fiscal[product_id] = None  # produto excluído depois da venda
+    return sales, items
+
+
+def _validate(sale, items, fiscal):
+    """[(motivo, detalhe)] do que impede a nota; vazio se pode emitir."""
+    problems = []
+    if not items:
+        problems.append(('Venda sem itens', ''))
+    for item in items:
+        data = fiscal.get(item.product_id) if item.product_id is not None else None
+        if data is None:
+            problems.append(('Produto excluído (sem NCM/CFOP)', item.code))
+            continue
+        ncm, cfop, _ = data
+        if len(ncm) != 8 or ncm == '00000000':
+            problems.append(('NCM inválido', item.code))
+        if len(cfop) != 4 or cfop[0] != '5':
+            problems.append(('CFOP não é de saída interna (5xxx)', item.code))
+        if item.quantity <= 0:
+            problems.append(('Quantidade inválida', item.code))
+    items_total = sum((Decimal(i.total) for i in items), Decimal(0))
+    if items and abs(items_total - Decimal(sale.subtotal or 0)) > CENTS * len(items):
+        problems.append(('Soma dos itens diferente do subtotal', ''))
+    if sale.document and len(_digits(sale.document)) not in (11, 14):
+        problems.append(('CPF/CNPJ do cliente inválido', sale.document))
+    return problems
+
+
+def _prorate(amount, totals):
+    """Divide `amount` entre os itens na proporção do valor; o resto do arredondamento vai no último."""
+    base = sum(totals, Decimal(0))
+    if not amount or not base:
+        return [Decimal(0)] * len(totals)
+    shares = [(amount * t / base).quantize(CENTS) for t in totals[:-1]]
+    return shares + [amount - sum(shares, Decimal(0))]
+
+
+# --- ESCRITA (XML em fluxo) ---
+class _Writer:
+    def __init__(self, fh):
+        self.gen = XMLGenerator(fh, encoding='utf-8', short_empty_elements=True)
+
+    def open(self, tag, attrs=None):
+        self.gen.startElement(tag, attrs or {})
+
+    def close(self, tag):
+        self.gen.endElement(tag)
+
+    def el(self, tag, value):
+        self.gen.startElement(tag, {})
+        self.gen.characters(str(value))
+        self.gen.endElement(tag)
+
+
+def _money(value):
+    return f'{Decimal(value):.2f}'
+
+
+def _write(fh, key, number, code, sale, items, fiscal, emitter):
+    homologation = emitter['environment'] == 2
+    totals = [Decimal(i.total) for i in items]
+    items_total = sum(totals, Decimal(0))
+    # Acréscimo do parcelamento (ou arredondamento para baixo) rateado nos itens
+    difference = Decimal(sale.total or 0) - items_total
+    extra = _prorate(max(difference, Decimal(0)), totals)
+    discount = _prorate(max(-difference, Decimal(0)), totals)
+
+    w = _Writer(fh)
+    w.gen.startDocument()
+    w.open('NFe', {'xmlns': NS})
+    w.open('infNFe', {'versao': VERSION, 'Id': f'NFe{key}'})
+
+    w.open('ide')
+    for tag, value in (('cUF', emitter['uf_code']), ('cNF', f'{code:08d}'), ('natOp', 'VENDA'),
+                       ('mod', MODEL), ('serie', emitter['series']), ('nNF', number),
+                       ('dhEmi', sale.created_at.strftime('%Y-%m-%dT%H:%M:%S') + emitter['tz']),
+                       ('tpNF', 1), ('idDest', 1), ('cMunFG', emitter['city_code']), ('tpImp', 4),
+                       ('tpEmis', 1), ('cDV', key[-1]), ('tpAmb', emitter['environment']), ('finNFe', 1),
+                       ('indFinal', 1), ('indPres', 1), ('procEmi', 0), ('verProc', 'ERP 1.0')):
+        w.el(tag, value)
+    w.close('ide')
+
+    w.open('emit')
+    w.el('CNPJ', emitter['cnpj'])
+    w.el('xNome', emitter['name'])
+    w.open('enderEmit')
+    for tag, value in (('xLgr', emitter['street']), ('nro', emitter['number']), ('xBairro', emitter['district']),
+                       ('cMun', emitter['city_code']), ('xMun', emitter['city']), ('UF', emitter['uf']),
+                       ('CEP', emitter['cep'])):
+        if value:
+            w.el(tag, value)
+    w.close('enderEmit')
+    w.el('IE', emitter['ie'])
+    w.el('CRT', emitter['crt'])
+    w.close('emit')
+
+    document = _digits(sale.document)
+    if document:
+        w.open('dest')
+        w.el('CPF' if len(document) == 11 else 'CNPJ', document)
+        if sale.name or homologation:
+            w.el('xNome', HOMOLOGATION_TEXT if homologation else sale.name[:60])
+        w.el('indIEDest', 9)
+        w.close('dest')
+
+    for n, (item, add, off) in enumerate(zip(items, extra, discount), 1):
+        ncm, cfop, unit = fiscal[item.product_id]
+        code_digits = _digits(item.code)
+        gtin = item.code if code_digits == item.code and len(item.code) in (8, 12, 13, 14) else 'SEM GTIN'
+        name = HOMOLOGATION_TEXT if homologation and n == 1 else item.name[:120]
+        w.open('det', {'nItem': str(n)})
+        w.open('prod')
+        for tag, value in (('cProd', item.code), ('cEAN', gtin), ('xProd', name), ('NCM', ncm), ('CFOP', cfop),
+                           ('uCom', unit), ('qCom', f'{item.quantity:.4f}'),
+                           ('vUnCom', f'{Decimal(item.unit_price):.10f}'), ('vProd', _money(item.total)),
+                           ('cEANTrib', gtin), ('uTrib', unit), ('qTrib', f'{item.quantity:.4f}'),
+                           ('vUnTrib', f'{Decimal(item.unit_price):.10f}')):
+            w.el(tag, value)
+        if off:
+            w.el('vDesc', _money(off))
+        if add:
+            w.el('vOutro', _money(add))
+        w.el('indTot', 1)
+        w.close('prod')
+        # Simples Nacional sem permissão de crédito; PIS/COFINS são opcionais na NFC-e
+        w.open('imposto')
+        w.open('ICMS')
+        w.open('ICMSSN102')
+        w.el('orig', 0)
+        w.el('CSOSN', 102)
+        w.close('ICMSSN102')
+        w.close('ICMS')
+        w.close('imposto')
+        w.close('det')
+
+    w.open('total')
+    w.open('ICMSTot')
+    zero = _money(0)
+    for tag, value in (('vBC', zero), ('vICMS', zero), ('vICMSDeson', zero), ('vFCP', zero),
+                       ('vBCST', zero), ('vST', zero), ('vFCPST', zero), ('vFCPSTRet', zero),
+                       ('vProd', _money(items_total)), ('vFrete', zero), ('vSeg', zero),
+                       ('vDesc', _money(sum(discount, Decimal(0)))), ('vII', zero), ('vIPI', zero),
+                       ('vIPIDevol', zero), ('vPIS', zero), ('vCOFINS', zero),
+                       ('vOutro', _money(sum(extra, Decimal(0)))), ('vNF', _money(sale.total))):
+        w.el(tag, value)
+    w.close('ICMSTot')
+    w.close('total')
+
+    w.open('transp')
+    w.el('modFrete', 9)
+    w.close('transp')
+
+    payment = PAYMENT_CODES.get(sale.payment_method, '99')
+    w.open('pag')
+    w.open('detPag')
+    w.el('tPag', payment)
+    if payment == '99':
+        w.el('xPag', (sale.payment_method or 'Outros')[:60])
+    w.el('vPag', _money(sale.total))
+    if payment in CARD_PAYMENTS:
+        w.open('card')
+        w.el('tpIntegra', 2)  # maquininha não integrada ao PDV
+        w.close('card')
+    w.close('detPag')
+    w.close('pag')
+
+    w.close('infNFe')
+    w.close('NFe')
+    w.gen.endDocument()
+
+
+def emit(sale_ids=None, start=None, end=None, progress=None):
+    """Gera as NFC-e das vendas pendentes (lista de ids e/ou período). Um commit por lote.
+
+    Retorna o resumo: emitidas, inválidas (com os motivos), faixa de números e tempo.
+    """
+    started = time.perf_counter()
+    emitter = emitter_settings()
+    series = emitter['series']
+    base_dir = output_dir()
+    ids = pending(sale_ids, start, end)
+
+    now = datetime.now()
+    fiscal = {}
+    reasons = Tally()
+    examples = []
+    emitted = invalid = 0
+    first_number = last_number = None
+
+    for offset in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[offset:offset + BATCH_SIZE]
+        sales, items = _load(chunk, fiscal)
+
+        valid = []
+        for sale in sales:
+            problems = _validate(sale, items.get(sale.id, []), fiscal)
+            if problems:
+                invalid += 1
+                reasons.update({reason for reason, _ in problems})
+                if len(examples) < MAX_EXAMPLES:
+                    examples.append({'sale_id': sale.id, 'errors': [
+                        f'{reason} ({detail})' if detail else reason for reason, detail in problems
+                    ]})
+            else:
+                valid.append(sale)
+
+        if valid:
+            # Números na mesma transação dos registros: lote desfeito não deixa buraco na série
+            number = reserve(f'nfce_{MODEL}_{series}', len(valid), _seed_number(series),
+                             connection=db.session.connection())
+            written, rows = [], []
+            try:
+                for sale in valid:
+                    code = secrets.randbelow(10 ** 8)
+                    while code == number:  # cNF não pode repetir o número da nota
+                        code = secrets.randbelow(10 ** 8)
+                    key = access_key(emitter['uf_code'], sale.created_at, emitter['cnpj'], series, number, 1, code)
+                    relative = os.path.join(sale.created_at.strftime('%Y-%m'), f'{key}-nfce.xml')
+                    path = os.path.join(base_dir, relative)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, 'wb') as fh:
+                        _write(fh, key, number, code, sale, items[sale.id], fiscal, emitter)
+                    written.append(path)
+                    rows.append({
+                        'sale_id': sale.id, 'model': MODEL, 'series': series, 'number': number,
+                        'access_key': key, 'environment': emitter['environment'], 'total': sale.total,
+                        'path': relative, 'issued_at': sale.created_at, 'created_at': now
+                    })
+                    first_number = number if first_number is None else first_number
+                    last_number = number
+                    number += 1
+                db.session.execute(insert(FiscalDocument.__table__), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                for path in written:
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+            emitted += len(valid)
+        else:
+            db.session.commit()
+
+        if progress:
+            done = min(offset + BATCH_SIZE, len(ids))
+            progress(100 * done / len(ids), f"{done}/{len(ids)} vendas")
+
+    return {
+        'requested': len(ids),
+        'emitted': emitted,
+        'invalid': invalid,
+        'reasons': reasons.most_common(),
+        'examples': examples,
+        'series': series,
+        'first_number': first_number,
+        'last_number': last_number,
+        'environment': emitter['environment'],
+        'elapsed': round(time.perf_counter() - started, 3)
+    }
+
+
+def recent(limit=50):
+    return db.session.query(
+        FiscalDocument.id, FiscalDocument.sale_id, FiscalDocument.series, FiscalDocument.number,
+        FiscalDocument.access_key, FiscalDocument.total, FiscalDocument.issued_at, FiscalDocument.environment
+    ).order_by(FiscalDocument.id.desc()).limit(limit).all()
+
+
+def pending_count(start=None, end=None):
+    query = db.session.query(func.count(Sale.id)).outerjoin(
+        FiscalDocument, FiscalDocument.sale_id == Sale.id
+    ).filter(FiscalDocument.id.is_(None))
+    if start is not None:
+        query = query.filter(Sale.created_at >= start, Sale.created_at < end)
+    return query.scalar() or 0
+
+
+def file_path(document):
+    return os.path.join(output_dir(), document.path)
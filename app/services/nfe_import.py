@@ -0,0 +1,250 @@
+import os
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+
+from sqlalchemy import bindparam, func, insert, or_, update
+
+from app import db
+from app.models.inventory import Product, NFeImport
+from app.services import catalog, valuation, stock_ledger
+from app.services.sequence import reserve_product_codes
+
+# Importação de NF-e em fluxo:
+#   - iterparse + clear: memória constante mesmo em notas com milhares de <det>
+#   - produtos buscados em lotes com IN (...), inserts e updates em lote
+#   - notas já importadas (chNFe) são puladas
+
+BATCH_SIZE = 500
+SEM_GTIN = {'', 'SEM GTIN', 'SEM_GTIN'}
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child_text(node, tag):
+    for child in node:
+        if _local(child.tag) == tag:
+            return (child.text or '').strip() or None
+    return None
+
+
+def iter_items(source, on_key=None):
+    """Percorre os <det> da nota sem montar a árvore inteira.
+
+    on_key(chave) é chamado ao abrir <infNFe>; se retornar False a leitura para.
+    """
+    inf_nfe = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        tag = _local(elem.tag)
+        if event == 'start':
+            if tag == 'infNFe':
+                inf_nfe = elem
+                key = (elem.get('Id') or '').replace('NFe', '') or None
+                if on_key and on_key(key) is False:
+                    return
+            continue
+
+        if tag != 'det':
+            continue
+
+        prod = None
+        for child in elem:
+            if _local(child.tag) == 'prod':
+                prod = child
+                break
+
+        if prod is not None:
+            ean = _child_text(prod, 'cEAN') or ''
+            yield {
+                'ean': None if ean.upper() in SEM_GTIN else ean,
+                'name': _child_text(prod, 'xProd'),
+                'qty': int(float(_child_text(prod, 'qCom') or 0)),
+                'cost': float(_child_text(prod, 'vUnCom') or 0),
+                'unit': _child_text(prod, 'uCom') or 'UN',
+                'ncm': _child_text(prod, 'NCM') or '00000000',
+                'cfop': _child_text(prod, 'CFOP') or '5102'
+            }
+
+        # Libera o <det> já processado
+        elem.clear()
+        if inf_nfe is not None:
+            inf_nfe.remove(elem)
+
+
+def _chunks(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _apply_batch(batch, stats):
+    # Soma linhas repetidas do mesmo produto dentro do lote
+    lines = {}
+    for item in batch:
+        key = ('code', item['ean']) if item['ean'] else ('name', item['name'])
+        line = lines.get(key)
+        if line:
+            line['qty'] += item['qty']
+            line['cost'] = item['cost']
+            line['ncm'] = item['ncm']
+        else:
+            lines[key] = dict(item)
+
+    eans = [item['ean'] for item in lines.values() if item['ean']]
+    names = [item['name'] for item in lines.values() if item['name']]
+
+    # Mesma regra de antes: casa pelo EAN ou pelo nome exato.
+    # FOR UPDATE: o estoque lido é o que o UPDATE abaixo vai somar (delta do valor do estoque)
+    by_code, by_name, current = {}, {}, {}
+    if eans or names:
+        rows = db.session.query(
+            Product.id, Product.code, Product.name,
+            Product.stock, Product.cost_price, Product.price
+        ).filter(
+            or_(Product.code.in_(eans), Product.name.in_(names))
+        ).with_for_update().all()
+        for row in rows:
+            by_code[row.code] = row.id
+            by_name.setdefault(row.name, row.id)
+            current[row.id] = (row.stock, row.cost_price, row.price)
+
+    updates, inserts = {}, []
+    for item in lines.values():
+        product_id = (item['ean'] and by_code.get(item['ean'])) or by_name.get(item['name'])
+        if product_id:
+            upd = updates.get(product_id)
+            if upd:
+                upd['qty'] += item['qty']
+                upd['cost'], upd['xml_ncm'] = item['cost'], item['ncm']
+            else:
+                updates[product_id] = {'pid': product_id, 'qty': item['qty'],
+                                       'cost': item['cost'], 'xml_ncm': item['ncm']}
+        else:
+            inserts.append({
+                'code': item['ean'],
+                'name': item['name'],
+                'stock': item['qty'],
+                'cost_price': item['cost'],
+                'price': item['cost'] * 1.5, # Margem padrão 50%
+                'unit': item['unit'],
+                'ncm': item['ncm'],
+                'cfop': item['cfop']
+            })
+
+    # Itens sem GTIN recebem código interno: uma única reserva de faixa por lote
+    no_code = [row for row in inserts if not row['code']]
+    if no_code:
+        codes = reserve_product_codes(len(no_code), connection=db.session.connection())
+        for row, code in zip(no_code, codes):
+            row['code'] = code
+
+    version = catalog.stamp() if updates or inserts else None
+    for row in inserts:
+        row['version'] = version
+
+    if updates:
+        db.session.execute(
+            update(Product.__table__)
+            .where(Product.__table__.c.id == bindparam('pid'))
+            .values(
+                stock=func.coalesce(Product.__table__.c.stock, 0) + bindparam('qty'),
+                cost_price=bindparam('cost'),
+                ncm=bindparam('xml_ncm'),
+                version=version
+            ),
+            list(updates.values())
+        )
+    if inserts:
+        db.session.execute(insert(Product), inserts)
+
+    # Entradas no livro de estoque (ids dos novos produtos numa única consulta)
+    movements = [stock_ledger.movement(upd['pid'], upd['qty'], 'nfe', stats['access_key'])
+                 for upd in updates.values()]
+    if inserts:
+        new_ids = dict(db.session.query(Product.code, Product.id).filter(
+            Product.code.in_([row['code'] for row in inserts])
+        ).all())
+        movements += [stock_ledger.movement(new_ids[row['code']], row['stock'], 'nfe', stats['access_key'])
+                      for row in inserts]
+    stock_ledger.record(movements)
+
+    # Delta do valor do estoque: (estoque, custo, preço) antes e depois
+    delta = valuation.Delta()
+    for upd in updates.values():
+        stock, cost, price = current[upd['pid']]
+        delta.change((stock, cost, price), ((stock or 0) + upd['qty'], upd['cost'], price))
+    for row in inserts:
+        delta.change(None, (row['stock'], row['cost_price'], row['price']))
+    valuation.apply(delta)
+
+    stats['updated'] += len(updates)
+    stats['created'] += len(inserts)
+
+
+def import_nfe(source, filename=None):
+    """Importa uma NF-e (arquivo ou stream) em uma transação. Retorna as estatísticas."""
+    started = time.perf_counter()
+    stats = {'file': filename, 'access_key': None, 'items': 0, 'created': 0,
+             'updated': 0, 'skipped': False, 'error': None, 'elapsed': 0.0}
+    record = None
+
+    def check_key(key):
+        nonlocal record
+        stats['access_key'] = key
+        if not key:
+            return True
+        if db.session.query(NFeImport.id).filter_by(access_key=key).first():
+            stats['skipped'] = True
+            return False
+        # Registra a chave logo no início: uma importação simultânea da mesma nota
+        # esbarra na chave única em vez de dar entrada em dobro
+        record = NFeImport(access_key=key, filename=filename)
+        db.session.add(record)
+        db.session.flush()
+        return True
+
+    try:
+        for batch in _chunks(iter_items(source, on_key=check_key), BATCH_SIZE):
+            stats['items'] += len(batch)
+            _apply_batch(batch, stats)
+
+        if record is not None:
+            record.items, record.created, record.updated = stats['items'], stats['created'], stats['updated']
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        stats['error'] = str(getattr(e, 'orig', None) or e)
+
+    stats['elapsed'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def import_file(source, filename=None, progress=None):
+    """Importa um .xml ou um .zip com várias notas (caminho ou arquivo aberto).
+
+    Retorna uma lista de estatísticas por nota; progress(%, mensagem) é
+    chamado após cada nota (fora de transação).
+    """
+    filename = filename or (source if isinstance(source, str) else 'upload.xml')
+    if not filename.lower().endswith('.zip'):
+        if isinstance(source, str):
+            with open(source, 'rb') as fh:
+                return [import_nfe(fh, os.path.basename(filename))]
+        return [import_nfe(source, filename)]
+
+    results = []
+    with zipfile.ZipFile(source) as zf:
+        members = [m for m in zf.namelist() if m.lower().endswith('.xml')]
+        for i, member in enumerate(members, start=1):
+            with zf.open(member) as fh:
+                results.append(import_nfe(fh, member))
+            if progress:
+                progress(100 * i / len(members), f"{i}/{len(members)} notas")
+    return results
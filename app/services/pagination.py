@@ -0,0 +1,83 @@
+from flask import request, stream_template, stream_with_context, Response
+
+# Paginação por cursor (keyset): WHERE id > :cursor ORDER BY id LIMIT n.
+# Ao contrário de OFFSET, o custo de cada página não cresce com a posição na listagem.
+# Leituras completas (listagem em fluxo, catálogo, exportação) usam o mesmo cursor em
+# lotes: o mysqlconnector não tem cursor no servidor, e yield_per traria tudo de uma vez.
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+STREAM_BATCH = 500
+
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def _int_arg(name):
+    try:
+        return int(request.args[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def per_page_arg():
+    per_page = _int_arg('per_page') or DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def keyset_paginate(query, column):
+    """Página a partir dos argumentos ?after= / ?before= / ?per_page= da requisição.
+
+    column deve ser única e indexada (normalmente a chave primária).
+    """
+    per_page = per_page_arg()
+    after, before = _int_arg('after'), _int_arg('before')
+
+    if before is not None:
+        rows = query.filter(column < before).order_by(column.desc()).limit(per_page + 1).all()
+        has_prev, has_next = len(rows) > per_page, True
+        items = list(reversed(rows[:per_page]))
+    else:
+        if after is not None:
+            query = query.filter(column > after)
+        rows = query.order_by(column).limit(per_page + 1).all()
+        has_prev, has_next = after is not None, len(rows) > per_page
+        items = rows[:per_page]
+
+    key = column.key
+    return KeysetPage(
+        items,
+        per_page,
+        next_cursor=getattr(items[-1], key) if items and has_next else None,
+        prev_cursor=getattr(items[0], key) if items and has_prev else None
+    )
+
+
+def keyset_batches(query, column, size=STREAM_BATCH):
+    """Todas as linhas da consulta, lote a lote (column única e presente nas linhas)."""
+    key = column.key
+    last = None
+    while True:
+        batch = (query if last is None else query.filter(column > last)).order_by(column).limit(size).all()
+        yield from batch
+        if len(batch) < size:
+            return
+        last = getattr(batch[-1], key)
+
+
+def wants_stream():
+    return request.args.get('all') == '1'
+
+
+def stream_listing(template, query, column, name, **context):
+    """Listagem completa em fluxo: as primeiras linhas chegam antes do fim da consulta."""
+    context[name] = keyset_batches(query, column)
+    return Response(stream_with_context(stream_template(template, page=None, **context)))
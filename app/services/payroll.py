@@ -0,0 +1,224 @@
+import time
+from calendar import monthrange
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import delete, func, insert, or_, select
+
+from app import db
+from app.models.payroll import PayrollEntry
+from app.models.user import Employee
+
+# Folha de pagamento mensal (substitui a planilha do RH):
+#   - uma consulta só com as colunas usadas (id, cargo, salário, admissão), sem objetos do ORM
+#   - INSS, IRRF, FGTS e provisões de 13º e férias calculados para todos de uma vez,
+#     em vetores NumPy (sem laço por colaborador)
+#   - recalcular uma competência apaga e regrava as linhas dela na mesma transação:
+#     rodar de novo dá o mesmo resultado (idempotente)
+# As tabelas de INSS/IRRF mudam todo ano: acrescente o ano novo em TABLES.
+
+TABLES = {
+    2025: {
+        # INSS progressivo: (teto da faixa, alíquota)
+        'inss': [(1518.00, 0.075), (2793.88, 0.09), (4190.83, 0.12), (8157.41, 0.14)],
+        # IRRF: (teto da faixa, alíquota, parcela a deduzir); a última faixa não tem teto
+        'irrf': [(2428.80, 0.0, 0.0), (2826.65, 0.075, 182.16), (3751.05, 0.15, 394.16),
+                 (4664.68, 0.225, 675.49), (None, 0.275, 908.73)],
+        'irrf_simplified': 607.20,  # Desconto simplificado (usado quando maior que o INSS)
+        'irrf_reduction': None,
+    },
+    2026: {
+        'inss': [(1621.00, 0.075), (2902.84, 0.09), (4354.27, 0.12), (8475.55, 0.14)],
+        'irrf': [(2428.80, 0.0, 0.0), (2826.65, 0.075, 182.16), (3751.05, 0.15, 394.16),
+                 (4664.68, 0.225, 675.49), (None, 0.275, 908.73)],
+        'irrf_simplified': 607.20,
+        # Lei 15.270/2025: isenção até 5.000,00 e redução decrescente até 7.350,00
+        'irrf_reduction': {'exempt_until': 5000.00, 'until': 7350.00, 'base': 978.62, 'rate': 0.133145},
+    },
+}
+FGTS_RATE = 0.08
+MIN_DAYS = 15    # Fração do mês que conta como mês inteiro (13º e férias)
+MONTH_DAYS = 30  # Mês comercial
+
+
+def period_start(value):
+    """Primeiro dia do mês de competência (date, datetime ou 'AAAA-MM')."""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:7], '%Y-%m')
+    return date(value.year, value.month, 1)
+
+
+def period_end(start):
+    return date(start.year, start.month, monthrange(start.year, start.month)[1])
+
+
+def tables_for(start):
+    years = [y for y in TABLES if y <= start.year]
+    if not years:
+        raise RuntimeError(f"Sem tabelas de INSS/IRRF para {start.year}.")
+    return TABLES[max(years)]
+
+
+def _round(values):
+    # Arredondamento comercial (meio centavo para cima), não o "do banqueiro" do np.round
+    return np.floor(values * 100 + 0.5 + 1e-9) / 100
+
+
+def _month_index(days):
+    """Meses desde 1970 de um vetor datetime64[D] (para comparar competências)."""
+    return days.astype('datetime64[M]').astype(np.int64)
+
+
+# --- CÁLCULO (vetorizado) ---
+def inss(gross, table):
+    """Contribuição progressiva: cada faixa incide só sobre a parte do salário dentro dela."""
+    limits = np.array([limit for limit, _ in table['inss']])
+    rates = np.array([rate for _, rate in table['inss']])
+    lower = np.concatenate(([0.0], limits[:-1]))
+    portions = np.clip(gross[:, None] - lower, 0, limits - lower)
+    return _round(portions @ rates)
+
+
+def irrf(gross, inss_values, table):
+    limits = np.array([limit for limit, _, _ in table['irrf'][:-1]])
+    rates = np.array([rate for _, rate, _ in table['irrf']])
+    deductions = np.array([deduction for _, _, deduction in table['irrf']])
+    # Sem dependentes no cadastro: desconta o INSS ou o simplificado, o que for maior
+    base = gross - np.maximum(inss_values, table['irrf_simplified'])
+    bracket = np.searchsorted(limits, base, side='left')
+    tax = np.maximum(base * rates[bracket] - deductions[bracket], 0)
+    reduction = table.get('irrf_reduction')
+    if reduction:
+        cut = np.where(gross <= reduction['exempt_until'], tax,
+                       np.where(gross <= reduction['until'], reduction['base'] - reduction['rate'] * gross, 0))
+        tax = np.maximum(tax - np.maximum(cut, 0), 0)
+    return _round(tax)
+
+
+def compute(salaries, admissions, start):
+    """Folha da competência `start` para vetores de salário (float) e admissão (datetime64[D]).
+
+    Todos devem ter sido admitidos até o fim da competência. Devolve um dicionário de vetores.
+    """
+    table = tables_for(start)
+    period = _month_index(np.array([start], dtype='datetime64[D]'))[0]
+
+    admitted = _month_index(admissions)
+    day = (admissions - admissions.astype('datetime64[M]')).astype(np.int64) + 1
+
+    # Admitido no mês: proporcional aos dias (mês comercial de 30)
+    first_month_days = MONTH_DAYS + 1 - np.minimum(day, MONTH_DAYS)
+    worked_days = np.where(admitted == period, first_month_days, MONTH_DAYS)
+    gross = _round(salaries * worked_days / MONTH_DAYS)
+
+    inss_values = inss(gross, table)
+    irrf_values = irrf(gross, inss_values, table)
+
+    # 13º e férias: o mês da admissão conta se trabalhou 15 dias ou mais (mesma regra dos dois)
+    first_month_counts = first_month_days >= MIN_DAYS
+    # 13º: avos do ano civil
+    year_start = period - (start.month - 1)
+    thirteenth_months = np.where(admitted < year_start, start.month,
+                                 period - admitted + first_month_counts)
+    # Férias: avos do período aquisitivo atual (fecha a cada aniversário da admissão)
+    elapsed = period - admitted + first_month_counts
+    vacation_months = np.where(elapsed > 0, (elapsed - 1) % 12 + 1, 0)
+
+    return {
+        'worked_days': worked_days,
+        'gross': gross,
+        'inss': inss_values,
+        'irrf': irrf_values,
+        'net': _round(gross - inss_values - irrf_values),
+        'fgts': _round(gross * FGTS_RATE),
+        'thirteenth_months': thirteenth_months,
+        'thirteenth_accrued': _round(salaries * thirteenth_months / 12),
+        'vacation_months': vacation_months,
+        'vacation_accrued': _round(salaries * vacation_months / 12 * 4 / 3),
+    }
+
+
+def _load(start, end):
+    """Colunas dos colaboradores que entram na competência (tuplas, não objetos do ORM)."""
+    rows = db.session.execute(
+        select(Employee.id, Employee.position, Employee.salary, Employee.admission_date)
+        .where(Employee.admission_date <= end, Employee.salary > 0)
+        .order_by(Employee.id)
+    ).all()
+    if not rows:
+        return [], [], np.empty(0), np.empty(0, dtype='datetime64[D]')
+    ids, positions, salaries, admissions = zip(*rows)
+    return (list(ids), list(positions), np.array(salaries, dtype=np.float64),
+            np.array(admissions, dtype='datetime64[D]'))
+
+
+def run(period, progress=None):
+    """Calcula (ou recalcula) a competência inteira e grava a folha. Devolve o resumo."""
+    started = time.perf_counter()
+    start = period_start(period)
+    end = period_end(start)
+    if progress:
+        progress(10, 'Lendo colaboradores')
+    ids, positions, salaries, admissions = _load(start, end)
+    skipped = db.session.query(func.count(Employee.id)).filter(
+        or_(Employee.admission_date.is_(None), Employee.salary.is_(None), Employee.salary <= 0)
+    ).scalar()
+
+    if progress:
+        progress(40, f'Calculando {len(ids)} colaboradores')
+    result = compute(salaries, admissions, start)
+
+    if progress:
+        progress(70, 'Gravando a folha')
+    columns = {key: values.tolist() for key, values in result.items()}
+    columns['base_salary'] = _round(salaries).tolist()
+    keys = list(columns)
+    now = datetime.now()
+    rows = [
+        dict(zip(keys, values), period=start, employee_id=employee_id, position=position, created_at=now)
+        for employee_id, position, *values in zip(ids, positions, *columns.values())
+    ]
+    # Apaga e regrava a competência na mesma transação: recalcular não duplica nem mistura
+    db.session.execute(delete(PayrollEntry).where(PayrollEntry.period == start))
+    if rows:
+        db.session.execute(insert(PayrollEntry.__table__), rows)
+    db.session.commit()
+
+    totals = {key: round(float(result[key].sum()), 2)
+              for key in ('gross', 'inss', 'irrf', 'net', 'fgts', 'thirteenth_accrued', 'vacation_accrued')}
+    return {
+        'period': start.strftime('%Y-%m'),
+        'employees': len(rows),
+        'skipped': skipped,
+        'totals': totals,
+        'elapsed': time.perf_counter() - started
+    }
+
+
+# --- CONSULTA ---
+def periods(limit=24):
+    """Competências já calculadas, da mais recente para a mais antiga."""
+    return [row[0] for row in db.session.query(PayrollEntry.period).distinct()
+            .order_by(PayrollEntry.period.desc()).limit(limit)]
+
+
+def summary(start):
+    """Totais da competência, geral e por cargo (uma consulta agregada)."""
+    columns = (PayrollEntry.gross, PayrollEntry.inss, PayrollEntry.irrf, PayrollEntry.net,
+               PayrollEntry.fgts, PayrollEntry.thirteenth_accrued, PayrollEntry.vacation_accrued)
+    rows = db.session.query(
+        PayrollEntry.position, func.count(PayrollEntry.id), *[func.sum(c) for c in columns]
+    ).filter(PayrollEntry.period == start).group_by(PayrollEntry.position).all()
+
+    keys = ['employees'] + [c.key for c in columns]
+    by_position = sorted(
+        ({'position': row[0], **{k: float(v or 0) for k, v in zip(keys, row[1:])}} for row in rows),
+        key=lambda r: -r['gross']
+    )
+    total = {k: sum(r[k] for r in by_position) for k in keys}
+    total['employees'] = int(total['employees'])
+    return {'total': total, 'by_position': by_position}
+
+
+def entries_query(start):
+    return PayrollEntry.query.filter(PayrollEntry.period == start)
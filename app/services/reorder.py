@@ -0,0 +1,153 @@
+from datetime import date, datetime, time, timedelta
+
+from flask import current_app
+from sqlalchemy import Integer, case, cast, delete, func, insert, literal, or_, select
+
+from app import db
+from app.models.counter import Counter
+from app.models.inventory import CatalogTombstone, Product, ReorderSuggestion
+from app.models.sales import SalesRollup
+from app.services import catalog
+from app.services.bulk import upsert_set
+
+# Sugestões de compra pelo giro de vendas, calculadas pelo banco em lote:
+# um INSERT ... SELECT junta o estoque com as vendas diárias da janela
+# (sales_rollups) e grava média/dia, dias de cobertura e quantidade a comprar.
+# O recálculo é incremental: só produtos alterados desde a última versão do
+# catálogo e os que tinham vendas nos dias que saíram da janela.
+
+VERSION_STATE = 'reorder_version'  # versão do catálogo já processada
+DAY_STATE = 'reorder_day'          # dia (ordinal) do último cálculo
+COLUMNS = ['product_id', 'units_sold', 'avg_daily', 'stock', 'days_cover',
+           'reorder_qty', 'needs_reorder', 'computed_at']
+
+
+def settings():
+    cfg = current_app.config
+    return cfg.get('REORDER_WINDOW_DAYS', 30), cfg.get('REORDER_LEAD_DAYS', 7), cfg.get('REORDER_COVER_DAYS', 30)
+
+
+def _window_start(day, window):
+    return datetime.combine(day - timedelta(days=window - 1), time.min)
+
+
+def _daily_product_rollups(start, end=None):
+    r = SalesRollup.__table__
+    conditions = [r.c.granularity == 'D', r.c.dimension == 'product', r.c.dim_key != 'None', r.c.bucket >= start]
+    if end is not None:
+        conditions.append(r.c.bucket < end)
+    return r, conditions
+
+
+def _sold(start):
+    r, conditions = _daily_product_rollups(start)
+    return select(
+        cast(r.c.dim_key, Integer).label('product_id'),
+        func.sum(r.c.units).label('units')
+    ).where(*conditions).group_by(r.c.dim_key).having(func.sum(r.c.units) > 0).subquery()
+
+
+def _select(start, now, where=None):
+    window, lead, cover = settings()
+    p = Product.__table__
+    sold = _sold(start)
+    units = sold.c.units
+    stock = case((p.c.stock > 0, p.c.stock), else_=0)
+    # Aritmética inteira: comprar = teto((vendas*(prazo+meta) - estoque*janela) / janela)
+    shortfall = units * (lead + cover) - stock * window
+    query = select(
+        p.c.id,
+        units,
+        units * 1.0 / window,
+        stock,
+        stock * window * 1.0 / units,
+        case((shortfall > 0, (shortfall + window - 1) // window), else_=0),
+        stock * window <= units * lead,
+        literal(now)
+    ).select_from(p.join(sold, sold.c.product_id == p.c.id))
+    return query.where(where) if where is not None else query
+
+
+def _state():
+    names = [VERSION_STATE, DAY_STATE]
+    return dict(db.session.query(Counter.name, Counter.next_value).filter(Counter.name.in_(names)))
+
+
+def refresh(full=False):
+    """Recalcula as sugestões (incremental, salvo full=True ou primeira vez). Retorna um resumo."""
+    window, _, _ = settings()
+    now = datetime.now()
+    today = now.date()
+    start = _window_start(today, window)
+    version = catalog.current_version()
+    state = _state()
+    last_version, last_day = state.get(VERSION_STATE), state.get(DAY_STATE)
+    t = ReorderSuggestion.__table__
+
+    full = full or last_version is None or last_day is None or today.toordinal() - last_day >= window
+    if full:
+        db.session.execute(delete(t))
+        result = db.session.execute(insert(t).from_select(COLUMNS, _select(start, now)))
+    else:
+        p = Product.__table__
+        # Produtos com venda, entrada ou edição desde o último cálculo
+        changed = [p.c.version > last_version]
+        stale = [
+            t.c.product_id.in_(select(p.c.id).where(p.c.version > last_version)),
+            t.c.product_id.in_(select(CatalogTombstone.product_id).where(CatalogTombstone.version > last_version))
+        ]
+        if last_day < today.toordinal():
+            # Quem vendeu nos dias que saíram da janela perde essas vendas da média
+            r, conditions = _daily_product_rollups(_window_start(date.fromordinal(last_day), window), start)
+            dropped = select(cast(r.c.dim_key, Integer)).where(*conditions)
+            changed.append(p.c.id.in_(dropped))
+            stale.append(t.c.product_id.in_(dropped))
+        db.session.execute(delete(t).where(or_(*stale)))
+        result = db.session.execute(insert(t).from_select(COLUMNS, _select(start, now, or_(*changed))))
+
+    upsert_set(Counter.__table__, [
+        {'name': VERSION_STATE, 'next_value': version},
+        {'name': DAY_STATE, 'next_value': today.toordinal()}
+    ], ['name'], ['next_value'])
+    db.session.commit()
+    return {'full': full, 'rows': result.rowcount, 'version': version}
+
+
+def is_stale():
+    state = _state()
+    return (state.get(VERSION_STATE) is None
+            or catalog.current_version() > state[VERSION_STATE]
+            or state.get(DAY_STATE) != date.today().toordinal())
+
+
+def refresh_if_stale():
+    """Agenda o recálculo em segundo plano se houve vendas/alterações (sem duplicar tarefas).
+
+    Rodado pelos workers a cada REORDER_REFRESH_INTERVAL segundos, não pelas telas.
+    """
+    if not is_stale():
+        return None
+    from app.services import jobs
+    return jobs.submit('refresh_reorder', dedupe_key='refresh_reorder')
+
+
+def needs_count():
+    return db.session.query(func.count(ReorderSuggestion.product_id)).filter(
+        ReorderSuggestion.needs_reorder.is_(True)
+    ).scalar() or 0
+
+
+def suggestions(category=None, only_needed=True, limit=200):
+    query = db.session.query(
+        ReorderSuggestion.product_id, Product.code, Product.name, Product.category, Product.unit,
+        ReorderSuggestion.stock, ReorderSuggestion.units_sold, ReorderSuggestion.avg_daily,
+        ReorderSuggestion.days_cover, ReorderSuggestion.reorder_qty, ReorderSuggestion.needs_reorder,
+        ReorderSuggestion.computed_at
+    ).join(Product, Product.id == ReorderSuggestion.product_id)
+    if only_needed:
+        query = query.filter(ReorderSuggestion.needs_reorder.is_(True))
+    else:
+        query = query.filter(ReorderSuggestion.reorder_qty > 0)
+    if category:
+        query = query.filter(Product.category == category)
+    return query.order_by(ReorderSuggestion.days_cover, ReorderSuggestion.product_id).limit(limit).all()
@@ -0,0 +1,91 @@
+import sqlite3
+from functools import wraps
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+
+# Leituras na réplica, escritas no banco principal:
+#   - telas só de leitura (@read_only) mandam os SELECTs para a réplica
+#     (bind 'replica', configurada em SQLALCHEMY_REPLICA_URI)
+#   - INSERT/UPDATE/DELETE, flush e SELECT ... FOR UPDATE vão sempre ao principal
+#   - depois da primeira escrita a requisição fica no principal (lê o que gravou)
+# Sem réplica configurada tudo vai ao principal, como antes.
+
+REPLICA_BIND = 'replica'
+READ_ONLY = 'read_only'
+
+
+def _is_plain_select(clause):
+    return (clause is not None
+            and getattr(clause, 'is_select', False)
+            and getattr(clause, '_for_update_arg', None) is None)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get(READ_ONLY):
+            if not self._flushing and _is_plain_select(clause):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+            else:
+                self.info[READ_ONLY] = False
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _session():
+    return current_app.extensions['sqlalchemy'].session
+
+
+def read_only(view):
+    """A tela só lê: as consultas dela (inclusive a resposta em fluxo) podem ir à réplica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        _session().info[READ_ONLY] = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _engine_options(uri, config):
+    options = {'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+               'pool_recycle': config.get('DB_POOL_RECYCLE', 280)}
+    if not str(uri).startswith('sqlite'):
+        options.update(pool_size=config.get('DB_POOL_SIZE', 10),
+                       max_overflow=config.get('DB_MAX_OVERFLOW', 20),
+                       pool_timeout=config.get('DB_POOL_TIMEOUT', 30))
+    return options
+
+
+def configure(app):
+    """Antes do db.init_app: opções do pool por banco e o bind da réplica."""
+    config = app.config
+    options = _engine_options(config['SQLALCHEMY_DATABASE_URI'], config)
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_uri = config.get('SQLALCHEMY_REPLICA_URI')
+    if replica_uri:
+        binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA_BIND, {'url': replica_uri, **_engine_options(replica_uri, config)})
+        config['SQLALCHEMY_BINDS'] = binds
+
+    # Fim da requisição (ou da resposta em fluxo): a próxima começa no principal
+    app.teardown_request(lambda exc: _session().info.pop(READ_ONLY, None))
+
+
+def sync_sqlite_replica(app):
+    """Copia o SQLite principal para o da réplica (teste local do roteamento)."""
+    db = app.extensions['sqlalchemy']
+    primary, replica = db.engines[None], db.engines.get(REPLICA_BIND)
+    if replica is None:
+        raise RuntimeError("Nenhuma réplica configurada (SQLALCHEMY_REPLICA_URI).")
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise RuntimeError("A cópia só vale para SQLite; em MySQL a réplica é mantida pela replicação.")
+    replica.dispose()
+    source = sqlite3.connect(primary.url.database)
+    target = sqlite3.connect(replica.url.database)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
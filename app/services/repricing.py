@@ -0,0 +1,135 @@
+from sqlalchemy import and_, case, func, literal, true, update
+
+from app import db
+from app.models.inventory import Product
+from app.services import catalog, valuation
+
+# Reajuste de preços em massa: um único UPDATE com a expressão do novo valor,
+# filtrado por categoria, faixa de códigos ou NCM. A prévia (dry-run) usa a
+# mesma expressão num SELECT, então mostra exatamente o que o UPDATE fará.
+
+FIELDS = {'price': 'Preço de venda', 'cost_price': 'Preço de custo', 'discount': 'Desconto (%)'}
+MODES = {
+    'percent': 'Percentual (%)',
+    'absolute': 'Valor absoluto (+/-)',
+    'set': 'Definir valor',
+    'margin': 'Margem sobre o custo (%)'
+}
+SAMPLE_SIZE = 20
+
+
+def parse_spec(form):
+    """Valida o formulário e devolve a especificação do reajuste (ValueError se inválido)."""
+    field = form.get('field') or 'price'
+    mode = form.get('mode') or 'percent'
+    if field not in FIELDS or mode not in MODES:
+        raise ValueError("Campo ou tipo de reajuste inválido.")
+    if mode == 'margin' and field != 'price':
+        raise ValueError("Margem sobre o custo só se aplica ao preço de venda.")
+    try:
+        amount = float((form.get('amount') or '').replace(',', '.'))
+    except ValueError:
+        raise ValueError("Informe o valor do reajuste.")
+    if mode == 'percent' and amount <= -100:
+        raise ValueError("Redução percentual deve ser menor que 100%.")
+
+    return {
+        'field': field,
+        'mode': mode,
+        'amount': amount,
+        'category': (form.get('category') or '').strip() or None,
+        'code_from': (form.get('code_from') or '').strip() or None,
+        'code_to': (form.get('code_to') or '').strip() or None,
+        'ncm': (form.get('ncm') or '').strip() or None
+    }
+
+
+def _where(spec):
+    conditions = []
+    if spec['category']:
+        conditions.append(Product.category == spec['category'])
+    # Faixa comparada como texto: use códigos do mesmo tamanho (001 a 050)
+    if spec['code_from']:
+        conditions.append(Product.code >= spec['code_from'])
+    if spec['code_to']:
+        conditions.append(Product.code <= spec['code_to'])
+    if spec['ncm']:
+        conditions.append(Product.ncm.startswith(spec['ncm']))
+    return and_(true(), *conditions)
+
+
+def _new_value(spec):
+    column = getattr(Product, spec['field'])
+    current = func.coalesce(column, 0)
+    amount = spec['amount']
+    if spec['mode'] == 'percent':
+        value = current * (1 + amount / 100)
+    elif spec['mode'] == 'absolute':
+        value = current + amount
+    elif spec['mode'] == 'margin':
+        value = func.coalesce(Product.cost_price, 0) * (1 + amount / 100)
+    else:
+        value = literal(amount)
+
+    # Nunca negativo; desconto limitado a 100%
+    value = case((value < 0, 0), else_=value)
+    if spec['field'] == 'discount':
+        value = case((value > 100, 100), else_=value)
+    return func.round(value, 2)
+
+
+def _totals(spec, lock=False):
+    # Valor do estoque antes/depois só muda para preço e custo (desconto não entra)
+    new_value = _new_value(spec)
+    stock = func.coalesce(Product.stock, 0)
+    new_cost = new_value if spec['field'] == 'cost_price' else func.coalesce(Product.cost_price, 0)
+    new_price = new_value if spec['field'] == 'price' else func.coalesce(Product.price, 0)
+    query = db.session.query(
+        func.count(Product.id),
+        func.coalesce(func.sum(stock * Product.cost_price), 0),
+        func.coalesce(func.sum(stock * new_cost), 0),
+        func.coalesce(func.sum(stock * Product.price), 0),
+        func.coalesce(func.sum(stock * new_price), 0)
+    ).filter(_where(spec))
+    if lock:
+        # Leitura travada: vendas concorrentes esperam o UPDATE e o delta bate com o estoque gravado
+        query = query.with_for_update()
+    count, cost_before, cost_after, sale_before, sale_after = query.one()
+    return {
+        'count': int(count),
+        'cost_before': float(cost_before), 'cost_after': float(cost_after),
+        'sale_before': float(sale_before), 'sale_after': float(sale_after)
+    }
+
+
+def preview(spec, sample=SAMPLE_SIZE):
+    """Dry-run: totais antes/depois e algumas linhas de exemplo, sem alterar nada."""
+    column = getattr(Product, spec['field'])
+    rows = db.session.query(
+        Product.id, Product.code, Product.name, Product.cost_price,
+        column.label('old_value'), _new_value(spec).label('new_value')
+    ).filter(_where(spec)).order_by(Product.code).limit(sample).all()
+    return {'totals': _totals(spec), 'rows': rows}
+
+
+def apply(spec, commit=True):
+    """Aplica o reajuste num único UPDATE e ajusta o valor do estoque. Retorna os totais."""
+    totals = _totals(spec, lock=True)
+    if not totals['count']:
+        return totals
+
+    result = db.session.execute(
+        update(Product)
+        .where(_where(spec))
+        .values({spec['field']: _new_value(spec), 'version': catalog.stamp()})
+        .execution_options(synchronize_session=False)
+    )
+    totals['count'] = result.rowcount
+
+    delta = valuation.Delta()
+    delta.total_cost = totals['cost_after'] - totals['cost_before']
+    delta.total_sale = totals['sale_after'] - totals['sale_before']
+    valuation.apply(delta)
+    if commit:
+        db.session.commit()
+    return totals
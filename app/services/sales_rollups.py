@@ -0,0 +1,250 @@
+import calendar
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from app import db
+from app.models.inventory import Product
+from app.models.sales import Sale, SaleItem, SalesRollup
+from app.services.bulk import upsert_add
+
+# Totais de vendas pré-agregados por hora/dia. A venda soma seus valores ao
+# finalizar; os relatórios leem só estas linhas, nunca os itens de venda.
+
+KEYS = ['granularity', 'dimension', 'bucket', 'dim_key']
+COLUMNS = ['revenue', 'tickets', 'units']
+REBUILD_BATCH = 1000
+
+PAYMENT_LABELS = {
+    'pix': ('Pix', '#00ff88'),
+    'dinheiro': ('Dinheiro', '#ffcc00'),
+    'credito': ('Cartão Crédito', '#3498db'),
+    'debito': ('Cartão Débito', '#9b59b6')
+}
+
+
+def _floor_hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+GRANULARITIES = (('H', _floor_hour), ('D', _floor_day))
+
+
+def _collect(acc, created_at, payment_method, total, lines):
+    """lines: [(product_id, nome, categoria, quantidade, total_da_linha)]"""
+    units = sum(line[3] for line in lines)
+
+    per_category = defaultdict(lambda: [0.0, 0])
+    per_product = {}
+    for product_id, name, category, qty, line_total in lines:
+        cat = per_category[category or 'Sem categoria']
+        cat[0] += float(line_total)
+        cat[1] += qty
+        prod = per_product.setdefault(str(product_id), [name, 0.0, 0])
+        prod[1] += float(line_total)
+        prod[2] += qty
+
+    for granularity, floor in GRANULARITIES:
+        bucket = floor(created_at)
+        entries = [('all', '', None, float(total), units),
+                   ('payment', payment_method, None, float(total), units)]
+        entries += [('category', cat, cat, rev, qty) for cat, (rev, qty) in per_category.items()]
+        entries += [('product', pid, name, rev, qty) for pid, (name, rev, qty) in per_product.items()]
+
+        for dimension, dim_key, label, revenue, qty in entries:
+            row = acc.get((granularity, dimension, bucket, dim_key))
+            if row is None:
+                row = acc[(granularity, dimension, bucket, dim_key)] = {
+                    'granularity': granularity, 'dimension': dimension, 'bucket': bucket,
+                    'dim_key': dim_key, 'label': label, 'revenue': 0.0, 'tickets': 0, 'units': 0
+                }
+            row['revenue'] += revenue
+            row['tickets'] += 1
+            row['units'] += qty
+
+
+def _flush(acc):
+    rows = list(acc.values())
+    for row in rows:
+        row['revenue'] = round(row['revenue'], 2)
+    upsert_add(SalesRollup.__table__, rows, KEYS, COLUMNS)
+
+
+def record_sale(created_at, payment_method, total, lines):
+    """Soma uma venda nos totais (sem commit: vai junto com a transação da venda)."""
+    acc = {}
+    _collect(acc, created_at, payment_method, total, lines)
+    _flush(acc)
+
+
+def _collect_sales(acc, sales):
+    """Soma no acumulador as vendas (id, data, pagamento, total), com os itens numa consulta."""
+    ids = [s.id for s in sales]
+    if not ids:
+        return
+    items = db.session.query(
+        SaleItem.sale_id, SaleItem.product_id, SaleItem.name,
+        Product.category, SaleItem.quantity, SaleItem.total
+    ).outerjoin(Product, Product.id == SaleItem.product_id).filter(SaleItem.sale_id.in_(ids)).all()
+
+    lines_by_sale = defaultdict(list)
+    for item in items:
+        lines_by_sale[item.sale_id].append(tuple(item)[1:])
+    for s in sales:
+        _collect(acc, s.created_at, s.payment_method, s.total or 0, lines_by_sale[s.id])
+
+
+def _next_month(moment):
+    return (moment.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def rebuild(since=None, batch_size=REBUILD_BATCH, progress=None):
+    """Recalcula os totais a partir do histórico de vendas, um mês por vez.
+
+    Cada mês apaga os seus totais, soma as vendas dele em lotes e grava numa transação
+    própria: memória e transação nunca passam de um mês. Apagar antes de ler faz a venda
+    finalizada durante o recálculo esperar o commit e somar nos totais novos: pode rodar
+    com o caixa aberto, sem contar venda em dobro.
+    """
+    sales = db.session.query(Sale.id, Sale.created_at, Sale.payment_method, Sale.total)
+    if since:
+        start = _floor_day(since)
+    else:
+        first = db.session.query(func.min(Sale.created_at)).scalar()
+        start = _floor_day(first) if first else None
+    total_sales = sales.filter(Sale.created_at >= start).count() if start else 0
+    db.session.commit()
+    if start is None:
+        # Nenhuma venda: sobram só totais antigos
+        SalesRollup.query.delete(synchronize_session=False)
+        db.session.commit()
+        return 0
+
+    today, done = _floor_day(datetime.now()), 0
+    window_start = start
+    while window_start <= today:
+        window_end = _next_month(window_start)
+        last = window_end > today
+        delete = SalesRollup.query
+        window = sales.filter(Sale.created_at >= window_start)
+        # Sem `since`, a primeira janela também limpa totais de antes da primeira venda;
+        # a última fica aberta no fim (venda com data adiante do relógio)
+        if since or window_start != start:
+            delete = delete.filter(SalesRollup.bucket >= window_start)
+        if not last:
+            delete = delete.filter(SalesRollup.bucket < window_end)
+            window = window.filter(Sale.created_at < window_end)
+        delete.delete(synchronize_session=False)
+
+        acc, last_id = {}, 0
+        while True:
+            batch = window.filter(Sale.id > last_id).order_by(Sale.id).limit(batch_size).all()
+            if not batch:
+                break
+            _collect_sales(acc, batch)
+            last_id = batch[-1].id
+            done += len(batch)
+            if progress:
+                progress(done, total_sales)
+        _flush(acc)
+        db.session.commit()
+        window_start = window_end
+    return done
+
+
+# --- RELATÓRIOS ---
+def period_range(period, ref):
+    """(granularidade, início, fim) do período 'day', 'month' ou 'year' que contém ref."""
+    day = _floor_day(ref)
+    if period == 'day':
+        return 'H', day, day + timedelta(days=1)
+    if period == 'month':
+        start = day.replace(day=1)
+        return 'D', start, start + timedelta(days=calendar.monthrange(start.year, start.month)[1])
+    start = day.replace(month=1, day=1)
+    return 'D', start, start.replace(year=start.year + 1)
+
+
+def _grouped(granularity, dimension, start, end, order_by_units=False, limit=None):
+    units = func.sum(SalesRollup.units)
+    query = db.session.query(
+        SalesRollup.dim_key,
+        func.max(SalesRollup.label),
+        func.sum(SalesRollup.revenue),
+        func.sum(SalesRollup.tickets),
+        units
+    ).filter(
+        SalesRollup.granularity == granularity,
+        SalesRollup.dimension == dimension,
+        SalesRollup.bucket >= start,
+        SalesRollup.bucket < end
+    ).group_by(SalesRollup.dim_key)
+    query = query.order_by(units.desc() if order_by_units else func.sum(SalesRollup.revenue).desc())
+    if limit:
+        query = query.limit(limit)
+    return [{'key': key, 'label': label or key, 'revenue': float(revenue or 0),
+             'tickets': int(tickets or 0), 'units': int(qty or 0)}
+            for key, label, revenue, tickets, qty in query.all()]
+
+
+def report(period, ref, top=10):
+    granularity, start, end = period_range(period, ref)
+
+    series_rows = db.session.query(
+        SalesRollup.bucket, SalesRollup.revenue, SalesRollup.tickets, SalesRollup.units
+    ).filter(
+        SalesRollup.granularity == granularity,
+        SalesRollup.dimension == 'all',
+        SalesRollup.bucket >= start,
+        SalesRollup.bucket < end
+    ).order_by(SalesRollup.bucket).all()
+
+    # No ano, agrupa os dias por mês
+    label_format = {'day': '%H:00', 'month': '%d/%m', 'year': '%m/%Y'}[period]
+    series = {}
+    for bucket, revenue, tickets, units in series_rows:
+        label = bucket.strftime(label_format)
+        point = series.setdefault(label, {'label': label, 'revenue': 0.0, 'tickets': 0, 'units': 0})
+        point['revenue'] += float(revenue or 0)
+        point['tickets'] += tickets or 0
+        point['units'] += units or 0
+
+    totals = {
+        'revenue': sum(p['revenue'] for p in series.values()),
+        'tickets': sum(p['tickets'] for p in series.values()),
+        'units': sum(p['units'] for p in series.values())
+    }
+    totals['average_ticket'] = totals['revenue'] / totals['tickets'] if totals['tickets'] else 0.0
+
+    payments = _grouped(granularity, 'payment', start, end)
+    for p in payments:
+        p['label'] = PAYMENT_LABELS.get(p['key'], (p['key'], None))[0]
+
+    return {
+        'period': period,
+        'start': start,
+        'end': end,
+        'totals': totals,
+        'series': list(series.values()),
+        'payments': payments,
+        'categories': _grouped(granularity, 'category', start, end),
+        'top_products': _grouped(granularity, 'product', start, end, order_by_units=True, limit=top)
+    }
+
+
+def payment_share(days=30):
+    """Percentual de vendas (tickets) por forma de pagamento nos últimos `days` dias."""
+    start = _floor_day(datetime.now()) - timedelta(days=days - 1)
+    end = _floor_day(datetime.now()) + timedelta(days=1)
+    counts = {p['key']: p['tickets'] for p in _grouped('D', 'payment', start, end)}
+    total = sum(counts.values())
+    return [{
+        'method': label,
+        'count': round(100 * counts.get(key, 0) / total) if total else 0,
+        'color': color
+    } for key, (label, color) in PAYMENT_LABELS.items()], total
@@ -0,0 +1,261 @@
+import heapq
+import threading
+import time
+import unicodedata
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from app.models.inventory import Product
+
+# Índice de busca de produtos em memória (um por processo).
+# Atende o autocomplete do PDV e a busca de /vendas/buscar sem LIKE '%...%' no banco:
+#   - código/EAN exato -> dicionário (leitura de código de barras)
+#   - trechos do nome/código -> listas invertidas de trigramas e de prefixos de palavra
+# Vencido o SEARCH_INDEX_TTL, a recarga roda numa thread e a busca segue no índice atual.
+
+MIN_QUERY_LEN = 2
+DEFAULT_TTL = 300  # segundos até recarregar o catálogo (escritas de outros processos)
+MAX_MATCHES = 200  # buscas muito genéricas ("ma") param de verificar após N acertos
+
+
+def normalize(text):
+    """Minúsculas e sem acentos: 'Martelo Cabo Madeira' e 'mArtélo' casam igual."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower().strip()
+
+
+def final_price(price, discount):
+    # Mesma regra de Product.final_price, mas sobre valores crus da consulta
+    price = float(price or 0)
+    discount = discount or 0
+    if discount > 0:
+        return price * (1 - (discount / 100))
+    return price
+
+
+def _grams(text):
+    grams = set()
+    for word in text.split():
+        if len(word) >= 2:
+            grams.add(word[:2])
+        for i in range(len(word) - 2):
+            grams.add(word[i:i + 3])
+    return grams
+
+
+class _Entry:
+    __slots__ = ('id', 'code', 'key', 'name', 'price', 'stock', 'text', 'words')
+
+    def __init__(self, id, code, name, price, discount, stock):
+        self.id = id
+        self.code = code
+        self.key = normalize(code)
+        self.name = name
+        self.price = final_price(price, discount)
+        self.stock = stock or 0
+        self.text = normalize(f'{name} {code}')
+        self.words = self.text.split()
+
+    def matches(self, token):
+        if len(token) >= 3:
+            return token in self.text
+        return any(w.startswith(token) for w in self.words)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'code': self.code,
+            'name': self.name,
+            'price': self.price,
+            'stock': self.stock
+        }
+
+
+def _put(entries, by_code, postings, entry):
+    old = entries.get(entry.id)
+    old_grams = set()
+    if old:
+        by_code.pop(old.key, None)
+        old_grams = _grams(old.text)
+    entries[entry.id] = entry
+    by_code[entry.key] = entry.id
+    # Ids antigos que sobram nas listas são descartados na verificação da busca
+    for gram in _grams(entry.text) - old_grams:
+        postings.setdefault(gram, []).append(entry.id)
+
+
+def _drop(entries, by_code, product_id):
+    old = entries.pop(product_id, None)
+    if old:
+        by_code.pop(old.key, None)
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}   # id -> _Entry
+        self._by_code = {}   # código normalizado -> id
+        self._postings = {}  # trigrama / prefixo de 2 letras -> [ids]
+        self._loaded_at = None
+        self._rebuilding = False
+        self._trackers = []  # ids alterados durante cada recarga em andamento
+
+    # --- CARGA ---
+    def _ensure_loaded(self):
+        ttl = current_app.config.get('SEARCH_INDEX_TTL', DEFAULT_TTL)
+        if self._loaded_at is None:
+            self.rebuild()  # Primeira carga ou invalidate(): a busca espera
+        elif time.monotonic() - self._loaded_at > ttl:
+            self._rebuild_in_background()  # Enquanto isso, responde com o índice atual
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    self.rebuild()
+                except Exception:
+                    app.logger.exception('Falha ao recarregar o índice de busca')
+                finally:
+                    self._rebuilding = False
+        threading.Thread(target=run, name='search-index-rebuild', daemon=True).start()
+
+    def _rows(self, ids=None):
+        # Conexão própria a cada leitura: vê o que foi confirmado até agora (sem o snapshot
+        # de uma transação aberta) e não mexe na sessão de quem chamou
+        query = select(Product.id, Product.code, Product.name, Product.price, Product.discount, Product.stock)
+        with db.engine.connect() as conn:
+            if ids is None:
+                return conn.execute(query).all()
+            ids = list(ids)
+            return [row for i in range(0, len(ids), 500)
+                    for row in conn.execute(query.where(Product.id.in_(ids[i:i + 500])))]
+
+    def rebuild(self):
+        # upsert/adjust_stock/remove feitos durante a carga são anotados e relidos do banco
+        # antes da troca: a carga não desfaz alteração que chegou depois da leitura
+        touched = set()
+        with self._lock:
+            self._trackers.append(touched)
+        try:
+            rows = self._rows()
+
+            # As listas invertidas ficam em ordem alfabética: os primeiros acertos já são os melhores
+            entries, by_code, postings = {}, {}, {}
+            for entry in sorted((_Entry(*row) for row in rows), key=lambda e: e.text):
+                entries[entry.id] = entry
+                by_code[entry.key] = entry.id
+                for gram in _grams(entry.text):
+                    postings.setdefault(gram, []).append(entry.id)
+
+            while True:
+                with self._lock:
+                    if not touched:
+                        self._entries, self._by_code, self._postings = entries, by_code, postings
+                        self._loaded_at = time.monotonic()
+                        return
+                    ids = set(touched)
+                    touched.clear()
+                found = set()
+                for row in self._rows(ids):
+                    _put(entries, by_code, postings, _Entry(*row))
+                    found.add(row.id)
+                for product_id in ids - found:
+                    _drop(entries, by_code, product_id)
+        finally:
+            with self._lock:
+                self._trackers.remove(touched)
+
+    def _touch(self, ids):
+        for tracker in self._trackers:
+            tracker.update(ids)
+
+    def invalidate(self):
+        # Força recarga na próxima busca (ex.: importação em massa)
+        self._loaded_at = None
+
+    # --- ATUALIZAÇÃO INCREMENTAL (chamar após o commit) ---
+    def upsert(self, product):
+        entry = _Entry(product.id, product.code, product.name,
+                       product.price, product.discount, product.stock)
+        with self._lock:
+            _put(self._entries, self._by_code, self._postings, entry)
+            self._touch([entry.id])
+
+    def remove(self, product_id):
+        with self._lock:
+            _drop(self._entries, self._by_code, product_id)
+            self._touch([product_id])
+
+    def adjust_stock(self, deltas):
+        """deltas: {product_id: variação de estoque}"""
+        with self._lock:
+            for product_id, delta in deltas.items():
+                entry = self._entries.get(product_id)
+                if entry:
+                    entry.stock += delta
+            self._touch(deltas)
+
+    # --- CONSULTA ---
+    def lookup_code(self, code):
+        self._ensure_loaded()
+        product_id = self._by_code.get(normalize(code))
+        entry = self._entries.get(product_id)
+        return entry.to_dict() if entry else None
+
+    def search(self, query, limit=10):
+        self._ensure_loaded()
+        q = normalize(query)
+        if len(q) < MIN_QUERY_LEN:
+            return []
+
+        tokens = [t for t in q.split() if len(t) >= 2] or [q]
+        entries = self._entries
+
+        # Parte da menor lista invertida entre os tokens e confirma os demais no texto
+        candidates = None
+        for token in tokens:
+            gram = token[:2] if len(token) == 2 else None
+            lists = [self._postings.get(gram, [])] if gram else [
+                self._postings.get(token[i:i + 3], []) for i in range(len(token) - 2)
+            ]
+            shortest = min(lists, key=len)
+            if candidates is None or len(shortest) < len(candidates):
+                candidates = shortest
+
+        found = {}
+        for product_id in candidates:
+            entry = entries.get(product_id)
+            if entry and product_id not in found and all(entry.matches(t) for t in tokens):
+                found[product_id] = entry
+                if len(found) >= MAX_MATCHES:
+                    break
+
+        exact_id = self._by_code.get(q)
+        if exact_id in entries:
+            found[exact_id] = entries[exact_id]
+
+        def rank(entry):
+            if entry.key == q:
+                score = 0
+            elif entry.key.startswith(q):
+                score = 1
+            elif entry.text.startswith(q):
+                score = 2
+            elif entry.words and entry.words[0].startswith(tokens[0]):
+                score = 3
+            else:
+                score = 4
+            return (score, entry.name)
+
+        return [e.to_dict() for e in heapq.nsmallest(limit, found.values(), key=rank)]
+
+
+product_index = ProductSearchIndex()
@@ -0,0 +1,96 @@
+import threading
+
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.counter import Counter
+
+# Sequências em tabela (counters) com UPDATE atômico.
+# Cada processo reserva um bloco de valores de uma vez e os entrega da memória,
+# então gerar um código não custa consulta no caso comum.
+
+DEFAULT_BLOCK = 20
+INTERNAL_CODE_MAX_LEN = 6  # códigos internos (001, 002...); EANs têm 8 a 14 dígitos
+
+
+def _reserve(conn, name, count, seed):
+    t = Counter.__table__
+    while True:
+        result = conn.execute(
+            update(t).where(t.c.name == name).values(next_value=t.c.next_value + count)
+        )
+        if result.rowcount:
+            # A linha continua travada por nós até o fim da transação
+            return conn.execute(select(t.c.next_value).where(t.c.name == name)).scalar() - count
+
+        # Primeiro uso: cria o contador a partir do valor inicial
+        start = seed(conn) if seed else 1
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(t).values(name=name, next_value=start + count))
+            return start
+        except IntegrityError:
+            continue  # outro processo criou ao mesmo tempo; tenta o UPDATE de novo
+
+
+def reserve(name, count=1, seed=None, connection=None):
+    """Reserva `count` valores consecutivos e devolve o primeiro.
+
+    Sem `connection`, roda em transação própria e curta (a reserva vale mesmo
+    se a transação de quem chamou for desfeita). Com `connection`, participa
+    da transação existente.
+    """
+    if connection is not None:
+        return _reserve(connection, name, count, seed)
+    with db.engine.begin() as conn:
+        return _reserve(conn, name, count, seed)
+
+
+class BlockAllocator:
+    def __init__(self, name, seed=None, block_config=None):
+        self.name = name
+        self.seed = seed
+        self.block_config = block_config
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def next(self):
+        with self._lock:
+            if self._next >= self._end:
+                size = current_app.config.get(self.block_config, DEFAULT_BLOCK) if self.block_config else DEFAULT_BLOCK
+                self._next = reserve(self.name, size, self.seed)
+                self._end = self._next + size
+            value = self._next
+            self._next += 1
+            return value
+
+
+# --- CÓDIGOS DE PRODUTO ---
+def _seed_product_code(conn):
+    # Só roda uma vez por banco: continua a partir do maior código interno existente
+    from app.models.inventory import Product
+    t = Product.__table__
+    rows = conn.execute(select(t.c.code).where(func.length(t.c.code) <= INTERNAL_CODE_MAX_LEN))
+    numeric = [int(code) for (code,) in rows if code and code.isdigit()]
+    return max(numeric, default=0) + 1
+
+
+product_codes = BlockAllocator('product_code', seed=_seed_product_code, block_config='PRODUCT_CODE_BLOCK')
+
+
+def format_product_code(value):
+    return f"{value:03d}"
+
+
+def next_product_code():
+    return format_product_code(product_codes.next())
+
+
+def reserve_product_codes(count, connection=None):
+    """Reserva uma faixa de `count` códigos numa única chamada (importações em massa)."""
+    if count <= 0:
+        return []
+    start = reserve('product_code', count, _seed_product_code, connection)
+    return [format_product_code(v) for v in range(start, start + count)]
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+from flask import has_request_context, session
+from sqlalchemy import func, insert, literal, select
+
+from app import db
+from app.models.inventory import Product, StockMovement, StockSnapshot
+
+# Livro de movimentações: toda alteração de estoque grava uma linha (em lote).
+# "Estoque na data X" parte da foto (snapshot) mais próxima e soma só as
+# movimentações entre a foto e a data, sem reprocessar o histórico inteiro.
+
+IN, OUT, ADJUST = 'in', 'out', 'adjust'
+
+
+def movement(product_id, quantity, source, document=None, kind=None):
+    if kind is None:
+        kind = IN if quantity >= 0 else OUT
+    return {'product_id': product_id, 'quantity': quantity, 'kind': kind,
+            'source': source, 'document': None if document is None else str(document)}
+
+
+def record(movements):
+    """Grava as movimentações num único INSERT em lote (sem commit)."""
+    rows = [m for m in movements if m['quantity']]
+    if not rows:
+        return
+    now = datetime.now()
+    user_id = session.get('user_id') if has_request_context() else None
+    for row in rows:
+        row.setdefault('created_at', now)
+        row.setdefault('user_id', user_id)
+    db.session.execute(insert(StockMovement.__table__), rows)
+
+
+def take_snapshot(taken_at=None):
+    """Foto do estoque atual de todos os produtos num único INSERT ... SELECT."""
+    taken_at = taken_at or datetime.now()
+    t = Product.__table__
+    result = db.session.execute(
+        insert(StockSnapshot).from_select(
+            ['product_id', 'stock', 'taken_at'],
+            select(t.c.id, func.coalesce(t.c.stock, 0), literal(taken_at))
+        )
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _sum_movements(product_id, start, end):
+    query = db.session.query(func.coalesce(func.sum(StockMovement.quantity), 0)).filter(
+        StockMovement.product_id == product_id
+    )
+    if start is not None:
+        query = query.filter(StockMovement.created_at > start)
+    if end is not None:
+        query = query.filter(StockMovement.created_at <= end)
+    return int(query.scalar())
+
+
+def stock_at(product_id, when):
+    """Estoque do produto no instante `when`."""
+    before = StockSnapshot.query.filter(
+        StockSnapshot.product_id == product_id, StockSnapshot.taken_at <= when
+    ).order_by(StockSnapshot.taken_at.desc()).first()
+    if before:
+        return before.stock + _sum_movements(product_id, before.taken_at, when)
+
+    # Sem foto anterior: volta a partir da foto seguinte (ou do estoque atual)
+    after = StockSnapshot.query.filter(
+        StockSnapshot.product_id == product_id, StockSnapshot.taken_at > when
+    ).order_by(StockSnapshot.taken_at).first()
+    if after:
+        return after.stock - _sum_movements(product_id, when, after.taken_at)
+
+    current = db.session.query(Product.stock).filter(Product.id == product_id).scalar() or 0
+    return current - _sum_movements(product_id, when, None)
+
+
+def history(product_id, start, end, limit=500):
+    """Movimentações do período com saldo corrente, a partir do saldo em `start`."""
+    balance = stock_at(product_id, start)
+    rows = StockMovement.query.filter(
+        StockMovement.product_id == product_id,
+        StockMovement.created_at > start,
+        StockMovement.created_at <= end
+    ).order_by(StockMovement.created_at, StockMovement.id).limit(limit).all()
+
+    entries = []
+    for m in rows:
+        balance += m.quantity
+        entries.append({
+            'date': m.created_at.isoformat(),
+            'kind': m.kind,
+            'quantity': m.quantity,
+            'source': m.source,
+            'document': m.document,
+            'balance': balance
+        })
+    return entries
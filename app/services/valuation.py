@@ -0,0 +1,120 @@
+import random
+
+from sqlalchemy import case, func, update
+
+from app import db
+from app.models.inventory import Product, InventoryValuation
+
+# Valor do estoque (custo e venda) e contagem de itens em estoque baixo.
+# Cada escrita de estoque/preço soma seu delta em um slot aleatório na mesma
+# transação; o dashboard só soma os slots (O(1), sem ler a tabela products).
+# Os slots são criados na migração 015 ou no `flask init-db` (seed), nunca numa leitura.
+
+LOW_STOCK_MAX = 5
+SLOTS = 8
+
+
+def is_low(stock):
+    return 0 < (stock or 0) <= LOW_STOCK_MAX
+
+
+class Delta:
+    def __init__(self):
+        self.total_cost = 0.0
+        self.total_sale = 0.0
+        self.low_stock = 0
+        self.products = 0
+
+    def change(self, old, new):
+        """old/new: (estoque, custo, preço) antes e depois. None = produto inexistente."""
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None:
+                continue
+            stock, cost, price = (values[0] or 0), float(values[1] or 0), float(values[2] or 0)
+            self.total_cost += sign * stock * cost
+            self.total_sale += sign * stock * price
+            self.low_stock += sign * (1 if is_low(stock) else 0)
+            self.products += sign
+        return self
+
+    def __bool__(self):
+        return bool(self.total_cost or self.total_sale or self.low_stock or self.products)
+
+
+def snapshot_of(product):
+    return (product.stock, product.cost_price, product.price)
+
+
+def apply(delta):
+    """Soma o delta no snapshot (sem commit: vai junto com a transação da escrita)."""
+    if not delta:
+        return
+    t = InventoryValuation.__table__
+    db.session.execute(
+        update(t)
+        .where(t.c.slot == random.randint(1, SLOTS))
+        .values(
+            total_cost=t.c.total_cost + round(delta.total_cost, 2),
+            total_sale=t.c.total_sale + round(delta.total_sale, 2),
+            low_stock=t.c.low_stock + delta.low_stock,
+            products=t.c.products + delta.products
+        )
+    )
+
+
+def compute():
+    """Agregados calculados pelo banco (SUM/COUNT), sem carregar produtos."""
+    total_cost, total_sale, low_stock, products = db.session.query(
+        func.coalesce(func.sum(Product.stock * Product.cost_price), 0),
+        func.coalesce(func.sum(Product.stock * Product.price), 0),
+        func.coalesce(func.sum(case((Product.stock.between(1, LOW_STOCK_MAX), 1), else_=0)), 0),
+        func.count(Product.id)
+    ).one()
+    return {
+        'total_cost': float(total_cost),
+        'total_sale': float(total_sale),
+        'low_stock': int(low_stock),
+        'products': int(products)
+    }
+
+
+def rebuild():
+    """Recalcula o snapshot a partir da tabela products (reconciliação)."""
+    totals = compute()
+    db.session.query(InventoryValuation).delete()
+    db.session.add(InventoryValuation(slot=1, **totals))
+    for slot in range(2, SLOTS + 1):
+        db.session.add(InventoryValuation(slot=slot, total_cost=0, total_sale=0, low_stock=0, products=0))
+    db.session.commit()
+    return totals
+
+
+def seed():
+    """Cria o snapshot se ainda não existe (flask init-db). Retorna True se criou."""
+    if db.session.query(InventoryValuation.slot).first() is not None:
+        return False
+    rebuild()
+    return True
+
+
+def _sums():
+    return db.session.query(
+        func.sum(InventoryValuation.total_cost),
+        func.sum(InventoryValuation.total_sale),
+        func.sum(InventoryValuation.low_stock),
+        func.sum(InventoryValuation.products),
+        func.count(InventoryValuation.slot)
+    ).one()
+
+
+def read():
+    """Totais do snapshot; sem os slots (banco não migrado), o agregado do banco, sem gravar."""
+    total_cost, total_sale, low_stock, products, slots = _sums()
+    if slots != SLOTS:
+        return compute()
+    return {
+        'total_cost': float(total_cost or 0),
+        'total_sale': float(total_sale or 0),
+        'low_stock': int(low_stock or 0),
+        'products': int(products or 0)
+    }
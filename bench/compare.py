@@ -0,0 +1,38 @@
+"""Compara dois resultados de benchmark: python -m bench.compare antes.json depois.json"""
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'throughput_rps', 'peak_memory_kb')
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def _change(old, new):
+    if not old:
+        return '   n/a'
+    return f'{(new - old) / old * 100:+6.1f}%'
+
+
+def main(argv=None):
+    argv = argv if argv is not None else sys.argv[1:]
+    if len(argv) != 2:
+        print(__doc__)
+        return 2
+    before, after = _load(argv[0])['results'], _load(argv[1])['results']
+
+    print(f"{'cenário':<24}" + ''.join(f'{m:>26}' for m in METRICS))
+    for name in sorted(set(before) | set(after)):
+        old, new = before.get(name), after.get(name)
+        if not old or not new:
+            print(f'{name:<24} (só em um dos arquivos)')
+            continue
+        cells = ''.join(f"{old[m]:>9} → {new[m]:>9} {_change(old[m], new[m])}" for m in METRICS)
+        print(f'{name:<24}{cells}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
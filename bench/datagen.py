@@ -0,0 +1,175 @@
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import db
+from app.models.client import Client
+from app.models.inventory import Product
+from app.models.sales import Sale, SaleItem
+from app.models.user import User, Employee
+from app.services.search_index import normalize
+
+# Gerador de dados sintéticos (determinístico pela semente) para os benchmarks.
+
+CHUNK = 5000
+
+NOUNS = ['Martelo', 'Parafuso', 'Prego', 'Chave', 'Alicate', 'Serrote', 'Trena', 'Arame',
+         'Cadeado', 'Dobradiça', 'Mangueira', 'Enxada', 'Pá', 'Rastelo', 'Fita', 'Broca',
+         'Lixa', 'Tinta', 'Pincel', 'Rolo', 'Cimento', 'Cal', 'Torneira', 'Registro',
+         'Cano', 'Joelho', 'Luva', 'Bota', 'Ração', 'Semente', 'Adubo', 'Veneno']
+QUALIFIERS = ['Sextavado', 'Philips', 'Fenda', 'Galvanizado', 'Inox', 'Madeira', 'Aço',
+              'Reforçado', 'Plástico', 'PVC', 'Cromado', 'Borracha', 'Profissional',
+              'Tramontina', 'Vonder', 'Gedore', 'Starrett', 'Irwin', 'Bosch', 'Makita']
+SIZES = ['3/8', '1/2', '5mm', '8mm', '10mm', '1m', '5m', '10m', '20L', '50kg', '29mm', 'Nº 12']
+CATEGORIES = ['Ferramentas', 'Fixação', 'Hidráulica', 'Elétrica', 'Pintura', 'Construção',
+              'Jardinagem', 'Agropecuária', 'EPI']
+PAYMENTS = ['dinheiro', 'pix', 'debito', 'credito']
+# Lojas da rede (o cadastro de colaboradores guarda só a cidade)
+STORES = ['Montenegro', 'Porto Alegre', 'Canoas', 'Novo Hamburgo', 'São Leopoldo', 'Caxias do Sul']
+FIRST_NAMES = ['Ana', 'João', 'Maria', 'Pedro', 'Lucas', 'Juliana', 'Carlos', 'Fernanda',
+               'Rafael', 'Patrícia', 'Bruno', 'Camila', 'Eduardo', 'Larissa', 'Gustavo']
+LAST_NAMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Costa', 'Rocha',
+              'Almeida', 'Montenegro', 'Ferreira', 'Ribeiro', 'Carvalho', 'Gomes']
+
+
+def _bulk(model, rows):
+    for i in range(0, len(rows), CHUNK):
+        db.session.execute(insert(model), rows[i:i + CHUNK])
+    db.session.commit()
+
+
+def product_name(rng):
+    return f"{rng.choice(NOUNS)} {rng.choice(QUALIFIERS)} {rng.choice(SIZES)}"
+
+
+def ean(i):
+    return f"789{i:010d}"
+
+
+def products(rng, count):
+    rows = []
+    for i in range(1, count + 1):
+        cost = round(rng.uniform(1, 300), 2)
+        rows.append({
+            'id': i,
+            # Metade com código interno, metade com EAN
+            'code': f"{i:06d}" if i % 2 else ean(i),
+            'name': f"{product_name(rng)} {i}",
+            'cost_price': cost,
+            'price': round(cost * rng.uniform(1.2, 2.0), 2),
+            'discount': rng.choice([0, 0, 0, 5, 10]),
+            'stock': rng.randint(0, 500),
+            'category': rng.choice(CATEGORIES),
+            'unit': 'UN',
+            'ncm': f"{rng.randint(10000000, 99999999)}",
+            'cfop': '5102'
+        })
+    _bulk(Product, rows)
+    return rows
+
+
+def _cpf(i):
+    return f"{i:011d}"
+
+
+def clients(rng, count):
+    rows = []
+    for i in range(1, count + 1):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+        rows.append({
+            'id': i,
+            'name': name,
+            'search_name': normalize(name),
+            'document': _cpf(i),
+            'document_digits': _cpf(i),
+            'email': f"cliente{i}@exemplo.com",
+            'phone': f"(51) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+            'city': 'Montenegro',
+            'state': 'RS'
+        })
+    _bulk(Client, rows)
+    return rows
+
+
+def employees(rng, count):
+    users, emps = [], []
+    for i in range(1, count + 1):
+        users.append({'id': i + 1, 'username': f"colab{i}", 'password': 'bench',
+                      'role': rng.choice(['funcionario', 'funcionario', 'gerente'])})
+        emps.append({
+            'id': i,
+            'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}",
+            'cpf': f"9{i:010d}",
+            'position': rng.choice(['Balconista', 'Caixa', 'Estoquista', 'Vendedor', 'Gerente']),
+            'admission_date': date.today() - timedelta(days=rng.randint(30, 3650)),
+            'salary': round(rng.uniform(1600, 9000), 2),
+            'city': rng.choice(STORES),
+            'state': 'RS',
+            'user_id': i + 1
+        })
+    _bulk(User, [{'id': 1, 'username': 'admin', 'password': 'bench', 'role': 'admin'}] + users)
+    _bulk(Employee, emps)
+
+
+def sales(rng, count, product_rows, days=365):
+    now = datetime.now()
+    sale_rows, item_rows = [], []
+    for sale_id in range(1, count + 1):
+        lines = rng.sample(product_rows, rng.randint(1, 5))
+        subtotal = 0.0
+        for p in lines:
+            qty = rng.randint(1, 4)
+            unit_price = round(p['price'] * (1 - p['discount'] / 100), 2)
+            subtotal += unit_price * qty
+            item_rows.append({
+                'sale_id': sale_id, 'product_id': p['id'], 'code': p['code'], 'name': p['name'],
+                'quantity': qty, 'unit_price': unit_price, 'cost_price': p['cost_price'],
+                'total': round(unit_price * qty, 2)
+            })
+        method = rng.choice(PAYMENTS)
+        installments = rng.randint(1, 6) if method == 'credito' else 1
+        total = subtotal * (1 + 0.04 * installments) if installments > 1 else subtotal
+        sale_rows.append({
+            'id': sale_id,
+            'created_at': now - timedelta(seconds=rng.randint(0, days * 86400)),
+            'payment_method': method, 'installments': installments,
+            'items_count': len(lines), 'subtotal': round(subtotal, 2), 'total': round(total, 2)
+        })
+    _bulk(Sale, sale_rows)
+    _bulk(SaleItem, item_rows)
+
+
+# --- NF-e ---
+def access_key(n):
+    return f"{n:044d}"
+
+
+def nfe_xml(key, items):
+    """items: [(ean, nome, quantidade, custo)] -> bytes de uma NF-e (procNFe) mínima."""
+    dets = ''.join(
+        f'<det nItem="{i}"><prod><cProd>{i}</cProd><cEAN>{code}</cEAN><xProd>{name}</xProd>'
+        f'<NCM>73181500</NCM><CFOP>5102</CFOP><uCom>UN</uCom><qCom>{qty}.0000</qCom>'
+        f'<vUnCom>{cost:.2f}</vUnCom></prod></det>'
+        for i, (code, name, qty, cost) in enumerate(items, start=1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><NFe>'
+        f'<infNFe Id="NFe{key}" versao="4.00"><ide><mod>55</mod></ide>{dets}<total/></infNFe>'
+        f'</NFe><protNFe><infProt><chNFe>{key}</chNFe></infProt></protNFe></nfeProc>'
+    ).encode('utf-8')
+
+
+def nfe_items(rng, count, product_rows, new_from):
+    """Metade de produtos existentes (por EAN), metade de produtos novos."""
+    existing = [p for p in product_rows if not p['code'].startswith('0')]
+    items = []
+    for i in range(count):
+        if i % 2 and existing:
+            p = rng.choice(existing)
+            items.append((p['code'], p['name'], rng.randint(1, 50), p['cost_price']))
+        else:
+            n = new_from + i
+            items.append((ean(n), f"{product_name(rng)} NF {n}", rng.randint(1, 50), rng.uniform(1, 100)))
+    return items
@@ -0,0 +1,83 @@
+"""Verifica que as telas de listagem fazem o mesmo nº de consultas SQL com poucos ou muitos registros (sem N+1).
+
+Uso:
+    python -m bench.querycount
+Sai com código 1 se alguma tela variar.
+"""
+import os
+import random
+import sys
+import tempfile
+
+from sqlalchemy import event
+
+from app import db
+from bench import datagen
+from bench.run import make_app
+
+# (nome, URL) das telas conferidas; todas paginadas ou de tamanho fixo
+PAGES = [
+    ('admin.list_users', '/admin/users?per_page=200'),
+    ('admin.hr_dashboard', '/admin/rh?per_page=200'),
+    ('admin.edit_user', '/admin/users/edit/2'),
+    ('client.list_clients', '/clients/?per_page=200'),
+    ('inventory.list_products', '/inventory/products?per_page=200'),
+]
+SIZES = (5, 150)
+
+
+def count_queries(app, path):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['user_role'] = 'admin'
+
+    # Sessão limpa: nada do que a tela anterior carregou pode vir do identity map
+    db.session.remove()
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(path)
+        response.get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{path}: HTTP {response.status_code}')
+    return len(statements)
+
+
+def measure(size):
+    rng = random.Random(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'querycount.db'))
+        app.config['HTTP_CACHE_ENABLED'] = False
+        # Sem auditoria: o escritor em segundo plano entraria na contagem (e gravaria depois do banco apagado)
+        app.config['AUDIT_ENABLED'] = False
+        with app.app_context():
+            db.create_all()
+            datagen.products(rng, size)
+            datagen.clients(rng, size)
+            datagen.employees(rng, size)
+            counts = {name: count_queries(app, path) for name, path in PAGES}
+            db.session.remove()
+    return counts
+
+
+def main():
+    results = {size: measure(size) for size in SIZES}
+    failed = False
+    for name, _ in PAGES:
+        counts = [results[size][name] for size in SIZES]
+        ok = len(set(counts)) == 1
+        failed |= not ok
+        detail = ', '.join(f'{size} registros: {n}' for size, n in zip(SIZES, counts))
+        print(f"{'OK  ' if ok else 'FALHA'} {name:<28} {detail}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""Benchmarks do ERP contra um SQLite local (sem MySQL).
+
+Uso:
+    python -m bench.run --scale small --output bench_output.json
+    python -m bench.compare antes.json depois.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app import create_app, db
+from bench import datagen
+
+SCALES = {
+    'small': {'products': 2000, 'clients': 1000, 'employees': 3000, 'sales': 2000, 'nfe_items': 500, 'iterations': 50},
+    'medium': {'products': 20000, 'clients': 10000, 'employees': 10000, 'sales': 20000, 'nfe_items': 2000, 'iterations': 100},
+    'large': {'products': 100000, 'clients': 50000, 'employees': 30000, 'sales': 100000, 'nfe_items': 5000, 'iterations': 200},
+}
+MEMORY_ITERATIONS = 5
+
+
+def make_app(db_path):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        TESTING = True
+        METRICS_ENABLED = False
+        JOBS_ENABLED = False
+        JOBS_INLINE = True  # importação medida de ponta a ponta, na própria requisição
+        JOBS_SPOOL_DIR = os.path.join(os.path.dirname(db_path), 'spool')
+        NFCE_OUTPUT_DIR = os.path.join(os.path.dirname(db_path), 'nfce')
+        EMITTER_CNPJ = '11222333000181'
+    return create_app(BenchConfig)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def measure(fn, iterations):
+    fn(-1)  # aquecimento (índices em memória, caches)
+
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+
+    # Memória medida numa passada separada: tracemalloc distorce a latência
+    tracemalloc.start()
+    for i in range(min(iterations, MEMORY_ITERATIONS)):
+        fn(iterations + i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'throughput_rps': round(iterations / elapsed, 2) if elapsed else 0.0,
+        'peak_memory_kb': round(peak / 1024, 1)
+    }
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f'{response.request.path}: HTTP {response.status_code}')
+    response.get_data()  # consome respostas em fluxo
+    return response
+
+
+def seed(scale, rng):
+    from app.services import sales_rollups, valuation
+    started = time.perf_counter()
+    product_rows = datagen.products(rng, scale['products'])
+    datagen.clients(rng, scale['clients'])
+    datagen.employees(rng, scale['employees'])
+    datagen.sales(rng, scale['sales'], product_rows)
+    valuation.rebuild()
+    sales_rollups.rebuild()
+    return product_rows, round(time.perf_counter() - started, 2)
+
+
+def build_scenarios(client, rng, scale, product_rows):
+    queries = [datagen.product_name(rng).split()[0][:rng.randint(2, 6)] for _ in range(50)]
+    codes = [p['code'] for p in product_rows]
+    nfe_counter = [10 ** 6]
+
+    def search(i):
+        _check(client.get('/inventory/api/search', query_string={'q': queries[i % len(queries)]}))
+
+    def scan(i):
+        _check(client.get('/vendas/buscar', query_string={'q': rng.choice(codes)}))
+
+    def finalize(i):
+        cart = [{'code': code, 'qty': 1} for code in rng.sample(codes, 5)]
+        response = client.post('/vendas/finalizar', json={'cart': cart, 'payment_method': rng.choice(datagen.PAYMENTS)})
+        # Estoque insuficiente (400) é resultado válido da venda, não falha do benchmark
+        if response.status_code >= 500:
+            raise RuntimeError(f'/vendas/finalizar: {response.get_json()}')
+
+    def reserve(i):
+        _check(client.post('/vendas/reservas', json={'code': rng.choice(codes), 'qty': rng.randint(0, 3)}))
+
+    def import_xml(i):
+        nfe_counter[0] += 1
+        items = datagen.nfe_items(rng, scale['nfe_items'], product_rows, new_from=nfe_counter[0] * 10000)
+        data = datagen.nfe_xml(datagen.access_key(nfe_counter[0]), items)
+        _check(client.post('/inventory/import-xml', data={'xml_file': (io.BytesIO(data), 'bench.xml')},
+                           content_type='multipart/form-data'))
+
+    def import_csv(i):
+        nfe_counter[0] += 1
+        lines = ['Código;Descrição;Custo;Preço;Estoque'] + [
+            f'CSV{nfe_counter[0]}-{n};{datagen.product_name(rng)};{rng.randint(1, 500)},90;{rng.randint(2, 900)},50;{rng.randint(0, 50)}'
+            for n in range(scale['nfe_items'])
+        ]
+        data = '\n'.join(lines).encode()
+        _check(client.post('/inventory/import-csv', data={'csv_file': (io.BytesIO(data), 'bench.csv')},
+                           content_type='multipart/form-data'))
+
+    def client_search(i):
+        _check(client.get('/clients/api/search', query_string={'q': rng.choice(datagen.FIRST_NAMES)[:3]}))
+
+    def reorder_full(i):
+        from app.services import reorder
+        reorder.refresh(full=True)
+
+    def emit_nfce(i):
+        # Lote com todas as vendas da base (apaga as notas da rodada anterior)
+        from app.models.sales import FiscalDocument
+        from app.services import nfce
+        db.session.query(FiscalDocument).delete()
+        db.session.commit()
+        nfce.emit()
+
+    def payroll_run(i):
+        # Recalcula a competência atual de todos os colaboradores (apaga e regrava)
+        from datetime import date
+        from app.services import payroll
+        payroll.run(date.today())
+
+    def page(path):
+        return lambda i: _check(client.get(path))
+
+    return {
+        'inventory_api_search': (search, scale['iterations']),
+        'inventory_catalog_snapshot': (page('/inventory/api/catalog'), max(3, scale['iterations'] // 10)),
+        'inventory_catalog_delta': (page('/inventory/api/catalog?since=0'), scale['iterations']),
+        'sales_search_product': (scan, scale['iterations']),
+        'sales_finalize': (finalize, scale['iterations']),
+        'sales_reserve': (reserve, scale['iterations']),
+        'sales_emit_nfce_batch': (emit_nfce, 3),
+        'inventory_import_xml': (import_xml, max(3, scale['iterations'] // 10)),
+        'inventory_import_csv': (import_csv, max(3, scale['iterations'] // 10)),
+        'inventory_dashboard': (page('/inventory/dashboard'), scale['iterations']),
+        'inventory_reorder': (page('/inventory/reorder'), scale['iterations']),
+        'inventory_reorder_refresh_full': (reorder_full, max(3, scale['iterations'] // 10)),
+        'list_products': (page('/inventory/products'), scale['iterations']),
+        'list_products_stream': (page('/inventory/products?all=1'), max(3, scale['iterations'] // 10)),
+        'list_clients': (page('/clients/'), scale['iterations']),
+        'export_products_csv': (page('/exportar/produtos.csv'), max(3, scale['iterations'] // 10)),
+        'export_sales_csv': (page('/exportar/vendas.csv'), max(3, scale['iterations'] // 10)),
+        'clients_api_search': (client_search, scale['iterations']),
+        'list_users': (page('/admin/users'), scale['iterations']),
+        'hr_dashboard': (page('/admin/rh'), scale['iterations']),
+        'hr_payroll_run': (payroll_run, max(3, scale['iterations'] // 10)),
+        'hr_payroll_sheet': (page('/admin/rh/folha'), scale['iterations']),
+        'audit_log_products': (page('/admin/auditoria?entity=products'), scale['iterations']),
+        'sales_reports_year': (page('/vendas/relatorios?period=year'), scale['iterations']),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks do ERP (SQLite local).')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--iterations', type=int, help='Sobrescreve o nº de iterações da escala.')
+    parser.add_argument('--only', nargs='*', help='Roda só estes cenários.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Arquivo JSON de saída (padrão: stdout).')
+    args = parser.parse_args(argv)
+
+    scale = dict(SCALES[args.scale])
+    if args.iterations:
+        scale['iterations'] = args.iterations
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            product_rows, seed_seconds = seed(scale, rng)
+
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = 1
+                sess['user_role'] = 'admin'
+
+            results = {}
+            for name, (fn, iterations) in build_scenarios(client, rng, scale, product_rows).items():
+                if args.only and name not in args.only:
+                    continue
+                print(f'> {name} ({iterations}x)', file=sys.stderr)
+                results[name] = measure(fn, iterations)
+            db.session.remove()
+
+    report = {
+        'meta': {
+            'scale': args.scale,
+            'sizes': scale,
+            'seed': args.seed,
+            'seed_seconds': seed_seconds,
+            'git': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            fh.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,3 @@
+-- Dashboard de estoque: índice para o ranking/estoque baixo.
+-- A tabela inventory_valuation é criada pelo db.create_all() e preenchida no primeiro acesso ao dashboard.
+CREATE INDEX ix_products_stock ON products (stock);
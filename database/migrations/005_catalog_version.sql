@@ -0,0 +1,5 @@
+-- Versão do catálogo para a sincronização incremental do PDV (/inventory/api/catalog?since=N).
+-- Produtos existentes ficam na versão 0 (entram no primeiro snapshot).
+-- A tabela catalog_tombstones é criada pelo db.create_all().
+ALTER TABLE products ADD COLUMN version BIGINT NOT NULL DEFAULT 0;
+CREATE INDEX ix_products_version ON products (version);
@@ -0,0 +1,10 @@
+-- Busca de clientes por CPF/CNPJ (só dígitos) e por início do nome; cliente na venda.
+-- Depois de rodar, preencha as colunas novas com: flask clients normalize
+ALTER TABLE clients ADD COLUMN document_digits VARCHAR(14) NULL;
+ALTER TABLE clients ADD COLUMN search_name VARCHAR(150) NULL;
+CREATE UNIQUE INDEX ix_clients_document_digits ON clients (document_digits);
+CREATE INDEX ix_clients_search_name ON clients (search_name);
+
+ALTER TABLE sales ADD COLUMN client_id INT NULL;
+ALTER TABLE sales ADD CONSTRAINT fk_sales_client FOREIGN KEY (client_id) REFERENCES clients (id);
+CREATE INDEX ix_sales_client_id ON sales (client_id);
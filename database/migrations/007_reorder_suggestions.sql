@@ -0,0 +1,12 @@
+-- Sugestão de compras pelo giro de vendas (preenchida por: flask inventory refresh-reorder --full)
+CREATE TABLE reorder_suggestions (
+    product_id INT NOT NULL PRIMARY KEY,
+    units_sold INT NOT NULL DEFAULT 0,
+    avg_daily DOUBLE NOT NULL DEFAULT 0,
+    stock INT NOT NULL DEFAULT 0,
+    days_cover DOUBLE NOT NULL DEFAULT 0,
+    reorder_qty INT NOT NULL DEFAULT 0,
+    needs_reorder BOOLEAN NOT NULL DEFAULT FALSE,
+    computed_at DATETIME NOT NULL
+);
+CREATE INDEX ix_reorder_needs_cover ON reorder_suggestions (needs_reorder, days_cover);
@@ -0,0 +1,12 @@
+-- Reservas de estoque dos carrinhos do PDV (expiram sozinhas; limpeza: flask sales sweep-holds)
+CREATE TABLE stock_holds (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    terminal VARCHAR(32) NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    user_id INT NULL,
+    expires_at DATETIME NOT NULL,
+    CONSTRAINT uq_stock_holds_terminal_product UNIQUE (terminal, product_id)
+);
+CREATE INDEX ix_stock_holds_product_expires ON stock_holds (product_id, expires_at);
+CREATE INDEX ix_stock_holds_expires_at ON stock_holds (expires_at);
@@ -0,0 +1,19 @@
+-- NFC-e geradas para as vendas (XML em disco; gerar: tela Vendas > NFC-e ou flask sales emit-nfce)
+CREATE TABLE fiscal_documents (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    sale_id INT NOT NULL,
+    model VARCHAR(2) NOT NULL DEFAULT '65',
+    series INT NOT NULL,
+    number INT NOT NULL,
+    access_key VARCHAR(44) NOT NULL,
+    environment INT NOT NULL,
+    total DECIMAL(10, 2) NOT NULL,
+    path VARCHAR(255) NOT NULL,
+    issued_at DATETIME NOT NULL,
+    created_at DATETIME NOT NULL,
+    CONSTRAINT uq_fiscal_documents_sale UNIQUE (sale_id),
+    CONSTRAINT uq_fiscal_documents_key UNIQUE (access_key),
+    CONSTRAINT uq_fiscal_documents_number UNIQUE (model, series, number),
+    CONSTRAINT fk_fiscal_documents_sale FOREIGN KEY (sale_id) REFERENCES sales (id)
+);
+CREATE INDEX ix_fiscal_documents_created_at ON fiscal_documents (created_at);
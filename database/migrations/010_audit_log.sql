@@ -0,0 +1,15 @@
+-- Trilha de auditoria (gravada em lote pelo escritor em segundo plano)
+CREATE TABLE audit_log (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    created_at DATETIME NOT NULL,
+    user_id INT NULL,
+    entity VARCHAR(30) NOT NULL,
+    entity_id VARCHAR(40) NULL,
+    action VARCHAR(12) NOT NULL,
+    changes TEXT NULL,
+    source VARCHAR(60) NULL
+);
+CREATE INDEX ix_audit_log_created_at ON audit_log (created_at);
+CREATE INDEX ix_audit_entity_time ON audit_log (entity, created_at);
+CREATE INDEX ix_audit_entity_id_time ON audit_log (entity, entity_id, created_at);
+CREATE INDEX ix_audit_user_time ON audit_log (user_id, created_at);
@@ -0,0 +1,22 @@
+-- Folha de pagamento por competência (calcular: RH > Folha ou flask hr payroll)
+CREATE TABLE payroll (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    period DATE NOT NULL,
+    employee_id INT NOT NULL,
+    position VARCHAR(100) NULL,
+    base_salary DECIMAL(10, 2) NOT NULL,
+    worked_days INT NOT NULL,
+    gross DECIMAL(10, 2) NOT NULL,
+    inss DECIMAL(10, 2) NOT NULL,
+    irrf DECIMAL(10, 2) NOT NULL,
+    net DECIMAL(10, 2) NOT NULL,
+    fgts DECIMAL(10, 2) NOT NULL,
+    thirteenth_months INT NOT NULL,
+    thirteenth_accrued DECIMAL(10, 2) NOT NULL,
+    vacation_months INT NOT NULL,
+    vacation_accrued DECIMAL(10, 2) NOT NULL,
+    created_at DATETIME NULL,
+    CONSTRAINT uq_payroll_period_employee UNIQUE (period, employee_id),
+    CONSTRAINT fk_payroll_employee FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE
+);
+CREATE INDEX ix_payroll_employee_id ON payroll (employee_id);
@@ -0,0 +1,5 @@
+-- Versões do catálogo reservadas por transações abertas (a venda não segura mais o contador até o commit)
+CREATE TABLE catalog_pending_versions (
+    version BIGINT NOT NULL PRIMARY KEY,
+    created_at DATETIME NOT NULL
+);
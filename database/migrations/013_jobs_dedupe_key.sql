@@ -0,0 +1,3 @@
+-- Tarefa única por chave enquanto está na fila ou rodando (ex.: recálculo da sugestão de compras)
+ALTER TABLE jobs ADD COLUMN dedupe_key VARCHAR(60) NULL;
+CREATE UNIQUE INDEX uq_jobs_dedupe_key ON jobs (dedupe_key);
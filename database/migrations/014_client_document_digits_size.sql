@@ -0,0 +1,3 @@
+-- document_digits do mesmo tamanho de document: documento digitado com mais de 14 dígitos
+-- estourava a coluna (erro no MySQL em modo estrito)
+ALTER TABLE clients MODIFY document_digits VARCHAR(20) NULL;
@@ -0,0 +1,26 @@
+-- Snapshot do valor do estoque criado na migração (antes era montado no primeiro acesso
+-- ao dashboard, numa requisição GET que pode ir à réplica). Slot 1 com os totais atuais
+-- de products, slots 2 a 8 zerados; banco já com o snapshot não muda.
+CREATE TABLE IF NOT EXISTS inventory_valuation (
+    slot INT NOT NULL PRIMARY KEY,
+    total_cost DECIMAL(14, 2) DEFAULT 0.00,
+    total_sale DECIMAL(14, 2) DEFAULT 0.00,
+    low_stock INT DEFAULT 0,
+    products INT DEFAULT 0,
+    updated_at DATETIME NULL
+);
+
+INSERT INTO inventory_valuation (slot, total_cost, total_sale, low_stock, products, updated_at)
+SELECT 1, t.total_cost, t.total_sale, t.low_stock, t.products, NOW()
+FROM (SELECT COALESCE(SUM(stock * cost_price), 0) AS total_cost,
+             COALESCE(SUM(stock * price), 0) AS total_sale,
+             COALESCE(SUM(CASE WHEN stock BETWEEN 1 AND 5 THEN 1 ELSE 0 END), 0) AS low_stock,
+             COUNT(id) AS products
+      FROM products) t
+WHERE NOT EXISTS (SELECT 1 FROM inventory_valuation);
+
+INSERT INTO inventory_valuation (slot, total_cost, total_sale, low_stock, products, updated_at)
+SELECT s.slot, 0, 0, 0, 0, NOW()
+FROM (SELECT 2 AS slot UNION ALL SELECT 3 UNION ALL SELECT 4 UNION ALL SELECT 5
+      UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8) s
+WHERE NOT EXISTS (SELECT 1 FROM inventory_valuation v WHERE v.slot = s.slot);